@@ -0,0 +1,28 @@
+"""Adminisztrátori hozzáférés az ``ADMIN_TOKEN`` környezeti változóval.
+
+Ha nincs beállítva, az admin funkciók ki vannak kapcsolva.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+ADMIN_HEADER = "x-admin-token"
+# Bekapcsolva a push küldő végpontok is admin tokent kérnek
+PUSH_REQUIRE_ADMIN = os.environ.get("PUSH_REQUIRE_ADMIN", "0") == "1"
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin jogosultság szükséges.")
+
+
+async def require_push_admin(x_admin_token: Optional[str] = Header(None)):
+    if PUSH_REQUIRE_ADMIN:
+        await require_admin(x_admin_token)
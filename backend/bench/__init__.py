@@ -0,0 +1 @@
+"""Terheléses és mikro mérések az API-hoz (``python -m bench.run --help``)."""
@@ -0,0 +1,150 @@
+"""Szintetikus tartalom a mérésekhez.
+
+A valódi data/ fájlokat másolja egy ideiglenes mappába, és a kért
+gyűjteményeket azonos sémájú, tetszőleges méretű generált adatra cseréli.
+A generálás seedelt, így két mérés ugyanazon az adaton fut.
+"""
+import json
+import random
+import shutil
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+FIRST_NAMES = ["István", "Katalin", "Gábor", "Zsófia", "László", "Éva", "Péter", "Anna", "Tamás",
+               "Judit", "Zoltán", "Ildikó", "Balázs", "Réka", "Ádám", "Orsolya", "Gergely", "Nóra"]
+LAST_NAMES = ["Nagy", "Kovács", "Tóth", "Szabó", "Horváth", "Varga", "Kiss", "Molnár", "Németh",
+              "Farkas", "Balogh", "Papp", "Takács", "Juhász", "Lakatos", "Mészáros", "Oláh", "Simon"]
+SUBJECTS = ["matematika", "magyar nyelv és irodalom", "történelem", "angol nyelv", "német nyelv",
+            "fizika", "kémia", "biológia", "informatika", "programozás", "hálózatok", "testnevelés",
+            "földrajz", "gépészet", "elektronika", "ének-zene"]
+DEPARTMENTS = ["Közismeret", "Informatika", "Gépészet", "Elektronika", "Nyelvi munkaközösség"]
+NEWS_CATEGORIES = ["Felvételi", "Hírek", "Verseny", "Sport", "Rendezvény", "Pályázat"]
+ROOM_TYPES = ["classroom", "lab", "grade", "facility"]
+WORDS = ["iskola", "diák", "verseny", "tanév", "program", "bemutató", "kirándulás", "projekt",
+         "labor", "műhely", "előadás", "ünnepség", "szakma", "csapat", "eredmény", "díj"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _day(rng: random.Random, start: date = date(2025, 9, 1), span: int = 365) -> str:
+    return (start + timedelta(days=rng.randrange(span))).isoformat()
+
+
+def teachers(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    items = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        items.append({
+            "id": f"T{i + 1}",
+            "name": f"{last} {first}",
+            "subject": " – ".join(rng.sample(SUBJECTS, rng.randint(1, 3))),
+            "department": rng.choice(DEPARTMENTS),
+            "email": f"{first}.{last}{i}@example.com".lower(),
+            "grade": f"{rng.randint(9, 13)}.{rng.choice('ABCD')}" if rng.random() < 0.3 else None,
+        })
+    return items
+
+
+def albums(rng: random.Random, count: int, images_per_album: int, image_base: str) -> List[Dict[str, Any]]:
+    items = []
+    for i in range(count):
+        album_id = str(i + 1)
+        images = [{
+            "id": f"{album_id}-{n + 1}",
+            "url": f"{image_base}/img/{album_id}-{n + 1}.jpg",
+            "thumbnail": f"{image_base}/img/{album_id}-{n + 1}-thumb.jpg",
+            "caption": _sentence(rng, 4),
+        } for n in range(images_per_album)]
+        items.append({
+            "id": album_id,
+            "title": _sentence(rng, 3),
+            "description": _sentence(rng, 10),
+            "date": _day(rng),
+            "cover_image": images[0]["url"] if images else f"{image_base}/img/{album_id}.jpg",
+            "image_count": len(images),
+            "images": images,
+        })
+    return items
+
+
+def news(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    return [{
+        "id": str(i + 1),
+        "title": _sentence(rng, 4),
+        "subtitle": _sentence(rng, 8),
+        "content": " ".join(_sentence(rng, 12) for _ in range(5)),
+        "image_url": None,
+        "date": _day(rng),
+        "category": rng.choice(NEWS_CATEGORIES),
+    } for i in range(count)]
+
+
+def events(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    return [{
+        "id": str(i + 1),
+        "title": _sentence(rng, 3),
+        "date": _day(rng),
+        "description": _sentence(rng, 12),
+        "location": "Pataky Technikum",
+    } for i in range(count)]
+
+
+def campus(rng: random.Random, buildings: int, rooms_per_building: int) -> List[Dict[str, Any]]:
+    items = []
+    for b in range(buildings):
+        code = chr(ord("A") + b % 26) + (str(b // 26) if b >= 26 else "")
+        floors = rng.randint(1, 4)
+        rooms = [{
+            "id": f"{code}-{n + 1:03d}",
+            "name": f"{rng.choice(SUBJECTS).capitalize()} terem",
+            "floor": rng.randrange(floors),
+            "building": code,
+            "type": rng.choice(ROOM_TYPES),
+            "description": _sentence(rng, 5),
+        } for n in range(rooms_per_building)]
+        items.append({
+            "id": str(b + 1),
+            "name": f"{code} épület",
+            "code": code,
+            "floors": floors,
+            "description": _sentence(rng, 6),
+            "rooms": rooms,
+        })
+    return items
+
+
+def write_dataset(directory: Path, image_base: str, teacher_count: int = 0, album_count: int = 0,
+                  images_per_album: int = 12, news_count: int = 0, event_count: int = 0,
+                  building_count: int = 0, rooms_per_building: int = 40, seed: int = 1) -> Dict[str, int]:
+    """Fill ``directory`` with content files; a count of 0 keeps the real data.
+
+    Returns the number of records per collection.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in DATA_DIR.glob("*.json"):
+        shutil.copy(path, directory / path.name)
+    generated = {
+        "teachers.json": teacher_count and teachers(rng, teacher_count),
+        "gallery.json": album_count and albums(rng, album_count, images_per_album, image_base),
+        "news.json": news_count and news(rng, news_count),
+        "events.json": event_count and events(rng, event_count),
+        "campus.json": building_count and campus(rng, building_count, rooms_per_building),
+    }
+    for filename, items in generated.items():
+        if items:
+            (directory / filename).write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+    sizes = {}
+    for path in sorted(directory.glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        sizes[path.stem] = len(data) if isinstance(data, list) else 1
+    return sizes
+
+
+def load(directory: Path, name: str) -> Any:
+    return json.loads((directory / f"{name}.json").read_text(encoding="utf-8"))
@@ -0,0 +1,91 @@
+"""Helyi Expo push API utánzat a mérésekhez.
+
+Minden üzenetre ``ok`` jegyet ad, a nyugta lekérdezésre ``ok`` nyugtát,
+és ``GET /img/...`` kérésre egy kis JPEG képet (a bélyegkép-proxyhoz), így
+a push és a galéria végpontok külső hálózat nélkül mérhetők.
+"""
+import io
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def _sample_jpeg() -> bytes:
+    if Image is None:
+        return b""
+    out = io.BytesIO()
+    Image.new("RGB", (800, 600), (40, 90, 160)).save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+class ExpoStub:
+    """Threaded stub server; ``latency`` seconds are added to every push call."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.messages = 0
+        self.requests = 0
+        self.image = _sample_jpeg()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not self.path.startswith("/img/") or not stub.image:
+                    self._reply(404, b"", "text/plain")
+                    return
+                self._reply(200, stub.image, "image/jpeg")
+
+            def do_POST(self):
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path.endswith("/getReceipts"):
+                    body = {"data": {ticket: {"status": "ok"} for ticket in data.get("ids", [])}}
+                else:
+                    with stub._lock:
+                        stub.requests += 1
+                        stub.messages += len(data)
+                        ids = [next(stub._ids) for _ in data]
+                    body = {"data": [{"status": "ok", "id": f"bench-{i}"} for i in ids]}
+                self._reply(200, json.dumps(body).encode(), "application/json")
+
+            def _reply(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
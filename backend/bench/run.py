@@ -0,0 +1,413 @@
+"""API mérések: áteresztőképesség és p50/p95/p99 válaszidő útvonalanként.
+
+A backend/ mappából futtatandó::
+
+    python -m bench.run run --teachers 10000 --albums 1000 --concurrency 1,16,64
+    python -m bench.run compare bench/results/régi.json bench/results/új.json
+
+Az alkalmazást folyamaton belül (httpx ASGITransport) és/vagy valódi
+uvicorn szerverként méri, helyi Expo utánzattal és generált adatokkal; az
+eredmény JSON fájlba kerül, így commitok között összevethető.
+"""
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import typer
+
+from bench import datasets
+from bench.expo_stub import ExpoStub
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Ezeket nem mérjük: végtelen válasz, a mérő saját állapotát mérné, vagy admin végpont
+SKIPPED_ROUTES = {"/api/stream", "/metrics"}
+SKIPPED_PREFIXES = ("/api/admin/",)
+PUSH_ROUTES = {"/api/send-test-push", "/api/send-menu-push"}
+# Egyszerre csak egy küldés futhat, a többi 429-et kap
+EXPECTED_STATUS = {
+    "/api/send-test-push": {429},
+    "/api/send-menu-push": {429},
+}
+# Útvonalanként mért lekérdezés-változatok; {név} a futás közben kitöltött minta
+QUERY_VARIANTS = {
+    "/api/teachers/search": ["q=mat", "q=kovacs&limit=10", "q=nagy istvan"],
+    "/api/rooms/search": ["q=terem", "type=lab", "q=labor&floor=1&limit=20"],
+    "/api/gallery": ["", "summary=true&limit=20", "limit=50&fields=id,title,date"],
+    "/api/gallery/{album_id}/images": ["limit=20"],
+    "/api/bootstrap": ["", "include=menu,news"],
+    "/api/sync": ["", "since={version}"],
+    "/api/events": ["", "from=2026-01-01&limit=5"],
+    "/api/news": ["", "limit=10", "category={category}&limit=10"],
+}
+
+app = typer.Typer(add_completion=False, help=__doc__)
+
+
+@dataclass
+class Scenario:
+    method: str
+    route: str
+    url: str
+    body: Optional[Callable[[int], Any]] = None
+    requests: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.url}"
+
+
+@dataclass
+class Target:
+    mode: str
+    client: httpx.AsyncClient
+    close: Callable[[], Awaitable[None]]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def build_scenarios(routes, samples: Dict[str, str], requests: int, push_requests: int) -> List[Scenario]:
+    scenarios = []
+    for route in routes:
+        path = getattr(route, "path", "")
+        methods = sorted(getattr(route, "methods", None) or ())
+        if not path.startswith("/api") or path in SKIPPED_ROUTES or path.startswith(SKIPPED_PREFIXES):
+            continue
+        for method in methods:
+            if method == "HEAD":
+                continue
+            try:
+                url = path.format(**samples)
+            except KeyError as exc:
+                raise typer.BadParameter(f"Nincs minta érték a(z) {exc} paraméterhez ({path})")
+            body = None
+            if path == "/api/register-token":
+                body = lambda i: {"token": f"ExponentPushToken[bench-new-{i}]", "topics": ["menu"]}
+            count = push_requests if path in PUSH_ROUTES else requests
+            for query in QUERY_VARIANTS.get(path, [""]):
+                query = query.format(**samples)
+                scenarios.append(Scenario(method, path, f"{url}?{query}" if query else url, body, count))
+    return scenarios
+
+
+async def runtime_samples(client: httpx.AsyncClient, samples: Dict[str, str]) -> Dict[str, str]:
+    """Values only the running server knows: content version, push job, image key."""
+    samples = dict(samples)
+    samples["version"] = (await client.get("/api/sync")).json()["version"]
+    samples["job_id"] = (await client.post("/api/send-test-push")).json()["job_id"]
+    album = (await client.get(f"/api/gallery/{samples['album_id']}")).json()
+    samples["key"] = album["images"][0]["thumbnail"].rsplit("/", 1)[-1] if album["images"] else "missing"
+    return samples
+
+
+async def measure(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, warmup: int) -> Dict:
+    async def call(i: int) -> int:
+        body = scenario.body(i) if scenario.body else None
+        response = await client.request(scenario.method, scenario.url, json=body)
+        return response.status_code
+
+    for i in range(warmup):
+        await call(-i - 1)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    failures = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal failures
+        while (i := next(counter)) < scenario.requests:
+            start = time.perf_counter()
+            try:
+                statuses[await call(i)] += 1
+            except httpx.HTTPError:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, scenario.requests))))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    expected = EXPECTED_STATUS.get(scenario.route, set())
+    errors = failures + sum(n for status, n in statuses.items() if status >= 400 and status not in expected)
+    return {
+        "route": scenario.route,
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": scenario.requests,
+        "errors": errors,
+        "status_counts": {str(status): n for status, n in sorted(statuses.items())},
+        "throughput_rps": round(scenario.requests / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def wait_for_push_jobs(client: httpx.AsyncClient, timeout: float = 120) -> Dict:
+    """Wait until background fan-outs finish and summarize their duration."""
+    deadline = time.monotonic() + timeout
+    while True:
+        jobs = (await client.get("/api/push-jobs")).json()
+        if all(job["status"] in ("done", "failed") for job in jobs) or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.2)
+    durations = sorted(
+        (datetime.fromisoformat(job["finished_at"]) - datetime.fromisoformat(job["created_at"])).total_seconds()
+        for job in jobs if job.get("finished_at")
+    )
+    return {
+        "jobs": len(jobs),
+        "unfinished": sum(1 for job in jobs if not job.get("finished_at")),
+        "devices": sum(job["device_count"] for job in jobs),
+        "fanout_ms": {
+            "p50": round(percentile(durations, 50) * 1000, 1),
+            "p95": round(percentile(durations, 95) * 1000, 1),
+            "max": round(durations[-1] * 1000, 1) if durations else 0.0,
+        },
+    }
+
+
+async def start_inprocess() -> Target:
+    import server
+
+    await server.app.router.startup()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+
+    async def close():
+        await client.aclose()
+        await server.app.router.shutdown()
+
+    return Target("inprocess", client, close)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_uvicorn(workers: int, concurrency: int) -> Target:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            await client.get("/api/")
+            break
+        except httpx.TransportError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Az uvicorn szerver nem indult el")
+            await asyncio.sleep(0.2)
+
+    async def close():
+        await client.aclose()
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return Target(f"uvicorn-{workers}w", client, close)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_target(target: Target, samples: Dict[str, str], levels: List[int], requests: int,
+                     push_requests: int, warmup: int, route_filter: Optional[str]) -> List[Dict]:
+    import server
+
+    samples = await runtime_samples(target.client, samples)
+    scenarios = build_scenarios(server.app.routes, samples, requests, push_requests)
+    if route_filter:
+        scenarios = [s for s in scenarios if route_filter in s.name]
+    results = []
+    for concurrency in levels:
+        for scenario in scenarios:
+            result = await measure(target.client, scenario, concurrency, warmup)
+            result["mode"] = target.mode
+            results.append(result)
+            typer.echo(f"{target.mode:<12} c={concurrency:<4} {scenario.name[:60]:<60} "
+                       f"{result['throughput_rps']:>9.1f} rps  p50 {result['latency_ms']['p50']:>8.2f} ms  "
+                       f"p99 {result['latency_ms']['p99']:>8.2f} ms  err {result['errors']}")
+    push = await wait_for_push_jobs(target.client)
+    results.append({"mode": target.mode, "route": "push-fanout", "scenario": "push fan-out", **push})
+    return results
+
+
+@app.command()
+def run(
+    mode: str = typer.Option("both", help="inprocess, uvicorn vagy both"),
+    concurrency: str = typer.Option("1,16,64", help="Párhuzamossági szintek vesszővel"),
+    requests: int = typer.Option(500, help="Kérések száma útvonalanként és szintenként"),
+    push_requests: int = typer.Option(5, help="Kérések száma a push küldő végpontokon"),
+    warmup: int = typer.Option(10, help="Bemelegítő kérések útvonalanként"),
+    workers: int = typer.Option(2, help="Uvicorn workerek száma"),
+    teachers: int = typer.Option(0, help="Generált tanárok (0: valódi adat)"),
+    albums: int = typer.Option(0, help="Generált albumok (0: valódi adat)"),
+    images_per_album: int = typer.Option(12),
+    news: int = typer.Option(0),
+    events: int = typer.Option(0),
+    buildings: int = typer.Option(0),
+    rooms_per_building: int = typer.Option(40),
+    tokens: int = typer.Option(1000, help="Előre regisztrált push tokenek"),
+    expo_latency: float = typer.Option(0.0, help="Az Expo utánzat válaszideje másodpercben"),
+    route: Optional[str] = typer.Option(None, help="Csak az ezt tartalmazó forgatókönyvek"),
+    seed: int = typer.Option(1),
+    output: Optional[Path] = typer.Option(None, help="Eredményfájl (alapból bench/results/)"),
+):
+    """Mérés generált adatokon; az eredmény JSON-ba kerül."""
+    levels = [int(level) for level in concurrency.split(",") if level.strip()]
+    modes = ["inprocess", "uvicorn"] if mode == "both" else [mode]
+    workdir = Path(tempfile.mkdtemp(prefix="pataky-bench-"))
+    stub = ExpoStub(expo_latency)
+    stub_url = stub.start()
+
+    sizes = datasets.write_dataset(
+        workdir / "data", stub_url, teacher_count=teachers, album_count=albums,
+        images_per_album=images_per_album, news_count=news, event_count=events,
+        building_count=buildings, rooms_per_building=rooms_per_building, seed=seed,
+    )
+    os.environ.update({
+        "CONTENT_DIR": str(workdir / "data"),
+        "CONTENT_WATCH_INTERVAL": "0",
+        "TOKEN_STORE": "sqlite",
+        "TOKEN_DB_PATH": str(workdir / "tokens.db"),
+        "IMAGE_CACHE_DIR": str(workdir / "image_cache"),
+        # A bélyegkép-proxy csak nyilvános címmel aktív; a mérés csak a kulcsot használja
+        "PUBLIC_BASE_URL": "http://127.0.0.1",
+        "EXPO_PUSH_URL": f"{stub_url}/--/api/v2/push/send",
+        "PUSH_SCHEDULE_ENABLED": "0",
+        "RATE_LIMIT_ENABLED": "0",
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+    from token_store import SQLiteTokenStore
+
+    store = SQLiteTokenStore(os.environ["TOKEN_DB_PATH"])
+    store.add_many(f"ExponentPushToken[bench-{i}]" for i in range(tokens))
+    asyncio.run(store.close())
+
+    campus = datasets.load(workdir / "data", "campus")
+    courses = datasets.load(workdir / "data", "courses")
+    news = datasets.load(workdir / "data", "news")
+    samples = {
+        "news_id": news[0]["id"],
+        "category": news[0]["category"],
+        "course_type": courses[0]["type"],
+        "album_id": datasets.load(workdir / "data", "gallery")[0]["id"],
+        "building_id": campus[0]["id"],
+        "room_id": campus[0]["rooms"][0]["id"],
+    }
+
+    async def main() -> List[Dict]:
+        results = []
+        for name in modes:
+            if name == "inprocess":
+                target = await start_inprocess()
+            else:
+                target = await start_uvicorn(workers, max(levels))
+            try:
+                results += await run_target(target, samples, levels, requests, push_requests, warmup, route)
+            finally:
+                await target.close()
+        return results
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        stub.stop()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "dataset": sizes,
+            "tokens": tokens,
+            "settings": {"modes": modes, "concurrency": levels, "requests": requests,
+                         "push_requests": push_requests, "warmup": warmup, "workers": workers,
+                         "expo_latency": expo_latency, "seed": seed},
+        },
+        "results": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    typer.echo(f"Eredmények: {output}")
+
+
+@app.command()
+def compare(
+    baseline: Path,
+    candidate: Path,
+    threshold: float = typer.Option(10.0, help="Ennyi százalék romlás már regresszió"),
+):
+    """Két eredményfájl összevetése; regresszió esetén 1-es kilépési kóddal tér vissza."""
+    def index(path: Path) -> Dict[tuple, Dict]:
+        report = json.loads(path.read_text(encoding="utf-8"))
+        return {(r["mode"], r["scenario"], r.get("concurrency")): r
+                for r in report["results"] if "latency_ms" in r}
+
+    old, new = index(baseline), index(candidate)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys(), key=str):
+        before, after = old[key], new[key]
+        p95_change = (after["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1) * 100 \
+            if before["latency_ms"]["p95"] else 0.0
+        rps_change = (after["throughput_rps"] / before["throughput_rps"] - 1) * 100 \
+            if before["throughput_rps"] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        regressions += regressed
+        mode, scenario, level = key
+        typer.echo(f"{'!' if regressed else ' '} {mode:<12} c={level:<4} {scenario[:60]:<60} "
+                   f"p95 {p95_change:+7.1f}%  rps {rps_change:+7.1f}%")
+    for key in sorted(old.keys() ^ new.keys(), key=str):
+        typer.echo(f"  csak az egyikben: {key}")
+    if regressions:
+        typer.echo(f"{regressions} regresszió ({threshold}% küszöb)")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,305 @@
+"""Előre szerializált JSON válaszok ETag alapú feltételes kiszolgálással.
+
+A tömörített (gzip, brotli) és MessagePack változatok adatkészlet-verziónként
+egyszer készülnek el. Az egyszeri válaszok (keresés, szinkron) az első
+kéréskor, gyors tömörítési szinten; a tartalom adatkészletei a háttérben,
+a legerősebb szinten.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, Union
+
+from pydantic_core import to_json
+from starlette.requests import Request
+from starlette.responses import Response
+
+from metrics import CACHE_LOOKUPS, REGISTRY
+
+try:
+    import brotli
+except ImportError:  # brotli nélkül csak gzip
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack nélkül csak JSON
+    msgpack = None
+
+# A kliens mindig visszakérdez, de változatlan adatnál csak 304-et kap
+CACHE_CONTROL = "no-cache"
+# Ennél kisebb válaszokat nem éri meg tömöríteni
+MIN_COMPRESS_SIZE = 512
+# Keresési találatok gyorsítótára: legfeljebb ennyi lekérdezés, ennyi másodpercig
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 2000))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 600))
+# Kérés közben tömörítünk: a brotli 11-es szintje MB-os válasznál másodpercekig tart
+FAST_LEVELS = {"gzip": 5, "br": 4}
+# A tartalom adatkészletei háttérszálban, egyszer tömörülnek, ott megéri a legjobb szint
+BEST_LEVELS = {"gzip": 9, "br": 11}
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MEDIA_TYPES = {"json": "application/json", "msgpack": "application/msgpack"}
+ETAG_SUFFIXES = {"json": "", "msgpack": "-mp", "identity": "", "gzip": "-gz", "br": "-br"}
+
+NOT_MODIFIED = REGISTRY.counter("http_not_modified_total", "Responses answered with 304 from the ETag.")
+
+# A megosztott régióból (lásd shared.py) kapott adatok memoryview szeletek
+Buffer = Union[bytes, memoryview]
+
+
+class CachedPayload:
+    """Serialized JSON body with its strong ETag.
+
+    Other representations (MessagePack, gzip, brotli) are built on first use
+    and kept, so each one is encoded once per dataset version. ``variants``
+    may supply them up front, e.g. as slices of a shared memory region.
+
+    Lazy payloads compress on demand at ``FAST_LEVELS``. Non-lazy ones use
+    ``BEST_LEVELS`` and are compressed off the event loop by
+    ``ResponseCache``; until a compressed variant is ready, ``ready`` is
+    false and the payload is served uncompressed.
+    """
+
+    __slots__ = ("body", "etag", "lazy", "_variants")
+
+    def __init__(self, body: Buffer, etag: Optional[str] = None,
+                 variants: Optional[Mapping[Tuple[str, str], Buffer]] = None, lazy: bool = True):
+        self.body = body
+        self.etag = etag or make_etag(body)
+        self.lazy = lazy
+        self._variants: Dict[Tuple[str, str], Buffer] = {**(variants or {}), ("json", "identity"): body}
+
+    def ready(self, fmt: str, encoding: str) -> bool:
+        return self.lazy or encoding == "identity" or (fmt, encoding) in self._variants
+
+    def variant(self, fmt: str = "json", encoding: str = "identity") -> Buffer:
+        data = self._variants.get((fmt, encoding))
+        if data is None:
+            levels = FAST_LEVELS if self.lazy else BEST_LEVELS
+            if encoding == "identity":
+                data = msgpack.packb(json.loads(bytes(self.body)))
+            elif encoding == "br":
+                data = brotli.compress(self.variant(fmt), quality=levels["br"])
+            else:
+                data = gzip.compress(self.variant(fmt), compresslevel=levels["gzip"], mtime=0)
+            self._variants[(fmt, encoding)] = data
+        return data
+
+    def all_variants(self) -> Dict[Tuple[str, str], Buffer]:
+        """Build every representation the installed codecs allow (slow, keep it off the loop)."""
+        formats = ["json"] + (["msgpack"] if msgpack is not None else [])
+        encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+        for fmt in formats:
+            for encoding in encodings:
+                # A tömörítésről send_payload is a JSON méret alapján dönt
+                if encoding == "identity" or len(self.body) >= MIN_COMPRESS_SIZE:
+                    self.variant(fmt, encoding)
+        return dict(self._variants)
+
+    def variant_etag(self, fmt: str, encoding: str) -> str:
+        # Az erős ETag-nek reprezentációnként különböznie kell
+        return self.etag[:-1] + ETAG_SUFFIXES[fmt] + ETAG_SUFFIXES[encoding] + '"'
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def parse_qvalues(header: str) -> Dict[str, float]:
+    """Parse an Accept / Accept-Encoding header into ``{value: q}``."""
+    values = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[name] = q
+    return values
+
+
+def choose_format(request: Request) -> str:
+    accept = request.headers.get("accept")
+    if msgpack is None or not accept:
+        return "json"
+    accepted = parse_qvalues(accept)
+    msgpack_q = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_TYPES)
+    json_q = max(accepted.get("application/json", 0.0), accepted.get("*/*", 0.0))
+    return "msgpack" if msgpack_q > 0 and msgpack_q >= json_q else "json"
+
+
+def choose_encoding(request: Request, size: int) -> str:
+    if size < MIN_COMPRESS_SIZE:
+        return "identity"
+    accepted = parse_qvalues(request.headers.get("accept-encoding", ""))
+    best, best_q = "identity", 0.0
+    # Azonos q értéknél a brotli az erősebb
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def combine(parts: Dict[str, CachedPayload]) -> CachedPayload:
+    """Join cached fragments into one JSON object without re-serializing them."""
+    body = b"{" + b",".join(to_json(name) + b":" + part.body for name, part in parts.items()) + b"}"
+    etag = make_etag("".join(f"{name}={part.etag}" for name, part in parts.items()).encode())
+    return CachedPayload(body, etag)
+
+
+class PayloadResponse(Response):
+    """A Response whose body may also be a memoryview, sent without copying."""
+
+    def render(self, content: Any) -> Buffer:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+
+def send_payload(request: Request, payload: CachedPayload) -> Response:
+    """Serve the representation the client asked for via Accept/Accept-Encoding."""
+    fmt = choose_format(request)
+    encoding = choose_encoding(request, len(payload.body))
+    if not payload.ready(fmt, encoding):
+        # A legjobb szintű változat még a háttérben készül
+        encoding = "identity"
+    headers = {
+        "ETag": payload.variant_etag(fmt, encoding),
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        NOT_MODIFIED.inc()
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return PayloadResponse(payload.variant(fmt, encoding), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+class ResponseCache:
+    """Holds each dataset serialized once, keyed by name.
+
+    ``replace`` builds the complete new mapping before swapping it in, so a
+    request never sees a mix of old and new payloads. Entries added with
+    ``get_or_build`` live until the next ``replace``. After each swap a
+    daemon thread compresses the new datasets; it stops early once they
+    have been replaced again.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, CachedPayload] = {}
+
+    def replace(self, datasets: Dict[str, Any], prebuilt: Mapping[str, CachedPayload] = MappingProxyType({})):
+        self.install(self.prepare(datasets, prebuilt))
+
+    @staticmethod
+    def prepare(datasets: Dict[str, Any],
+                prebuilt: Mapping[str, CachedPayload] = MappingProxyType({})) -> Dict[str, CachedPayload]:
+        """Serialize ``datasets``; keys found in ``prebuilt`` are taken from there as is.
+
+        Touches no shared state, so it can run in a worker thread.
+        """
+        return {
+            key: prebuilt[key] if key in prebuilt else CachedPayload(to_json(value), lazy=False)
+            for key, value in datasets.items()
+        }
+
+    def install(self, entries: Dict[str, CachedPayload]):
+        self._entries = installed = dict(entries)
+        pending = [payload for payload in installed.values() if not payload.lazy]
+        if pending:
+            threading.Thread(target=self._compress, args=(installed, pending),
+                             name="response-compress", daemon=True).start()
+
+    def _compress(self, installed: Dict[str, CachedPayload], pending):
+        for payload in pending:
+            if self._entries is not installed:
+                return
+            payload.all_variants()
+
+    def entries(self) -> Dict[str, CachedPayload]:
+        return dict(self._entries)
+
+    def get(self, key: str) -> CachedPayload:
+        return self._entries[key]
+
+    def get_or_build(self, key: str, build: Callable[[], Any]) -> CachedPayload:
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is not None:
+            CACHE_LOOKUPS.inc(cache="response", result="hit")
+        else:
+            CACHE_LOOKUPS.inc(cache="response", result="miss")
+            value = build()
+            entry = entries[key] = value if isinstance(value, CachedPayload) else CachedPayload(to_json(value))
+        return entry
+
+    def discard(self, predicate: Callable[[str], bool]):
+        """Drop the entries whose key matches ``predicate``, e.g. the ones built for a past day."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def response(self, request: Request, key: str) -> Response:
+        return send_payload(request, self._entries[key])
+
+
+class ResultCache:
+    """Bounded LRU cache of serialized query results with a TTL.
+
+    Keys should contain the normalized query, the filters and the content
+    version; ``clear`` is called on every content reload as well, so stale
+    results never outlive the data they came from.
+    """
+
+    def __init__(self, name: str, max_entries: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, CachedPayload]]" = OrderedDict()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> CachedPayload:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(key)
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return entry[1]
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        payload = CachedPayload(to_json(build()))
+        self._entries[key] = (now + self.ttl, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,444 @@
+"""Tartalmi adatréteg.
+
+A tartalom (hírek, tanárok, menü, ...) JSON fájlokból töltődik be egy
+változtathatatlan pillanatképbe, amelyet a háttérben futó figyelő
+fájlváltozáskor újratölt és atomikusan lecserél; mellette rekordszintű
+revíziók a delta szinkronizáláshoz.
+
+A validált tartalom egy előre lefordított pillanatkép fájlba is menthető
+(``manage.py build-snapshot``); ha ez a forrásfájlokkal és a sémával
+egyezik, a worker validálás nélkül onnan tölt. A fájl pickle, ezért a
+tartalom mappán kívül, a telepítés mellett van, és titkos kulccsal
+(``CONTENT_SNAPSHOT_KEY``) aláírt: aláírás nélküli vagy hibásan aláírt
+fájlt nem töltünk be, mert betöltése kódot futtathatna.
+"""
+import asyncio
+import bisect
+import gc
+import hashlib
+import hmac
+import json
+import logging
+import os
+import pickle
+import struct
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, get_args
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+logger = logging.getLogger(__name__)
+
+CONTENT_DIR = os.environ.get("CONTENT_DIR", str(Path(__file__).parent / "data"))
+CONTENT_WATCH_INTERVAL = float(os.environ.get("CONTENT_WATCH_INTERVAL", 2))
+# 0: a pillanatkép fájlt figyelmen kívül hagyjuk (méréshez, hibakereséshez)
+CONTENT_SNAPSHOT = os.environ.get("CONTENT_SNAPSHOT", "1") == "1"
+# Üresen a backend mappában, SNAPSHOT_FILENAME néven; soha ne a szerkeszthető tartalom mappában
+CONTENT_SNAPSHOT_PATH = os.environ.get("CONTENT_SNAPSHOT_PATH", "")
+# A pillanatkép aláíró kulcsa; üresen a pillanatkép nem készül és nem töltődik be
+CONTENT_SNAPSHOT_KEY = os.environ.get("CONTENT_SNAPSHOT_KEY", "")
+SNAPSHOT_FILENAME = ".content-snapshot.pickle"
+# A fájlformátum változásakor növelendő
+SNAPSHOT_FORMAT = 2
+# MAGIC, a többi bájt HMAC-SHA256 aláírása, a JSON fejléc hossza, a fejléc, majd a pickle adat
+SNAPSHOT_MAGIC = b"PTKSNP02"
+SNAPSHOT_PREFIX = struct.Struct(f"<{len(SNAPSHOT_MAGIC)}s32sQ")
+
+# Feliratkozó: a pillanatképből mindent előkészít, és visszaadja a véglegesítő lépést
+Commit = Callable[[], None]
+Listener = Callable[["ContentSnapshot"], Optional[Commit]]
+
+# Ennyi törölt rekordot jegyzünk meg; a régebbi verziójú kliensek teljes listát kapnak
+MAX_TOMBSTONES = 10_000
+
+RecordKey = Tuple[str, str]
+
+
+class _RevisionState(NamedTuple):
+    # Az élő rekordok lenyomata; ez a kifelé látható verzió
+    digest: str
+    # helyi revíziószám, csak a naplón belüli sorrendhez
+    revision: int
+    # (gyűjtemény, azonosító) -> (revízió, tartalom hash; None ha törölve)
+    records: Dict[RecordKey, Tuple[int, Optional[bytes]]]
+    # revízió szerint rendezett változásnapló
+    log: List[Tuple[int, str, str]]
+    # ennél régebbi verzióról nem tudunk teljes deltát adni
+    floor: int
+    # az eddig látott verziók -> a helyi revízió, amikor ez volt a tartalom
+    history: Dict[str, int]
+
+
+class SyncResult(NamedTuple):
+    version: str
+    reset: bool
+    upserted: Dict[str, List[str]]
+    deleted: Dict[str, List[str]]
+
+
+class RevisionLog:
+    """Per-record revision tracking over all content collections.
+
+    ``update`` is called with the current records after every load; records
+    whose serialized form changed get the next local revision, vanished
+    records become tombstones. The version handed to clients is a digest of
+    all live records, so every worker serving the same content reports the
+    same version, whatever order it loaded things in. A worker answers a
+    delta for any version it has held itself; for others (e.g. it started
+    later) the client gets a full reset instead of a wrong delta.
+    """
+
+    def __init__(self, max_tombstones: int = MAX_TOMBSTONES):
+        self.max_tombstones = max_tombstones
+        self._state: Optional[_RevisionState] = None
+
+    @property
+    def version(self) -> str:
+        state = self._state
+        return state.digest if state else ""
+
+    def update(self, collections: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Record the current content; returns the names of changed collections."""
+        state, changed = self.prepare(collections)
+        self.install(state)
+        return changed
+
+    def install(self, state: Optional[_RevisionState]):
+        if state is not None:
+            self._state = state
+
+    def prepare(self, collections: Dict[str, Dict[str, Any]]) -> Tuple[Optional[_RevisionState], List[str]]:
+        """Compute the state ``update`` would record without installing it.
+
+        Returns ``(None, [])`` when nothing changed.
+        """
+        digests = {
+            (name, record_id): hashlib.sha256(to_json(record)).digest()
+            for name, records in collections.items()
+            for record_id, record in records.items()
+        }
+        content = self._digest(digests)
+        old = self._state
+        if old is None:
+            records = {key: (1, digest) for key, digest in digests.items()}
+            log = sorted((1, name, record_id) for name, record_id in records)
+            return _RevisionState(content, 1, records, log, 0, {content: 1}), sorted(collections)
+
+        revision = old.revision + 1
+        records = dict(old.records)
+        log = list(old.log)
+        changed = set()
+        for key, digest in digests.items():
+            previous = records.get(key)
+            if previous is None or previous[1] != digest:
+                records[key] = (revision, digest)
+                log.append((revision, *key))
+                changed.add(key[0])
+        for key, (_, digest) in old.records.items():
+            if digest is not None and key not in digests:
+                records[key] = (revision, None)
+                log.append((revision, *key))
+                changed.add(key[0])
+        if not changed:
+            return None, []
+
+        floor = old.floor
+        tombstones = sorted((rev, key) for key, (rev, digest) in records.items() if digest is None)
+        for rev, key in tombstones[:max(0, len(tombstones) - self.max_tombstones)]:
+            del records[key]
+            floor = max(floor, rev)
+        if len(log) > 2 * len(records):
+            log = sorted((rev, name, record_id) for (name, record_id), (rev, _) in records.items())
+        # Visszaálló tartalomnál a régi lenyomat az új revízióra mutat
+        history = {version: rev for version, rev in old.history.items() if rev >= floor}
+        history[content] = revision
+        return _RevisionState(content, revision, records, log, floor, history), sorted(changed)
+
+    @staticmethod
+    def _digest(digests: Dict[RecordKey, bytes]) -> str:
+        content = hashlib.sha256()
+        for (name, record_id), digest in sorted(digests.items()):
+            content.update(f"{name}\0{record_id}\0".encode())
+            content.update(digest)
+        return content.hexdigest()[:16]
+
+    def changes_since(self, since: Optional[str]) -> SyncResult:
+        state = self._state
+        current = state.digest
+        after = self._parse(state, since)
+        upserted: Dict[str, List[str]] = {}
+        deleted: Dict[str, List[str]] = {}
+        if after is None:
+            for (name, record_id), (_, digest) in state.records.items():
+                if digest is not None:
+                    upserted.setdefault(name, []).append(record_id)
+            return SyncResult(current, True, upserted, deleted)
+        start = bisect.bisect_right(state.log, (after, chr(0x10FFFF)))
+        for rev, name, record_id in state.log[start:]:
+            latest = state.records.get((name, record_id))
+            # Egy rekord többször is szerepelhet a naplóban; csak a legutolsó számít
+            if latest is None or latest[0] != rev:
+                continue
+            target = deleted if latest[1] is None else upserted
+            target.setdefault(name, []).append(record_id)
+        return SyncResult(current, False, upserted, deleted)
+
+    @staticmethod
+    def _parse(state: _RevisionState, since: Optional[str]) -> Optional[int]:
+        if not since:
+            return None
+        revision = state.history.get(since)
+        if revision is None or revision < state.floor:
+            return None
+        return revision
+
+
+@dataclass(frozen=True)
+class ContentSnapshot:
+    collections: Mapping[str, Any]
+    # (fájlnév, mtime_ns, méret) hármasok, ebből látszik a változás
+    signature: Tuple[Tuple[str, int, int], ...]
+    loaded_at: float
+    # A forrásfájlok és a séma lenyomata; azonos tartalomhoz minden folyamatban azonos
+    digest: str = ""
+    # Pillanatkép fájlból töltéskor az ott eltárolt származtatott adatok (pl. keresőindexek)
+    derived: Mapping[str, Any] = field(default_factory=dict)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.collections[name]
+
+
+class ContentStore:
+    """Loads the content files into an immutable snapshot and hot-swaps it.
+
+    ``schema`` maps a collection name to its file name and type, e.g.
+    ``{"news": ("news.json", List[NewsArticle])}``. List collections are
+    stored as tuples. The watcher polls file stats and reloads in two
+    phases. Reading, validation and every subscriber's ``prepare`` step run
+    in a worker thread; a subscriber builds all its derived state there and
+    returns a commit step. Only when every subscriber has prepared do the
+    commit steps run on the event loop, so requests see either the old or
+    the new content, never a mix. Any failure (invalid file, or an error
+    while preparing or committing) is logged, the previous snapshot stays
+    in service, and the watcher keeps polling.
+
+    ``build_snapshot`` pickles the validated collections (plus any derived
+    state) next to a digest of the source files and the schema, signed with
+    ``snapshot_key``; ``read`` uses that file instead of validating whenever
+    the signature verifies and both digests still match. Without a key the
+    snapshot is not used.
+    """
+
+    def __init__(self, schema: Dict[str, Tuple[str, Any]], directory: str = CONTENT_DIR,
+                 interval: float = CONTENT_WATCH_INTERVAL, snapshot_path: Optional[str] = None,
+                 use_snapshot: bool = CONTENT_SNAPSHOT, snapshot_key: str = CONTENT_SNAPSHOT_KEY):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.schema = {name: (filename, TypeAdapter(type_)) for name, (filename, type_) in schema.items()}
+        self.schema_digest = schema_fingerprint(type_ for _, type_ in schema.values())
+        self.snapshot_path = Path(snapshot_path or CONTENT_SNAPSHOT_PATH or Path(__file__).parent / SNAPSHOT_FILENAME)
+        self.snapshot_key = snapshot_key.encode()
+        self.use_snapshot = use_snapshot and bool(snapshot_key)
+        self.snapshot: Optional[ContentSnapshot] = None
+        self._listeners: List[Listener] = []
+        self._commits: List[Commit] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self._failed_signature = None
+
+    def subscribe(self, listener: Listener):
+        """``listener(snapshot)`` must not change served state; it returns the
+        step that installs what it built (or ``None``)."""
+        self._listeners.append(listener)
+
+    def signature(self) -> Tuple[Tuple[str, int, int], ...]:
+        stats = []
+        for filename, _ in self.schema.values():
+            stat = (self.directory / filename).stat()
+            stats.append((filename, stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def read(self) -> ContentSnapshot:
+        """Read and validate every file, or take them from a matching snapshot
+        file; raises on missing or invalid data."""
+        signature = self.signature()
+        sources = self._read_sources()
+        header = self._snapshot_header(sources)
+        if self.use_snapshot:
+            loaded = self._read_snapshot(header)
+            if loaded is not None:
+                collections, derived = loaded
+                return ContentSnapshot(MappingProxyType(collections), signature, time.time(),
+                                       header_digest(header), MappingProxyType(derived))
+        return ContentSnapshot(MappingProxyType(self._validate(sources)), signature, time.time(),
+                               header_digest(header))
+
+    def build_snapshot(self, derive: Optional[Callable[[ContentSnapshot], Dict[str, Any]]] = None) -> Path:
+        """Validate the content files and write them to ``snapshot_path``.
+
+        ``derive`` may add state computed from the content (it must not
+        depend on configuration, only on the data). The file is replaced
+        atomically, so running workers never read a partial snapshot.
+        Raises ``ValueError`` without a signing key.
+        """
+        if not self.snapshot_key:
+            raise ValueError("A pillanatképhez CONTENT_SNAPSHOT_KEY szükséges")
+        sources = self._read_sources()
+        collections = self._validate(sources)
+        header = self._snapshot_header(sources)
+        snapshot = ContentSnapshot(MappingProxyType(collections), self.signature(), time.time(),
+                                   header_digest(header))
+        derived = derive(snapshot) if derive is not None else {}
+        meta = to_json(header)
+        data = pickle.dumps((collections, derived), protocol=pickle.HIGHEST_PROTOCOL)
+        length = len(meta).to_bytes(8, "little")
+        tmp = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp, "wb") as out:
+            out.write(SNAPSHOT_PREFIX.pack(SNAPSHOT_MAGIC, self._sign(length, meta, data), len(meta)))
+            out.write(meta)
+            out.write(data)
+        os.replace(tmp, self.snapshot_path)
+        return self.snapshot_path
+
+    def _read_sources(self) -> Dict[str, bytes]:
+        return {filename: (self.directory / filename).read_bytes() for filename, _ in self.schema.values()}
+
+    def _validate(self, sources: Dict[str, bytes]) -> Dict[str, Any]:
+        collections = {}
+        for name, (filename, adapter) in self.schema.items():
+            value = adapter.validate_json(sources[filename])
+            collections[name] = tuple(value) if isinstance(value, list) else value
+        return collections
+
+    def _snapshot_header(self, sources: Dict[str, bytes]) -> Dict[str, Any]:
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "schema": self.schema_digest,
+            "sources": {filename: hashlib.sha256(data).hexdigest() for filename, data in sources.items()},
+        }
+
+    def _sign(self, *parts: bytes) -> bytes:
+        mac = hmac.new(self.snapshot_key, digestmod=hashlib.sha256)
+        for part in parts:
+            mac.update(part)
+        return mac.digest()
+
+    def _read_snapshot(self, header: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        # Elavult, sérült vagy idegen fájlnál a JSON fájlokból validálunk
+        try:
+            blob = memoryview(self.snapshot_path.read_bytes())
+            magic, signature, meta_size = SNAPSHOT_PREFIX.unpack_from(blob)
+        except FileNotFoundError:
+            return None
+        except struct.error:
+            magic = signature = b""
+            meta_size = 0
+        meta = blob[SNAPSHOT_PREFIX.size:SNAPSHOT_PREFIX.size + meta_size]
+        data = blob[SNAPSHOT_PREFIX.size + meta_size:]
+        length = meta_size.to_bytes(8, "little")
+        # Az aláírást minden más előtt ellenőrizzük: a pickle betöltése kódot futtathat
+        if magic != SNAPSHOT_MAGIC or not hmac.compare_digest(signature, self._sign(length, meta, data)):
+            logger.warning("A tartalom pillanatkép aláírása érvénytelen, nem töltjük be: %s", self.snapshot_path)
+            return None
+        if json.loads(bytes(meta)) != header:
+            logger.info("A tartalom pillanatkép elavult, a JSON fájlokból töltünk: %s", self.snapshot_path)
+            return None
+        try:
+            # Sok kis objektum betöltése közben a ciklikus GC csak lassítana
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.loads(data)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        except Exception:
+            logger.warning("A tartalom pillanatkép nem olvasható: %s", self.snapshot_path, exc_info=True)
+            return None
+
+    def load(self) -> ContentSnapshot:
+        self._commit(*self._read_prepared())
+        return self.snapshot
+
+    def _read_prepared(self) -> Tuple[ContentSnapshot, List[Commit]]:
+        snapshot = self.read()
+        commits = [listener(snapshot) for listener in self._listeners]
+        return snapshot, [commit for commit in commits if commit is not None]
+
+    def _commit(self, snapshot: ContentSnapshot, commits: List[Commit]):
+        previous = self._commits
+        try:
+            for commit in commits:
+                commit()
+        except Exception:
+            # Félig átállt állapot helyett vissza a korábbi tartalomra
+            for commit in previous:
+                commit()
+            raise
+        self.snapshot = snapshot
+        self._commits = commits
+
+    async def reload_if_changed(self) -> bool:
+        signature = None
+        try:
+            signature = await asyncio.to_thread(self.signature)
+            if signature in (self.snapshot.signature, self._failed_signature):
+                return False
+            snapshot, commits = await asyncio.to_thread(self._read_prepared)
+            self._commit(snapshot, commits)
+        except Exception:
+            # Hibás tartalomnál a következő módosításig nem próbálkozunk újra
+            self._failed_signature = signature
+            logger.exception("A tartalom újratöltése sikertelen, a korábbi adatok maradnak")
+            return False
+        logger.info("Tartalom újratöltve (%s)", self.directory)
+        return True
+
+    def start_watcher(self):
+        if self._watcher is None and self.interval > 0:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch_forever())
+
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reload_if_changed()
+            except Exception:
+                # A figyelő nem állhat le egy váratlan hiba miatt
+                logger.exception("Hiba a tartalomfigyelőben")
+
+
+def header_digest(header: Dict[str, Any]) -> str:
+    return hashlib.sha256(to_json(header)).hexdigest()[:16]
+
+
+def schema_fingerprint(types: Iterable[Any]) -> str:
+    """Hash of the field layout of every model reachable from ``types``.
+
+    A snapshot written by an older model definition is then not reused.
+    """
+    parts: List[str] = []
+    seen = set()
+
+    def walk(type_):
+        for arg in get_args(type_):
+            walk(arg)
+        if isinstance(type_, type) and issubclass(type_, BaseModel) and type_ not in seen:
+            seen.add(type_)
+            for name, info in type_.model_fields.items():
+                parts.append(f"{type_.__qualname__}.{name}: {info.annotation!r} = {info.default!r}")
+                walk(info.annotation)
+
+    for type_ in types:
+        parts.append(repr(type_))
+        walk(type_)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
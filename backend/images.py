@@ -0,0 +1,215 @@
+"""Galéria bélyegképek helyi proxyja és lemezes gyorsítótára.
+
+Minden forrásképet egyszer töltünk le, kicsinyítjük, és a forrás URL
+hash-e alapján elnevezett fájlba mentjük. A gyorsítótár méretkorlátos,
+a legrégebben használt képek törlődnek először. Az újonnan regisztrált
+képeket a háttérben előre letöltjük, mert a CDN aláírt URL-jei lejárnak.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+
+from metrics import CACHE_LOOKUPS
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow nélkül az eredeti képet tároljuk
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", str(Path(__file__).parent / "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+THUMBNAIL_WIDTH = int(os.environ.get("THUMBNAIL_WIDTH", 400))
+# Abszolút URL-hez, pl. "https://api.pataky.hu"; üresen relatív útvonal marad
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "").rstrip("/")
+# A mobil kliens csak abszolút URL-t tud betölteni, ezért a proxy alapból
+# csak akkor aktív, ha a nyilvános cím ismert
+IMAGE_PROXY = os.environ.get("IMAGE_PROXY", "1" if PUBLIC_BASE_URL else "0") == "1"
+if IMAGE_PROXY and not PUBLIC_BASE_URL:
+    logger.warning("IMAGE_PROXY be van kapcsolva PUBLIC_BASE_URL nélkül, a bélyegkép URL-ek relatívak lesznek")
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Pillow nélkül csak ezeket a formátumokat tároljuk és szolgáljuk ki
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+MEDIA_TYPES = {suffix: media_type for media_type, suffix in IMAGE_TYPES.items()}
+
+
+def image_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def media_type(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix, "application/octet-stream")
+
+
+class ThumbnailCache:
+    """Fetch-once thumbnail store with an LRU size cap.
+
+    Only URLs registered through ``register`` can be fetched, so the proxy
+    cannot be used to pull arbitrary URLs. Concurrent requests for the same
+    image wait on one download. Once ``start_warmer`` has run, newly
+    registered images are fetched in the background while the cache has room.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+                 width: int = THUMBNAIL_WIDTH, timeout: float = 10.0):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.width = width
+        self.timeout = timeout
+        self.sources: Dict[str, str] = {}
+        # Pillow nélkül az eredeti kép kerül a gyorsítótárba, a saját formátumában
+        self.variant = str(width) if Image is not None else "orig"
+        self.suffixes = (".jpg",) if Image is not None else tuple(MEDIA_TYPES)
+        self.session = requests.Session()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._warmer: Optional[asyncio.Task] = None
+        self._to_warm: Dict[str, None] = {}
+        # A nyilvántartást az eseményhurok és a mentő munkaszálak is módosítják
+        self._lock = threading.Lock()
+        self._files: "OrderedDict[Path, int]" = OrderedDict()
+        self._total = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        paths = [path for suffix in MEDIA_TYPES for path in self.directory.glob(f"*{suffix}")]
+        for path in sorted(paths, key=lambda p: p.stat().st_mtime):
+            self._account(path, path.stat().st_size)
+
+    def register(self, urls: Iterable[str]):
+        sources = {image_key(url): url for url in urls}
+        new = [key for key in sources if key not in self.sources]
+        self.sources = sources
+        with self._lock:
+            self._to_warm.update(dict.fromkeys(new))
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._start_warming)
+
+    def start_warmer(self):
+        self._loop = asyncio.get_running_loop()
+        self._start_warming()
+
+    def local_url(self, url: str) -> str:
+        return f"{PUBLIC_BASE_URL}/api/images/{image_key(url)}"
+
+    def etag(self, key: str) -> str:
+        return f'"{key}-{self.variant}"'
+
+    async def get(self, key: str) -> Optional[Path]:
+        """Return the cached thumbnail path, fetching it on first use.
+
+        Returns ``None`` for unknown keys; download errors propagate. The
+        file suffix tells the format (see ``media_type``).
+        """
+        if key not in self.sources:
+            return None
+        path = self._cached(key)
+        if path is not None:
+            CACHE_LOOKUPS.inc(cache="thumbnail", result="hit")
+            return path
+        CACHE_LOOKUPS.inc(cache="thumbnail", result="miss")
+        return await self._download(key)
+
+    def _cached(self, key: str) -> Optional[Path]:
+        for suffix in self.suffixes:
+            path = self.directory / f"{key}-{self.variant}{suffix}"
+            if self._touch(path):
+                return path
+        return None
+
+    async def _download(self, key: str) -> Path:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            path = self._cached(key)
+            if path is None:
+                data, suffix = await asyncio.to_thread(self._fetch_thumbnail, self.sources[key])
+                path = self.directory / f"{key}-{self.variant}{suffix}"
+                await asyncio.to_thread(self._store, path, data)
+        self._locks.pop(key, None)
+        return path
+
+    def _start_warming(self):
+        if self._to_warm and (self._warmer is None or self._warmer.done()):
+            self._warmer = self._loop.create_task(self._warm())
+
+    async def _warm(self):
+        while True:
+            with self._lock:
+                if not self._to_warm or self._total >= self.max_bytes:
+                    # Tele gyorsítótárnál nem szorítjuk ki a használt képeket
+                    self._to_warm.clear()
+                    return
+                key = next(iter(self._to_warm))
+                del self._to_warm[key]
+            if key not in self.sources or self._cached(key) is not None:
+                continue
+            try:
+                await self._download(key)
+            except Exception as exc:
+                # Nem végzetes: az első kéréskor újra megpróbáljuk
+                logger.warning("Bélyegkép előtöltése sikertelen: %s (%s)", key, exc)
+
+    def _touch(self, path: Path) -> bool:
+        try:
+            os.utime(path)
+            size = path.stat().st_size
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(path)
+            return False
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+            else:
+                # Egy másik worker már letöltötte
+                self._account(path, size)
+        return True
+
+    def _fetch_thumbnail(self, url: str) -> Tuple[bytes, str]:
+        """Download and shrink ``url``; returns the data and its file suffix."""
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError(f"Túl nagy forráskép: {url}")
+        if Image is None:
+            if content_type not in IMAGE_TYPES:
+                raise ValueError(f"Nem támogatott képformátum ({content_type or 'ismeretlen'}): {url}")
+            return data, IMAGE_TYPES[content_type]
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail((self.width, self.width * 4))
+            out = io.BytesIO()
+            img.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+            return out.getvalue(), ".jpg"
+
+    def _store(self, path: Path, data: bytes):
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._account(path, len(data))
+            while self._total > self.max_bytes and len(self._files) > 1:
+                oldest = next(iter(self._files))
+                oldest.unlink(missing_ok=True)
+                self._forget(oldest)
+
+    def _account(self, path: Path, size: int):
+        self._forget(path)
+        self._files[path] = size
+        self._total += size
+
+    def _forget(self, path: Path):
+        self._total -= self._files.pop(path, 0)
+
+    def close(self):
+        if self._warmer is not None:
+            self._warmer.cancel()
+        self.session.close()
@@ -0,0 +1,126 @@
+"""Memóriabeli indexek a tartalmi listákhoz."""
+import base64
+import binascii
+from bisect import bisect_left
+from operator import attrgetter
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _IndexState(NamedTuple):
+    items: Tuple[Any, ...]
+    by_key: Dict[Hashable, Any]
+    positions: Dict[Hashable, int]
+    secondary: Dict[str, Dict[Hashable, Tuple[Any, ...]]]
+    # Rendezett gyűjteménynél a rendezési értékek, az elemekkel azonos sorrendben
+    order_values: Tuple[Any, ...]
+    secondary_order_values: Dict[str, Dict[Hashable, Tuple[Any, ...]]]
+
+
+class IndexedCollection(Generic[T]):
+    """A list with an id map and optional secondary indexes.
+
+    ``indexes`` map an index name to a function returning the indexed value
+    of an item. With ``order`` the items (and every secondary index) are
+    kept sorted by that value, which enables ``between`` range queries.
+    ``reload`` builds the whole state first and then swaps it in with a
+    single assignment, so readers never see a half-built index.
+    """
+
+    def __init__(self, items: Iterable[T] = (), key: Callable[[T], Hashable] = attrgetter("id"),
+                 indexes: Optional[Dict[str, Callable[[T], Hashable]]] = None,
+                 order: Optional[Callable[[T], Any]] = None):
+        self.key = key
+        self.indexes = indexes or {}
+        self.order = order
+        self.reload(items)
+
+    def reload(self, items: Iterable[T]):
+        items = tuple(items)
+        if self.order is not None:
+            items = tuple(sorted(items, key=self.order))
+        by_key = {self.key(item): item for item in items}
+        positions = {self.key(item): pos for pos, item in enumerate(items)}
+        secondary: Dict[str, Dict[Hashable, List[T]]] = {}
+        for name, func in self.indexes.items():
+            index = secondary[name] = {}
+            for item in items:
+                index.setdefault(func(item), []).append(item)
+        secondary_items = {name: {value: tuple(found) for value, found in index.items()}
+                           for name, index in secondary.items()}
+        order_values: Tuple[Any, ...] = ()
+        secondary_order_values: Dict[str, Dict[Hashable, Tuple[Any, ...]]] = {}
+        if self.order is not None:
+            order_values = tuple(map(self.order, items))
+            secondary_order_values = {
+                name: {value: tuple(map(self.order, found)) for value, found in index.items()}
+                for name, index in secondary_items.items()
+            }
+        self._state = _IndexState(items, by_key, positions, secondary_items,
+                                  order_values, secondary_order_values)
+
+    def rebuilt(self, items: Iterable[T]) -> "IndexedCollection[T]":
+        """A new collection over ``items`` with the same key, indexes and order."""
+        return IndexedCollection(items, self.key, self.indexes, self.order)
+
+    def get(self, key: Hashable) -> Optional[T]:
+        return self._state.by_key.get(key)
+
+    def find(self, index: str, value: Hashable) -> Tuple[T, ...]:
+        return self._state.secondary[index].get(value, ())
+
+    def page(self, after: Optional[Hashable], limit: int) -> Tuple[Tuple[T, ...], Optional[Hashable]]:
+        """Return up to ``limit`` items following the item keyed ``after``.
+
+        The second value is the key to continue from, or ``None`` on the last
+        page. Raises ``KeyError`` for an unknown ``after`` key.
+        """
+        state = self._state
+        start = 0 if after is None else state.positions[after] + 1
+        items = state.items[start:start + limit]
+        more = start + limit < len(state.items)
+        return items, (self.key(items[-1]) if items and more else None)
+
+    def between(self, low: Any = None, high: Any = None, limit: Optional[int] = None,
+                reverse: bool = False, index: Optional[str] = None, value: Hashable = None) -> Tuple[T, ...]:
+        """Items whose order value is in ``[low, high)``, optionally within one
+        secondary index value; ``reverse`` starts from the high end.
+
+        Uses binary search, so the cost depends on the result size only.
+        """
+        if self.order is None:
+            raise TypeError("between() needs an ordered collection")
+        state = self._state
+        if index is None:
+            items, values = state.items, state.order_values
+        else:
+            items = state.secondary[index].get(value, ())
+            values = state.secondary_order_values[index].get(value, ())
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_left(values, high, start)
+        if limit is not None:
+            if reverse:
+                start = max(start, end - limit)
+            else:
+                end = min(end, start + limit)
+        found = items[start:end]
+        return found[::-1] if reverse else found
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._state.items)
+
+    def __len__(self) -> int:
+        return len(self._state.items)
+
+
+def encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Raises ``ValueError`` for a cursor that was not made by ``encode_cursor``."""
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError(cursor) from exc
@@ -0,0 +1,195 @@
+"""Üzemeltetési parancsok.
+
+A backend/ mappából futtatandó::
+
+    python manage.py build-snapshot
+    python manage.py startup-time --runs 5
+    python manage.py serve --workers 4 --shared
+
+A ``build-snapshot`` a validált tartalmat és a belőle számolt keresőindexeket
+egy aláírt pillanatkép fájlba írja (lásd content.py; a kulcs a
+``CONTENT_SNAPSHOT_KEY`` környezeti változó); deploy után és minden
+tartalommódosítás után érdemes futtatni, elavult fájlnál a workerek a JSON
+fájlokból töltenek. A ``startup-time`` friss folyamatokban méri az import és
+az első kérés idejét pillanatképpel és nélküle. A ``serve --shared`` a
+workerek indítása előtt a pillanatképet és a közös válaszrégiót is
+elkészíti (lásd shared.py); kulcs nélkül egy alkalmit generál.
+"""
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import typer
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+app = typer.Typer(add_completion=False, help=__doc__)
+
+# Friss interpreterben fut, hogy a modulok importja is beleszámítson
+STARTUP_PROBE = """
+import time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+import asyncio, json, sys, httpx
+
+async def main():
+    begin = time.perf_counter()
+    await server.app.router.startup()
+    ready = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://probe") as client:
+        response = await client.get(sys.argv[1])
+    done = time.perf_counter()
+    print(json.dumps({
+        "status": response.status_code,
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - begin) * 1000,
+        "first_request_ms": (done - ready) * 1000,
+    }), flush=True)
+    await server.app.router.shutdown()
+
+asyncio.run(main())
+"""
+
+
+def use_content_dir(content_dir: Optional[Path]):
+    if content_dir is not None:
+        os.environ["CONTENT_DIR"] = str(content_dir.resolve())
+
+
+def default_shared_path() -> Path:
+    from content import CONTENT_DIR
+    from shared import CONTENT_SHARED_PATH, SHARED_FILENAME
+
+    return Path(CONTENT_SHARED_PATH or Path(CONTENT_DIR) / SHARED_FILENAME)
+
+
+def import_server():
+    # A build maga mindig a JSON fájlokból validál és helyben szerializál
+    os.environ["CONTENT_SNAPSHOT"] = "0"
+    os.environ["CONTENT_SHARED_PATH"] = ""
+    os.environ.setdefault("PUSH_SCHEDULE_ENABLED", "0")
+    import server
+
+    return server
+
+
+@app.command("build-snapshot")
+def build_snapshot(
+    content_dir: Optional[Path] = typer.Option(None, help="Tartalom mappa (alapból CONTENT_DIR)"),
+):
+    """A validált tartalom és a keresőindexek mentése a pillanatkép fájlba."""
+    use_content_dir(content_dir)
+    server = import_server()
+    start = time.perf_counter()
+    try:
+        path = server.content_store.build_snapshot(server.derive_content)
+    except ValueError as exc:
+        typer.echo(str(exc), err=True)
+        raise typer.Exit(1)
+    took = time.perf_counter() - start
+    typer.echo(f"Pillanatkép: {path} ({path.stat().st_size / 1024:.0f} KiB, {took * 1000:.0f} ms)")
+
+
+@app.command("build-shared")
+def build_shared(
+    content_dir: Optional[Path] = typer.Option(None, help="Tartalom mappa (alapból CONTENT_DIR)"),
+    output: Optional[Path] = typer.Option(None, help="Régió fájl (alapból CONTENT_SHARED_PATH)"),
+):
+    """A pillanatkép és az összes előre szerializált válasz a közös régió fájlba."""
+    use_content_dir(content_dir)
+    output = output or default_shared_path()
+    server = import_server()
+    from shared import write_region
+
+    start = time.perf_counter()
+    snapshot_path = None
+    # A régió a pillanatkép nélkül is használható, az csak a workerek indulását gyorsítja
+    if server.content_store.snapshot_key:
+        snapshot_path = server.content_store.build_snapshot(server.derive_content)
+    size = write_region(output, server.content_store.snapshot.digest, server.response_cache.entries())
+    took = time.perf_counter() - start
+    typer.echo(f"Pillanatkép: {snapshot_path or 'nincs (CONTENT_SNAPSHOT_KEY nélkül)'}")
+    typer.echo(f"Megosztott régió: {output} ({size / 1024:.0f} KiB, {took * 1000:.0f} ms)")
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("0.0.0.0"),
+    port: int = typer.Option(int(os.environ.get("PORT", 8000))),
+    workers: int = typer.Option(1, min=1, help="Uvicorn workerek száma"),
+    shared: bool = typer.Option(False, help="Közös, memóriába képzett válaszrégió a workereknek"),
+    content_dir: Optional[Path] = typer.Option(None, help="Tartalom mappa (alapból CONTENT_DIR)"),
+):
+    """Uvicorn indítása; ``--shared`` esetén előtte elkészül a közös régió."""
+    use_content_dir(content_dir)
+    if shared:
+        # A build és a workerek ugyanazt a kulcsot öröklik
+        os.environ.setdefault("CONTENT_SNAPSHOT_KEY", secrets.token_hex(32))
+        path = default_shared_path()
+        os.environ["CONTENT_SHARED_PATH"] = str(path)
+        # Külön folyamatban, hogy a master ne tartsa a tartalmat a memóriában
+        subprocess.run([sys.executable, __file__, "build-shared", "--output", str(path)],
+                       cwd=BACKEND_DIR, check=True)
+    import uvicorn
+
+    uvicorn.run("server:app", host=host, port=port, workers=workers, app_dir=str(BACKEND_DIR))
+
+
+def probe(path: str, env: Dict[str, str]) -> Dict[str, float]:
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", STARTUP_PROBE, path], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline()
+    # Folyamat indításától az első válaszig, az interpreter indulásával együtt
+    ready_ms = (time.perf_counter() - start) * 1000
+    process.stdout.read()
+    if process.wait() != 0 or not line:
+        raise typer.BadParameter(f"A mérő folyamat hibával állt le ({process.returncode})")
+    result = json.loads(line)
+    result["ready_ms"] = ready_ms
+    return result
+
+
+@app.command("startup-time")
+def startup_time(
+    runs: int = typer.Option(5, min=1, help="Mérések száma módonként"),
+    path: str = typer.Option("/api/bootstrap", help="Az első kérés útvonala"),
+    content_dir: Optional[Path] = typer.Option(None, help="Tartalom mappa (alapból CONTENT_DIR)"),
+):
+    """Import, indulás és első kérés ideje friss folyamatokban, pillanatképpel és nélküle."""
+    use_content_dir(content_dir)
+    columns = ("import_ms", "startup_ms", "first_request_ms", "ready_ms")
+    with tempfile.TemporaryDirectory() as workdir:
+        base_env = {
+            **os.environ,
+            "PUSH_SCHEDULE_ENABLED": "0",
+            "TOKEN_DB_PATH": os.environ.get("TOKEN_DB_PATH", str(Path(workdir) / "tokens.db")),
+            "IMAGE_CACHE_DIR": os.environ.get("IMAGE_CACHE_DIR", str(Path(workdir) / "images")),
+            # Friss pillanatkép egy alkalmi kulccsal, hogy a mérés a mostani tartalmat használja
+            "CONTENT_SNAPSHOT_PATH": str(Path(workdir) / "snapshot.pickle"),
+            "CONTENT_SNAPSHOT_KEY": secrets.token_hex(32),
+        }
+        subprocess.run([sys.executable, __file__, "build-snapshot"], cwd=BACKEND_DIR, env=base_env,
+                       check=True, stdout=subprocess.DEVNULL)
+        typer.echo(f"{'mód':<10}" + "".join(f"{name:>20}" for name in columns) + "  (medián / min)")
+        for mode, enabled in (("json", "0"), ("snapshot", "1")):
+            results: List[Dict[str, float]] = [
+                probe(path, {**base_env, "CONTENT_SNAPSHOT": enabled}) for _ in range(runs)
+            ]
+            cells = "".join(
+                f"{statistics.median(r[name] for r in results):>11.1f} /{min(r[name] for r in results):>7.1f}"
+                for name in columns
+            )
+            typer.echo(f"{mode:<10}{cells}")
+
+
+if __name__ == "__main__":
+    app()
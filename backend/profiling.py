@@ -0,0 +1,192 @@
+"""Kérésenkénti mintavételező profilozás, admin jogosultsághoz kötve.
+
+Egy kérés profilozható ``X-Profile: 1`` fejléccel vagy ``?_profile=1``
+paraméterrel, ha érvényes ``X-Admin-Token`` is jár mellé; ezen felül a
+``PROFILE_SAMPLE_RATE`` százalékban megadott arányú kérés magától is
+profilozódik, percenként legfeljebb ``PROFILE_MAX_PER_MINUTE`` darab. Az
+eredmény összehajtott veremlista (flamegraph.pl / speedscope formátum).
+"""
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from pydantic import BaseModel, Field
+
+from auth import ADMIN_HEADER, ADMIN_TOKEN, is_admin
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_MAX_PER_MINUTE = int(os.environ.get("PROFILE_MAX_PER_MINUTE", 6))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.001))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 100))
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY = "_profile"
+# Hosszú életű kapcsolatok, ezeket sosem profilozzuk
+SKIPPED_PATHS = {"/api/stream"}
+
+
+class ProfileInfo(BaseModel):
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex[:12])
+    method: str
+    path: str
+    status: int = 0
+    sampled: bool  # True: véletlen mintavétel, False: kézi kérés
+    duration_ms: float = 0.0
+    samples: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    # A site-packages alatti fájloknál a csomag neve is kell, a sajátjainknál elég a fájlnév
+    name = "/".join(path.parts[-2:]) if "site-packages" in path.parts else path.name
+    return f"{code.co_name} ({name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack every ``interval`` seconds from a helper thread.
+
+    The request runs on the event loop thread, so the profile also shows
+    whatever else the loop did meanwhile (other requests, waiting in
+    ``select``); work handed to ``asyncio.to_thread`` is not included.
+    Requests of a few milliseconds get few or no samples; for those the
+    merged profile of many requests is the useful view.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class ProfileStore:
+    """Keeps the last ``keep`` profiles in memory."""
+
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self.profiles: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+        self.keep = keep
+
+    def add(self, info: ProfileInfo, folded: str):
+        self.profiles[info.id] = (info, folded)
+        while len(self.profiles) > self.keep:
+            self.profiles.popitem(last=False)
+
+    def list(self) -> List[ProfileInfo]:
+        return [info for info, _ in reversed(self.profiles.values())]
+
+    def get(self, profile_id: str) -> Optional[tuple]:
+        return self.profiles.get(profile_id)
+
+    def merged(self, path: Optional[str] = None) -> str:
+        """Sum the folded stacks of all kept profiles (optionally of one path)."""
+        total: Dict[str, int] = collections.Counter()
+        for info, folded in self.profiles.values():
+            if path is not None and info.path != path:
+                continue
+            for line in folded.splitlines():
+                stack, _, count = line.rpartition(" ")
+                total[stack] += int(count)
+        return "".join(f"{stack} {count}\n" for stack, count in total.items())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that runs selected requests under the stack sampler.
+
+    Only one request is profiled at a time; the profile id is returned in
+    the ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 max_per_minute: int = PROFILE_MAX_PER_MINUTE):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate / 100
+        self.max_per_minute = max_per_minute
+        self._recent: Deque[float] = collections.deque()
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._busy or scope["path"] in SKIPPED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        sampled = False
+        # Admin token nélkül a kézi profilozás ki van kapcsolva, a fejléceket sem nézzük
+        if not (ADMIN_TOKEN and self._requested(scope)):
+            if not self.sample_rate or random.random() >= self.sample_rate or not self._allow_sample():
+                await self.app(scope, receive, send)
+                return
+            sampled = True
+
+        info = ProfileInfo(method=scope["method"], path=scope["path"], sampled=sampled)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                info.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", info.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        self._busy = True
+        sampler = StackSampler(threading.get_ident())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            self._busy = False
+            info.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            info.samples = sampler.samples
+            self.store.add(info, sampler.folded())
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        headers = dict(scope["headers"])
+        flag = headers.get(PROFILE_HEADER.encode(), b"").decode()
+        if not flag:
+            flag = parse_qs(scope.get("query_string", b"").decode()).get(PROFILE_QUERY, [""])[0]
+        if flag not in ("1", "true"):
+            return False
+        return is_admin(headers.get(ADMIN_HEADER.encode(), b"").decode() or None)
+
+    def _allow_sample(self) -> bool:
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_per_minute:
+            return False
+        self._recent.append(now)
+        return True
@@ -0,0 +1,392 @@
+"""Expo push értesítések küldése háttérben, közös keep-alive kapcsolatkészlettel.
+
+A feladatok állapota és a nyugtára váró jegyek a közös token tárolóban
+vannak, így bármelyik worker le tudja kérdezni őket, és a nyugtákat is
+bármelyik feldolgozhatja.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import requests
+from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+
+from metrics import DURATION_BUCKETS, REGISTRY
+from token_store import TokenStore
+
+logger = logging.getLogger(__name__)
+
+EXPO_PUSH_URL = os.environ.get("EXPO_PUSH_URL", "https://exp.host/--/api/v2/push/send")
+EXPO_RECEIPTS_URL = os.environ.get(
+    "EXPO_RECEIPTS_URL", EXPO_PUSH_URL.rsplit("/", 1)[0] + "/getReceipts"
+)
+# Az Expo legfeljebb 100 üzenetet fogad el egy kérésben
+EXPO_MAX_BATCH = 100
+# ...és legfeljebb 1000 nyugta azonosítót egy lekérdezésben
+EXPO_MAX_RECEIPT_BATCH = 1000
+PUSH_CONCURRENCY = int(os.environ.get("PUSH_CONCURRENCY", 6))
+PUSH_MAX_RETRIES = int(os.environ.get("PUSH_MAX_RETRIES", 3))
+PUSH_BACKOFF_BASE = float(os.environ.get("PUSH_BACKOFF_BASE", 0.5))
+
+# Nyugták lekérdezése: az Expo ~15 perc után ajánlja, és kb. 24 óráig őrzi őket
+PUSH_RECEIPT_DELAY = float(os.environ.get("PUSH_RECEIPT_DELAY", 15 * 60))
+PUSH_RECEIPT_INTERVAL = float(os.environ.get("PUSH_RECEIPT_INTERVAL", 60))
+PUSH_RECEIPT_MAX_AGE = 24 * 60 * 60
+# Ennyi legutóbbi feladatot őrzünk meg a tárolóban
+PUSH_JOB_HISTORY = int(os.environ.get("PUSH_JOB_HISTORY", 200))
+# A nyugták lekérdezését körönként egy worker végzi
+RECEIPT_LEASE = "push-receipts"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Ezekkel a hibákkal a token végleg használhatatlan, törölni kell
+PERMANENT_TOKEN_ERRORS = {"DeviceNotRegistered"}
+
+PUSH_JOBS = REGISTRY.counter("push_jobs_total", "Finished push jobs by status.", ("status",))
+PUSH_FANOUT = REGISTRY.histogram(
+    "push_fanout_duration_seconds", "Time from submit to the last chunk answered.", buckets=DURATION_BUCKETS)
+PUSH_CHUNKS = REGISTRY.counter("push_chunks_total", "Push chunks by outcome.", ("result",))
+PUSH_CHUNK_RETRIES = REGISTRY.counter("push_chunk_retries_total", "Chunk send retries.")
+PUSH_TICKETS = REGISTRY.counter("push_tickets_total", "Push tickets by status.", ("result",))
+PUSH_RECEIPTS = REGISTRY.counter("push_receipts_total", "Push receipts by outcome.", ("outcome",))
+PUSH_EVICTED = REGISTRY.counter("push_tokens_evicted_total", "Tokens removed as permanently invalid.")
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ChunkResult(BaseModel):
+    index: int
+    size: int
+    ok: bool = False
+    attempts: int = 0
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class DeliveryStats(BaseModel):
+    tickets_ok: int = 0
+    ticket_errors: int = 0
+    pending: int = 0
+    delivered: int = 0
+    receipt_errors: int = 0
+    expired: int = 0
+    evicted: int = 0
+    errors: Dict[str, int] = {}
+
+
+def count(counts: Dict[str, int], key: str, value: int = 1):
+    counts[key] = counts.get(key, 0) + value
+
+
+class PushJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    body: str
+    topic: Optional[str] = None  # None: minden regisztrált eszköz
+    status: str = "queued"  # queued, running, done, failed
+    device_count: int = 0
+    sent: int = 0
+    failed: int = 0
+    chunks: List[ChunkResult] = []
+    message: Optional[str] = None
+    delivery: DeliveryStats = Field(default_factory=DeliveryStats)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+class PushDispatcher:
+    """Queues broadcasts as asyncio tasks so the request handler returns at once.
+
+    The blocking ``requests`` call runs in a worker thread over one shared
+    ``Session``, so TLS connections to Expo are reused between broadcasts.
+    Tokens are split into Expo-sized chunks which are sent concurrently, at
+    most ``concurrency`` at a time, retrying 429/5xx answers with backoff.
+
+    Job records and the ticket ids from each send are kept in ``store``
+    (shared by all workers) until the receipt poller fetches their
+    receipts; tokens that Expo reports as permanently invalid are handed to
+    ``on_invalid_token`` so they drop out of later broadcasts.
+    """
+
+    def __init__(self, store: TokenStore, url: str = EXPO_PUSH_URL, receipts_url: str = EXPO_RECEIPTS_URL,
+                 chunk_size: int = EXPO_MAX_BATCH,
+                 concurrency: int = PUSH_CONCURRENCY, max_retries: int = PUSH_MAX_RETRIES,
+                 backoff_base: float = PUSH_BACKOFF_BASE, timeout: float = 10.0,
+                 max_jobs: int = PUSH_JOB_HISTORY,
+                 on_invalid_token: Optional[Callable[[str], None]] = None,
+                 receipt_delay: float = PUSH_RECEIPT_DELAY,
+                 receipt_interval: float = PUSH_RECEIPT_INTERVAL):
+        self.store = store
+        self.owner = uuid.uuid4().hex
+        self.url = url
+        self.receipts_url = receipts_url
+        self.on_invalid_token = on_invalid_token
+        self.receipt_delay = receipt_delay
+        self.receipt_interval = receipt_interval
+        self._poller: Optional[asyncio.Task] = None
+        self.chunk_size = min(chunk_size, EXPO_MAX_BATCH)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, title: str, body: str, tokens: Iterable[str], topic: Optional[str] = None,
+                     on_done: Optional[Callable[[PushJob], None]] = None) -> PushJob:
+        """Queue a broadcast; ``tokens`` may be a lazy iterable (e.g. a token store).
+
+        The job is stored before this returns, so any worker can report it.
+        ``on_done`` runs in a worker thread once the job has finished.
+        """
+        job = PushJob(title=title, body=body, topic=topic)
+        await asyncio.to_thread(self._save, job)
+        task = asyncio.get_running_loop().create_task(self._run(job, tokens, on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def get(self, job_id: str) -> Optional[PushJob]:
+        record = await asyncio.to_thread(self.store.get_job, job_id)
+        return PushJob.model_validate(record) if record is not None else None
+
+    async def recent(self) -> List[PushJob]:
+        """The stored jobs, newest first."""
+        records = await asyncio.to_thread(self.store.recent_jobs, self.max_jobs)
+        return [PushJob.model_validate(record) for record in records]
+
+    def start_receipt_poller(self):
+        if self._poller is None:
+            self._poller = asyncio.get_running_loop().create_task(self._poll_forever())
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.session.close()
+
+    def _save(self, job: PushJob):
+        # A kézbesítési számlálókat a tároló külön, növelésekkel vezeti
+        record = job.model_dump(mode="json", exclude={"delivery"})
+        self.store.save_job(job.id, job.created_at.timestamp(), record, self.max_jobs)
+
+    async def _run(self, job: PushJob, tokens: Iterable[str],
+                   on_done: Optional[Callable[[PushJob], None]] = None):
+        job.status = "running"
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._save, job)
+        except Exception:
+            logger.exception("Push feladat mentése sikertelen (%s)", job.id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = chunked(tokens, self.chunk_size)
+        tasks: List[asyncio.Task] = []
+
+        async def send(index: int, chunk: List[str]) -> ChunkResult:
+            try:
+                return await self._send_chunk(job, index, chunk)
+            finally:
+                semaphore.release()
+
+        try:
+            # A következő adag tokent csak akkor olvassuk be, ha van szabad hely
+            while True:
+                await semaphore.acquire()
+                chunk = await asyncio.to_thread(next, batches, None)
+                if chunk is None:
+                    semaphore.release()
+                    break
+                job.device_count += len(chunk)
+                tasks.append(asyncio.create_task(send(len(tasks), chunk)))
+        except Exception as exc:
+            logger.exception("Push címzettek beolvasása sikertelen (%s)", job.id)
+            job.message = str(exc)
+        try:
+            job.chunks = await asyncio.gather(*tasks)
+            job.sent = sum(c.size for c in job.chunks if c.ok)
+            job.failed = job.device_count - job.sent
+            if not job.device_count and job.message is None:
+                job.message = "Nincs regisztrált eszköz."
+                job.status = "done"
+            else:
+                job.status = "done" if job.sent else "failed"
+        except Exception as exc:
+            logger.exception("Push küldés sikertelen (%s)", job.id)
+            job.status = "failed"
+            job.message = str(exc)
+        finally:
+            job.finished_at = datetime.utcnow()
+            PUSH_JOBS.inc(status=job.status)
+            PUSH_FANOUT.observe(time.perf_counter() - started)
+            try:
+                await asyncio.to_thread(self._save, job)
+            except Exception:
+                logger.exception("Push feladat mentése sikertelen (%s)", job.id)
+            if on_done is not None:
+                await asyncio.to_thread(on_done, job)
+
+    async def _send_chunk(self, job: PushJob, index: int, tokens: List[str]) -> ChunkResult:
+        result = ChunkResult(index=index, size=len(tokens))
+        messages = [
+            {"to": token, "title": job.title, "body": job.body, "sound": "default"}
+            for token in tokens
+        ]
+        while True:
+            result.attempts += 1
+            retry_after = None
+            try:
+                status_code, retry_after, payload = await asyncio.to_thread(self._post, messages)
+                result.status_code = status_code
+                if status_code < 300:
+                    result.ok = True
+                    result.error = None
+                    PUSH_CHUNKS.inc(result="ok")
+                    await self._record_tickets(job, tokens, payload)
+                    return result
+                result.error = str(payload)[:200]
+                retryable = status_code in RETRYABLE_STATUS
+            except requests.RequestException as exc:
+                result.error = str(exc)
+                retryable = True
+            if not retryable or result.attempts > self.max_retries:
+                logger.warning("Push chunk %d sikertelen (%s): %s", index, job.id, result.error)
+                PUSH_CHUNKS.inc(result="failed")
+                return result
+            PUSH_CHUNK_RETRIES.inc()
+            await asyncio.sleep(self._backoff(result.attempts, retry_after))
+
+    async def _record_tickets(self, job: PushJob, tokens: List[str], payload: Any):
+        # A jegyek sorrendje megegyezik az elküldött üzenetekével
+        tickets = payload.get("data", []) if isinstance(payload, dict) else []
+        accepted: List[Tuple[str, str]] = []
+        invalid: List[str] = []
+        counts: Dict[str, int] = {}
+        for token, ticket in zip(tokens, tickets):
+            if ticket.get("status") == "ok" and ticket.get("id"):
+                PUSH_TICKETS.inc(result="ok")
+                accepted.append((ticket["id"], token))
+            else:
+                PUSH_TICKETS.inc(result="error")
+                error = (ticket.get("details") or {}).get("error") or "Unknown"
+                count(counts, "ticket_errors")
+                count(counts, f"errors.{error}")
+                if error in PERMANENT_TOKEN_ERRORS:
+                    invalid.append(token)
+        count(counts, "tickets_ok", len(accepted))
+        count(counts, "pending", len(accepted))
+        count(counts, "evicted", len(invalid))
+        try:
+            await asyncio.to_thread(self.store.add_tickets, job.id, accepted, time.time(), counts)
+        except Exception:
+            # Az értesítés kiment; csak a nyugta követés marad el
+            logger.exception("Push jegyek mentése sikertelen (%s)", job.id)
+        for token in invalid:
+            self._evict(token)
+
+    def _evict(self, token: str):
+        PUSH_EVICTED.inc()
+        if self.on_invalid_token is not None:
+            try:
+                self.on_invalid_token(token)
+            except Exception:
+                logger.exception("Token törlése sikertelen")
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.receipt_interval)
+            try:
+                if await asyncio.to_thread(self.store.acquire_lease, RECEIPT_LEASE, self.owner,
+                                           self.receipt_interval):
+                    await self.poll_receipts()
+            except Exception:
+                logger.exception("Push nyugták lekérdezése sikertelen")
+
+    async def poll_receipts(self, min_age: Optional[float] = None):
+        """Fetch receipts for tickets older than ``min_age`` seconds."""
+        min_age = self.receipt_delay if min_age is None else min_age
+        now = time.time()
+        after = None
+        while True:
+            due = await asyncio.to_thread(self.store.due_tickets, now - min_age, EXPO_MAX_RECEIPT_BATCH, after)
+            if not due:
+                return
+            after = (due[-1][3], due[-1][0])
+            response = await asyncio.to_thread(
+                self.session.post, self.receipts_url, json={"ids": [ticket[0] for ticket in due]},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            receipts = response.json().get("data", {})
+            settled: List[str] = []
+            counts: Dict[str, Dict[str, int]] = {}
+            invalid: List[str] = []
+            for ticket_id, job_id, token, sent_at in due:
+                receipt = receipts.get(ticket_id)
+                if receipt is None:
+                    # Még nincs nyugta; túl régi jegyeket már nem várunk
+                    if now - sent_at <= PUSH_RECEIPT_MAX_AGE:
+                        continue
+                    outcome, error = "expired", None
+                elif receipt.get("status") == "ok":
+                    outcome, error = "delivered", None
+                else:
+                    outcome = "receipt_errors"
+                    error = (receipt.get("details") or {}).get("error") or "Unknown"
+                PUSH_RECEIPTS.inc(outcome=outcome)
+                settled.append(ticket_id)
+                job_counts = counts.setdefault(job_id, {})
+                count(job_counts, "pending", -1)
+                count(job_counts, outcome)
+                if error is not None:
+                    count(job_counts, f"errors.{error}")
+                    if error in PERMANENT_TOKEN_ERRORS:
+                        count(job_counts, "evicted")
+                        invalid.append(token)
+            if settled:
+                await asyncio.to_thread(self.store.settle_tickets, settled, counts)
+            for token in invalid:
+                self._evict(token)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        delay = self.backoff_base * 2 ** (attempt - 1)
+        return delay + random.uniform(0, self.backoff_base)
+
+    def _post(self, messages: List[Dict[str, Any]]) -> Tuple[int, Optional[float], Any]:
+        response = self.session.post(self.url, json=messages, timeout=self.timeout)
+        retry_after = response.headers.get("Retry-After")
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = response.text
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        return response.status_code, retry_after, payload
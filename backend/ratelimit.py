@@ -0,0 +1,157 @@
+"""Sebességkorlátozás és a push küldések kölcsönös kizárása.
+
+A token bucket állapota és a küldési zár a token tárolóban van, így minden
+worker ugyanazt a keretet és ugyanazt a zárat látja.
+
+``RATE_LIMITS`` felülírja az alapértelmezett kereteket, pl.
+``register-token=300/60,push=5/300`` (kérés/másodperc); ``0/…`` kikapcsol.
+
+A kliensenkénti keretek a kliens IP címére vonatkoznak. Proxy vagy iskolai
+NAT mögött sok eszköz osztozik egy címen, ezért ezek csak akkor élnek, ha a
+cím valóban a klienst azonosítja: ``TRUST_PROXY_HEADERS=1`` (a proxy adja át
+a címet) vagy ``RATE_LIMIT_PER_CLIENT=1`` (közvetlenül elérhető szerver).
+Egyébként csak a globális keretek maradnak.
+"""
+import asyncio
+import logging
+import math
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+# Proxy mögött a kliens címe az X-Forwarded-For első eleme
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "0") == "1"
+# Kliensenkénti keretek; proxy beállítás nélkül a cím megosztott lehet
+RATE_LIMIT_PER_CLIENT = os.environ.get("RATE_LIMIT_PER_CLIENT", "1" if TRUST_PROXY_HEADERS else "0") == "1"
+# Egy küldés legfeljebb ennyi ideig tarthatja a zárat (ha a worker közben leáll)
+PUSH_GATE_TTL = float(os.environ.get("PUSH_GATE_TTL", 15 * 60))
+PUSH_GATE_RETRY_AFTER = 30
+
+RATE_LIMITED = REGISTRY.counter("rate_limited_total", "Requests rejected with 429.", ("limit",))
+
+
+@dataclass(frozen=True)
+class Limit:
+    requests: int
+    seconds: float
+    per_client: bool = True
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.seconds
+
+
+# A register-token keret egy osztálynyi, egy címen osztozó eszközt is elbír
+DEFAULT_LIMITS = {
+    "register-token": Limit(300, 60),
+    "push": Limit(5, 300),
+    # Az egész iskolának szóló küldések összesen, kliensektől függetlenül
+    "push-global": Limit(20, 3600, per_client=False),
+}
+
+
+def parse_limits(spec: str, defaults: Dict[str, Limit] = DEFAULT_LIMITS) -> Dict[str, Limit]:
+    limits = dict(defaults)
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        requests, _, seconds = value.partition("/")
+        name = name.strip()
+        per_client = limits[name].per_client if name in limits else True
+        limits[name] = Limit(int(requests), float(seconds or 60), per_client)
+    return {name: limit for name, limit in limits.items() if limit.requests > 0}
+
+
+def client_id(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """Per-route, per-client token buckets stored in the token store.
+
+    ``limit(name)`` returns a FastAPI dependency that answers 429 with
+    ``Retry-After`` when the bucket is empty. Unless ``per_client`` is set,
+    per-client limits are dropped, since the client address may be shared.
+    """
+
+    def __init__(self, store, limits: Optional[Dict[str, Limit]] = None, enabled: bool = RATE_LIMIT_ENABLED,
+                 per_client: bool = RATE_LIMIT_PER_CLIENT):
+        self.store = store
+        limits = parse_limits(os.environ.get("RATE_LIMITS", "")) if limits is None else limits
+        if not per_client:
+            skipped = sorted(name for name, limit in limits.items() if limit.per_client)
+            if enabled and skipped:
+                logger.warning("Kliensenkénti keretek kikapcsolva proxy beállítás nélkül: %s "
+                               "(TRUST_PROXY_HEADERS=1 vagy RATE_LIMIT_PER_CLIENT=1)", ", ".join(skipped))
+            limits = {name: limit for name, limit in limits.items() if not limit.per_client}
+        self.limits = limits
+        self.enabled = enabled
+
+    def limit(self, *names: str):
+        async def dependency(request: Request):
+            if not self.enabled:
+                return
+            for name in names:
+                await self.check(name, request)
+
+        return dependency
+
+    async def check(self, name: str, request: Request):
+        limit = self.limits.get(name)
+        if limit is None:
+            return
+        key = f"{name}:{client_id(request)}" if limit.per_client else name
+        wait = await asyncio.to_thread(self.store.take_token, key, limit.rate, limit.requests)
+        if wait > 0:
+            RATE_LIMITED.inc(limit=name)
+            raise HTTPException(
+                status_code=429,
+                detail="Túl sok kérés, próbáld újra később.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+class BroadcastGate:
+    """Lets only one push fan-out run at a time across all workers.
+
+    Backed by a token store lease that the finishing job releases; the TTL
+    frees it if a worker dies mid-send.
+    """
+
+    def __init__(self, store, name: str = "push-broadcast", ttl: float = PUSH_GATE_TTL):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+
+    async def try_acquire(self) -> Optional[str]:
+        owner = uuid.uuid4().hex
+        acquired = await asyncio.to_thread(self.store.acquire_lease, self.name, owner, self.ttl)
+        return owner if acquired else None
+
+    async def acquire(self, timeout: float, poll: float = 5.0) -> Optional[str]:
+        """Wait up to ``timeout`` seconds for the gate."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            owner = await self.try_acquire()
+            if owner is not None or asyncio.get_running_loop().time() >= deadline:
+                return owner
+            await asyncio.sleep(poll)
+
+    def release(self, owner: str):
+        try:
+            self.store.release_lease(self.name, owner)
+        except Exception:
+            logger.exception("A küldési zár feloldása sikertelen")
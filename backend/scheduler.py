@@ -0,0 +1,165 @@
+"""Időzített push kampányok (napi menü, esemény emlékeztetők).
+
+Minden worker futtatja az ütemezőt, de egy kampány egy adott időpontra csak
+egyszer megy ki: a küldés előtt a workerek bérletet (lease) kérnek a
+token tárolóban, és csak az küld, amelyik megkapta. Sikertelen küldésnél a
+bérlet felszabadul, és az időpontot a pótlási ablakon belül bármelyik worker
+újrapróbálja.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PUSH_SCHEDULE_ENABLED = os.environ.get("PUSH_SCHEDULE_ENABLED", "1") == "1"
+SCHEDULER_INTERVAL = float(os.environ.get("SCHEDULER_INTERVAL", 30))
+# Újraindítás után ennyivel korábbi, el nem küldött időpontokat még pótolunk
+SCHEDULER_GRACE = timedelta(minutes=int(os.environ.get("SCHEDULER_GRACE_MINUTES", 10)))
+# A bérlet jóval túléli a pótlási ablakot, így egy időpont sosem fut kétszer
+LEASE_TTL = 2 * 24 * 60 * 60
+
+Message = Tuple[str, str]
+
+
+class Campaign:
+    """A push campaign: when it runs and what it sends.
+
+    ``build`` gets the occurrence time and returns ``(title, body)``, or
+    ``None`` to skip that occurrence (e.g. no menu on a holiday). The push
+    goes to the subscribers of ``topic``, or to every device when it is None.
+    """
+
+    def __init__(self, id: str, build: Callable[[datetime], Optional[Message]],
+                 topic: Optional[str] = None):
+        self.id = id
+        self.build = build
+        self.topic = topic
+
+    def occurrences(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        """Occurrences in the half-open window ``(start, end]``."""
+        raise NotImplementedError
+
+
+class DailyCampaign(Campaign):
+    def __init__(self, id: str, at: time, tz: tzinfo, build: Callable[[datetime], Optional[Message]],
+                 weekdays: Iterable[int] = range(7), topic: Optional[str] = None):
+        super().__init__(id, build, topic)
+        self.at = at
+        self.tz = tz
+        self.weekdays = set(weekdays)
+
+    def occurrences(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        day = start.astimezone(self.tz).date()
+        last = end.astimezone(self.tz).date()
+        while day <= last:
+            when = datetime.combine(day, self.at, tzinfo=self.tz)
+            if day.weekday() in self.weekdays and start < when <= end:
+                yield when
+            day += timedelta(days=1)
+
+
+class OneOffCampaign(Campaign):
+    def __init__(self, id: str, at: datetime, build: Callable[[datetime], Optional[Message]],
+                 topic: Optional[str] = None):
+        super().__init__(id, build, topic)
+        self.at = at
+
+    def occurrences(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        if start < self.at <= end:
+            yield self.at
+
+
+class PushScheduler:
+    """Ticks every ``interval`` seconds and fires due campaign occurrences.
+
+    ``await send(topic, title, body)`` is the normal fan-out path; ``leases``
+    is the token store, whose ``acquire_lease`` makes each occurrence run
+    on exactly one worker.
+    """
+
+    def __init__(self, send: Callable[[Optional[str], str, str], Awaitable[dict]], leases, interval: float = SCHEDULER_INTERVAL,
+                 grace: timedelta = SCHEDULER_GRACE):
+        self.send = send
+        self.leases = leases
+        self.interval = interval
+        self.grace = grace
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.campaigns: List[Campaign] = []
+        self._last_tick: Optional[datetime] = None
+        # Sikertelen időpontok: (kampány azonosító, időpont)
+        self._retry: List[Tuple[str, datetime]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def set_campaigns(self, campaigns: Iterable[Campaign]):
+        self.campaigns = list(campaigns)
+
+    def upcoming(self, now: datetime, horizon: timedelta = timedelta(days=30)) -> List[dict]:
+        runs = []
+        for campaign in self.campaigns:
+            when = next(campaign.occurrences(now, now + horizon), None)
+            if when is not None:
+                runs.append({"id": campaign.id, "topic": campaign.topic, "next_run": when.isoformat()})
+        return sorted(runs, key=lambda run: run["next_run"])
+
+    async def tick(self, now: Optional[datetime] = None):
+        now = now or datetime.now().astimezone()
+        start = max(self._last_tick or now - self.grace, now - self.grace)
+        self._last_tick = now
+        campaigns = {campaign.id: campaign for campaign in self.campaigns}
+        retry, self._retry = self._retry, []
+        due = [(campaigns[id], when) for id, when in retry if id in campaigns and when > now - self.grace]
+        due += [(campaign, when) for campaign in self.campaigns for when in campaign.occurrences(start, now)]
+        for campaign, when in due:
+            await self._fire(campaign, when)
+
+    async def _fire(self, campaign: Campaign, when: datetime):
+        key = f"campaign:{campaign.id}@{when.isoformat()}"
+        if not await asyncio.to_thread(self.leases.acquire_lease, key, self.owner, LEASE_TTL):
+            return
+        try:
+            message = campaign.build(when)
+            if message is None:
+                logger.info("Kampány kihagyva: %s (%s)", campaign.id, when)
+                return
+            result = await self.send(campaign.topic, *message)
+            logger.info("Kampány elküldve: %s (%s) -> %s", campaign.id, when, result.get("job_id"))
+        except Exception:
+            logger.exception("Kampány küldése sikertelen: %s", campaign.id)
+            self._retry.append((campaign.id, when))
+            await asyncio.to_thread(self.leases.release_lease, key, self.owner)
+        except asyncio.CancelledError:
+            # Leálláskor egy másik worker még elküldheti
+            await asyncio.to_thread(self.leases.release_lease, key, self.owner)
+            raise
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Ütemező hiba")
+            await asyncio.sleep(self.interval)
+
+
+def parse_time(value: str) -> time:
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+def day_before(day: str, at: time, tz: tzinfo) -> datetime:
+    return datetime.combine(date.fromisoformat(day) - timedelta(days=1), at, tzinfo=tz)
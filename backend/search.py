@@ -0,0 +1,131 @@
+"""Ékezetfüggetlen szöveges keresőindex."""
+import heapq
+import re
+import unicodedata
+from typing import Callable, Dict, Generic, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Pontszám szorzók: teljes szó > szó eleje > szórészlet
+EXACT, PREFIX, INFIX = 3.0, 2.0, 1.0
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents, so "Tóth" and "toth" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _SearchState(NamedTuple):
+    items: Tuple
+    prefixes: Dict[str, Dict[int, float]]
+    trigrams: Dict[str, Set[int]]
+    texts: Tuple[Tuple[str, ...], ...]
+
+
+class PrebuiltIndex(NamedTuple):
+    """Everything but the items, e.g. for storing in a content snapshot."""
+    fields: Tuple[Tuple[str, float], ...]
+    prefixes: Dict[str, Dict[int, float]]
+    trigrams: Dict[str, Set[int]]
+    texts: Tuple[Tuple[str, ...], ...]
+
+
+class TextSearchIndex(Generic[T]):
+    """Ranked search over weighted text fields of a list of models.
+
+    Every word prefix of every field is indexed, so prefix queries are one
+    dict lookup. Infix queries of three or more characters are narrowed down
+    with a trigram index and then verified; shorter ones (no trigram to look
+    up) fall back to scanning the folded texts. All query terms must match;
+    results are ranked by the summed field weights, with a bonus when the
+    whole query appears verbatim in a field; ties keep list order.
+    """
+
+    def __init__(self, fields: Dict[str, float], items: Iterable[T] = ()):
+        self.fields = list(fields.items())
+        self.reload(items)
+
+    def reload(self, items: Iterable[T], prebuilt: Optional[PrebuiltIndex] = None):
+        """Index ``items``; ``prebuilt`` (from ``build`` over the same items in
+        the same order) skips the work when it was made with the same fields."""
+        items = tuple(items)
+        if prebuilt is None or prebuilt.fields != tuple(self.fields) or len(prebuilt.texts) != len(items):
+            prebuilt = self.build(items)
+        self._state = _SearchState(items, prebuilt.prefixes, prebuilt.trigrams, prebuilt.texts)
+
+    def rebuilt(self, items: Iterable[T], prebuilt: Optional[PrebuiltIndex] = None) -> "TextSearchIndex[T]":
+        """A new index over ``items`` with the same fields."""
+        index = TextSearchIndex.__new__(TextSearchIndex)
+        index.fields = self.fields
+        index.reload(items, prebuilt)
+        return index
+
+    def build(self, items: Iterable[T]) -> PrebuiltIndex:
+        prefixes: Dict[str, Dict[int, float]] = {}
+        grams: Dict[str, Set[int]] = {}
+        texts = []
+        for doc, item in enumerate(items):
+            folded_fields = []
+            for field, weight in self.fields:
+                folded = fold(getattr(item, field) or "")
+                folded_fields.append(folded)
+                for token in TOKEN_RE.findall(folded):
+                    for end in range(1, len(token) + 1):
+                        score = weight * (EXACT if end == len(token) else PREFIX)
+                        postings = prefixes.setdefault(token[:end], {})
+                        if postings.get(doc, 0) < score:
+                            postings[doc] = score
+                for gram in trigrams(folded):
+                    grams.setdefault(gram, set()).add(doc)
+            texts.append(tuple(folded_fields))
+        return PrebuiltIndex(tuple(self.fields), prefixes, grams, tuple(texts))
+
+    def search(self, query: str, limit: Optional[int] = None,
+               where: Optional[Callable[[T], bool]] = None) -> List[T]:
+        state = self._state
+        phrase = fold(query).strip()
+        scores: Optional[Dict[int, float]] = None
+        for term in TOKEN_RE.findall(phrase):
+            term_scores = self._match_term(state, term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc: score + term_scores[doc]
+                          for doc, score in scores.items() if doc in term_scores}
+            if not scores:
+                return []
+        if where is not None and scores:
+            scores = {doc: score for doc, score in scores.items() if where(state.items[doc])}
+        if not scores:
+            return []
+        for doc in scores:
+            bonus = max((weight for (_, weight), text in zip(self.fields, state.texts[doc])
+                         if phrase in text), default=0)
+            scores[doc] += bonus * EXACT
+        key = lambda doc: (-scores[doc], doc)
+        ranked = heapq.nsmallest(limit, scores, key=key) if limit else sorted(scores, key=key)
+        return [state.items[doc] for doc in ranked]
+
+    def _match_term(self, state: _SearchState, term: str) -> Dict[int, float]:
+        term_scores = dict(state.prefixes.get(term, {}))
+        candidates: Optional[Set[int]] = None
+        if len(term) < 3:
+            candidates = set(range(len(state.texts)))
+        for gram in trigrams(term):
+            docs = state.trigrams.get(gram)
+            if not docs:
+                return term_scores
+            candidates = set(docs) if candidates is None else candidates & docs
+        for doc in candidates - term_scores.keys():
+            weight = max((weight for (_, weight), text in zip(self.fields, state.texts[doc])
+                          if term in text), default=0)
+            if weight:
+                term_scores[doc] = weight * INFIX
+        return term_scores
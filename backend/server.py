@@ -1,48 +1,128 @@
-from fastapi import FastAPI, APIRouter, Body
+from fastapi import FastAPI, APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import uvicorn
 import logging
 from pydantic import BaseModel, Field
-from typing import List, Optional, Set
+from pydantic_core import to_json
+from typing import Annotated, Any, Dict, Iterable, List, Optional, Set, Tuple, Type, Union
 import uuid
-from datetime import datetime
-import requests
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+from zoneinfo import ZoneInfo
+from auth import require_admin, require_push_admin
+from cache import CachedPayload, ResponseCache, ResultCache, combine, etag_matches, send_payload
+from content import ContentSnapshot, ContentStore, RevisionLog
+from images import IMAGE_PROXY, ThumbnailCache, media_type
+from indexes import IndexedCollection, decode_cursor, encode_cursor
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from search import TextSearchIndex, fold
+from shared import CONTENT_SHARED_PATH, SharedRegion
+from stream import Broadcaster, format_event
+from profiling import ProfileInfo, ProfileStore, ProfilingMiddleware
+from push import PushDispatcher, PushJob
+from ratelimit import PUSH_GATE_RETRY_AFTER, PUSH_GATE_TTL, BroadcastGate, RateLimiter
+from scheduler import (PUSH_SCHEDULE_ENABLED, Campaign, DailyCampaign, OneOffCampaign, PushScheduler,
+                       day_before, parse_time)
+from token_store import create_token_store
+
+logger = logging.getLogger(__name__)
 
 # Create the main app without a prefix
 app = FastAPI()
 
-registered_tokens: Set[str] = set()
+registered_tokens = create_token_store()
+push_dispatcher = PushDispatcher(registered_tokens, on_invalid_token=registered_tokens.remove)
+
+# A sebességkorlát és a küldési zár állapota a token tárolóban, minden workernek közös
+rate_limiter = RateLimiter(registered_tokens)
+broadcast_gate = BroadcastGate(registered_tokens)
+push_guards = [Depends(require_push_admin), Depends(rate_limiter.limit("push", "push-global"))]
+
+# Téma nevek, pl. "menu", "events", "grade:9", "course:felnott"
+TOPIC_PATTERN = r"^[a-z0-9:_-]{1,64}$"
+Topic = Annotated[str, Field(pattern=TOPIC_PATTERN)]
 
 class TokenSchema(BaseModel):
     token: str
+    # Ha a kliens nem küld témákat, a meglévő feliratkozásai maradnak;
+    # új token az alapértelmezett témákra iratkozik fel
+    topics: Optional[List[Topic]] = Field(None, max_length=32)
 
 api_router = APIRouter(prefix="/api")
 
-@api_router.post("/register-token")
+@api_router.post("/register-token", dependencies=[Depends(rate_limiter.limit("register-token"))])
 async def register_token(data: TokenSchema):
-    registered_tokens.add(data.token)
-    print(f"DEBUG: Új token regisztrálva: {data.token}")
+    registered_tokens.add(data.token, data.topics)
+    logger.debug("Új token regisztrálva: %s (témák: %s)", data.token,
+                 "változatlan" if data.topics is None else ", ".join(data.topics))
     return {"status": "ok", "message": "Token mentve"}
 
-def send_push_to_all(title: str, body: str):
-    url = "https://exp.host/--/api/v2/push/send"
-    payloads = []
-    for token in registered_tokens:
-        payloads.append({
-            "to": token,
-            "title": title,
-            "body": body,
-            "sound": "default"
-        })
-    if payloads:
-        response = requests.post(url, json=payloads)
-        return response.json()
-    return {"message": "Nincs regisztrált eszköz."}
-
-@api_router.post("/send-test-push")
-async def test_push():
-    return send_push_to_all("PatakyApp Teszt", "Működik az értesítés! 🚀")
+async def send_push_to_topic(topic: Optional[str], title: str, body: str, wait: float = 0):
+    # A küldés háttérben fut, a válasz csak a feladat azonosítóját adja vissza.
+    # Témánál a címzettek a fordított indexből jönnek, nem a teljes listából.
+    # Egyszerre csak egy küldés futhat; ``wait`` másodpercig vár a szabad helyre.
+    owner = await (broadcast_gate.acquire(wait) if wait else broadcast_gate.try_acquire())
+    if owner is None:
+        raise HTTPException(status_code=429, detail="Már folyamatban van egy értesítés küldése.",
+                            headers={"Retry-After": str(PUSH_GATE_RETRY_AFTER)})
+    tokens = registered_tokens.subscribers(topic)
+    try:
+        job = await push_dispatcher.submit(title, body, tokens, topic=topic,
+                                           on_done=lambda job: broadcast_gate.release(owner))
+    except Exception:
+        # A feladat el sem indult, a zárat azonnal elengedjük
+        await asyncio.to_thread(broadcast_gate.release, owner)
+        raise
+    return {"status": job.status, "job_id": job.id}
+
+async def send_campaign(topic: Optional[str], title: str, body: str):
+    # Az időzített küldés kivárja az épp futó küldést
+    return await send_push_to_topic(topic, title, body, wait=PUSH_GATE_TTL)
+
+# Időzített kampányok (napi menü, esemény emlékeztetők); a kampánylista
+# tartalomváltozáskor frissül (lásd prepare_content)
+push_scheduler = PushScheduler(send_campaign, registered_tokens)
+
+@api_router.post("/send-test-push", dependencies=push_guards)
+async def test_push(topic: Optional[str] = Query(None, pattern=TOPIC_PATTERN)):
+    return await send_push_to_topic(topic, "PatakyApp Teszt", "Működik az értesítés! 🚀")
+
+@api_router.get("/push-jobs", response_model=List[PushJob])
+async def list_push_jobs():
+    return await push_dispatcher.recent()
+
+@api_router.get("/push-jobs/{job_id}", response_model=PushJob)
+async def get_push_job(job_id: str):
+    job = await push_dispatcher.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="A küldési feladat nem található.")
+    return job
+
+@api_router.get("/campaigns")
+async def list_campaigns():
+    return push_scheduler.upcoming(datetime.now(SCHOOL_TZ))
+
+@app.on_event("startup")
+async def start_background_tasks():
+    registered_tokens.start_flusher()
+    push_dispatcher.start_receipt_poller()
+    content_store.start_watcher()
+    if IMAGE_PROXY:
+        thumbnail_cache.start_warmer()
+    if PUSH_SCHEDULE_ENABLED:
+        push_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await push_scheduler.stop()
+    content_stream.close()
+    await content_store.stop_watcher()
+    await push_dispatcher.close()
+    await registered_tokens.close()
+    thumbnail_cache.close()
 
 app.add_middleware(
     CORSMiddleware,
@@ -73,6 +153,10 @@ class NewsArticle(BaseModel):
     date: str
     category: str
 
+class NewsPage(BaseModel):
+    items: List[NewsArticle]
+    next_cursor: Optional[str] = None
+
 class Course(BaseModel):
     id: str
     title: str
@@ -104,136 +188,6 @@ class ContactInfo(BaseModel):
     om_code: str
     social_links: dict
 
-# Static data for the school
-SCHOOL_INFO = {
-    "name": "BMSZC Pataky István Híradásipari és Informatikai Technikum",
-    "short_name": "Pataky Technikum",
-    "description": "A Budapesti Műszaki Szakképzési Centrum Pataky István Híradásipari és Informatikai Technikum nappali és esti szakképzést kínál.",
-    "founded": "1952",
-    "motto": "A jövőt nálunk tanulod!"
-}
-
-CONTACT_INFO = ContactInfo(
-    phone="+36 70 502 1012",
-    fax="+36 1 265 1664",
-    email="pataky@pataky.hu",
-    address="1101 Budapest, Salgótarjáni út 53./b",
-    postal_address="1101 Budapest, Salgótarjáni út 53./b",
-    om_code="203058/008",
-    social_links={
-        "facebook": "https://hu-hu.facebook.com/patakyszki/",
-        "instagram": "https://www.instagram.com/patakytechnikum/",
-        "linkedin": "https://www.linkedin.com/school/37770007/"
-    }
-)
-
-NEWS_ARTICLES = [
-    NewsArticle(
-        id="1",
-        title="Felvételi információk",
-        subtitle="Központi írásbeli felvételi információk",
-        content="Folyamatosan frissített információk a középiskolai felvételi folyamattal kapcsolatban. Az írásbeli vizsgák időpontjai és helyszínei elérhetőek az iskola honlapján. Kérjük, kövesse figyelemmel az aktuális információkat!",
-        image_url=None,
-        date="2026-01-15",
-        category="Felvételi"
-    ),
-    NewsArticle(
-        id="2",
-        title="Felnőttoktatás – Új szakma, új lehetőség!",
-        subtitle="Indul a Felnőttképzési jelentkezés",
-        content="Ismerd meg, milyen szakmákkal várunk! A felnőttoktatás keretében lehetőség van új szakma megszerzésére, rugalmas időbeosztással. Jelentkezz most és kezdj új karriert!",
-        image_url=None,
-        date="2026-01-28",
-        category="Felnőttoktatás"
-    ),
-    NewsArticle(
-        id="3",
-        title="A jövőt nálunk tanulod!",
-        subtitle="Mitől vagyunk jobbak és többek?",
-        content="Beiskolázás 2026-2027. Modern technológiák, tapasztalt oktatók, ipari partnerkapcsolatok. Válaszd a Pataky Technikumot és építsd jövődet velünk!",
-        image_url=None,
-        date="2026-01-06",
-        category="Beiskolázás"
-    ),
-    NewsArticle(
-        id="4",
-        title="Történelmi tanulmányi út",
-        subtitle="4 napos római városnézés diákoknak",
-        content="2026.03.17-20 között szervezett római tanulmányi út. Jelentkezés az osztályfőnököknél. Korlátozott létszám, ne maradj le!",
-        image_url=None,
-        date="2026-02-05",
-        category="Események"
-    ),
-    NewsArticle(
-        id="5",
-        title="Fizika emelt szintű érettségi kísérletek",
-        subtitle="Felkészítő anyagok elérhetőek",
-        content="Az emelt szintű fizika érettségire készülők számára elérhetővé tettük a kísérleti videókat és leírásokat. A tananyag folyamatosan bővül.",
-        image_url=None,
-        date="2026-01-20",
-        category="Tanulás"
-    )
-]
-
-COURSES = [
-    Course(
-        id="1",
-        title="Szoftverfejlesztő és -tesztelő",
-        description="Modern programozási nyelvek, webes és mobil alkalmazásfejlesztés, szoftvertesztelési módszerek.",
-        duration="5 év (technikum)",
-        type="technikum",
-        icon="code"
-    ),
-    Course(
-        id="2",
-        title="Hálózati informatikus",
-        description="Számítógépes hálózatok tervezése, telepítése és üzemeltetése. Cisco és Microsoft képzések.",
-        duration="5 év (technikum)",
-        type="technikum",
-        icon="wifi"
-    ),
-    Course(
-        id="3",
-        title="Infokommunikációs hálózatépítő és -üzemeltető",
-        description="Távközlési és informatikai hálózatok építése, karbantartása.",
-        duration="3 év (szakképző)",
-        type="szakkepzo",
-        icon="network-check"
-    ),
-    Course(
-        id="4",
-        title="Elektronikai technikus",
-        description="Elektronikai eszközök tervezése, fejlesztése és javítása.",
-        duration="5 év (technikum)",
-        type="technikum",
-        icon="hardware-chip"
-    ),
-    Course(
-        id="5",
-        title="Felnőtt szakképzés - IT",
-        description="Felnőttek számára esti tagozaton elérhető informatikai képzések.",
-        duration="2-3 év (esti)",
-        type="felnott",
-        icon="school"
-    ),
-    Course(
-        id="6",
-        title="Elektrotechnikai technikus",
-        description="Elektromos rendszerek tervezése és kivitelezése.",
-        duration="5 év (technikum)",
-        type="technikum",
-        icon="flash"
-    )
-]
-
-STAFF_MEMBERS = [
-    StaffMember(id="1", name="Tóth Imre", position="igazgató", department="Vezetőség", email="imre@pataky.hu"),
-    StaffMember(id="2", name="Székelyné Polgár Klára", position="igazgatóhelyettes", department="Vezetőség", email="pklara@pataky.hu"),
-    StaffMember(id="3", name="Harangozó Attila", position="igazgatóhelyettes", department="Vezetőség", email="gyak@pataky.hu"),
-    StaffMember(id="4", name="Végh Orsolya", position="igazgatóhelyettes", department="Vezetőség", email="vegh.orsolya@pataky.hu"),
-    StaffMember(id="5", name="Titkárság", position="Adminisztráció", department="Iroda", email="pataky@pataky.hu"),
-]
-
 # Teachers data
 class Teacher(BaseModel):
     id: str
@@ -245,44 +199,6 @@ class Teacher(BaseModel):
     grade: Optional[str] = None
     consultation_hours: Optional[str] = None
 
-TEACHERS = [
-    Teacher(id="T1", name="Czene István", subject="magyar nyelv és irodalom – történelem – állampolgári ismeretek", department="Közismeret", email="istvanczene@gmail.com", grade="11.B"),
-    Teacher(id="T2", name="Harsányi Tünde", subject="magyar nyelv és irodalom – történelem – állampolgári ismeretek", department="Közismeret", email="harsanyit@pataky.hu", grade="11.D"),
-    Teacher(id="T3", name="Haller Zoltán", subject="magyar nyelv és irodalom – történelem", department="Közismeret", email="haller.zoltan@pataky.hu", grade="11.E"),
-    Teacher(id="T4", name="Szalai József", subject="magyar nyelv és irodalom", department="Közismeret", email="szalai.jozsef@pataky.hu", grade="9.B"),
-    Teacher(id="T5", name="Tózsa Éva", subject="magyar nyelv és irodalom", department="Közismeret", email="tozsa.eva77@gmail.com", grade="11.A"),
-    Teacher(id="T6", name="Csabay Károly", subject="Matematika", department="Közismeret", email="csabay.karoly@pataky.hu"),
-    Teacher(id="T7", name="Hegedűs László", subject="matematika", department="Közismeret", email="hegedus.laszlo@pataky.hu", grade="12.C"),
-    Teacher(id="T8", name="Katona Csaba", subject="Fizika", department="Közismeret", email="kacsa@pataky.hu", grade="12.C"),
-    Teacher(id="T9", name="Novotny László", subject="matematika", department="Közismeret", email="novotny.laszlo@pataky.hu"),
-    Teacher(id="T10", name="Szabó Márta", subject="matematika, digitális kultúra", department="Közismeret", email="szabo.marta@pataky.hu"),
-    Teacher(id="T11", name="Fekete Tamás", subject="IKT projektmunka, Programozás, Informatikai alapok", department="Informatika", email="fekete.tamas@pataky.hu"),
-    Teacher(id="T12", name="Gersei Gábor", subject="Hálózatok gyakorlat, Informatikai alapok", department="Informatika", email="gersei@pataky.hu"),
-    Teacher(id="T13", name="Gödöny Péter", subject="Informatikai alapok, Programozás, Digitális kultúra", department="Informatika", email="godony.peter@pataky.hu", grade="12.D"),
-    Teacher(id="T14", name="Gudmon Zsolt", subject="Hálózatszerelés, Távközlés elektronika, Optikai hálózatok", department="Informatika", email="gudmon.zsolt@pataky.hu", grade="13.A és 13.B"),
-    Teacher(id="T15", name="Hódi Gyula", subject="Programozási alapok, IKT projektmunka I., Digitális kultúra", department="Informatika", email="hodi.gyula@pataky.hu"),
-    Teacher(id="T16", name="Matuszczak Róbert", subject="IKT projektmunka, Digitális kultúra, Szerver szolgáltatások", department="Informatika", email="rob@pataky.hu", grade="9.C és 13.C"),
-    Teacher(id="T17", name="Virágh Krisztián", subject="Szerverek és felhőszolgáltatások, IP hálózatok", department="Informatika", email="viragh.krisztian@pataky.hu", grade="10.B"),
-    Teacher(id="T18", name="Pesti Zoltán", subject="Hálózatok I és II, Felhőszolgáltatások", department="Informatika", email="pezo@pataky.hu", grade="13.D"),
-    Teacher(id="T19", name="Apáti János", subject="Programozási alapok, Informatikai és távközlési alapok", department="Informatika", email="apati.janos@pataky.hu", grade="11.C"),
-    Teacher(id="T20", name="Abrók István", subject="távközlés, IKT projektmunka II.", department="Informatika", email="abrok.istvan@pataky.hu"),
-    Teacher(id="T21", name="Kovács Annabella", subject="digitális kultúra", department="Informatika", email="bella@pataky.hu"),
-    Teacher(id="T22", name="Kőhalmi Ábel", subject="IP hálózatok", department="Informatika", email="kohalmi.abel@pataky.hu"),
-    Teacher(id="T23", name="Szabó Viktória Anikó", subject="digitális kultúra, pénzügyi és vállalkozói ismeretek", department="Informatika", email="szabo.viktoria@pataky.hu"),
-    Teacher(id="T24", name="Bruder György", subject="informatika", department="Informatika", email="bruder.gyorgy@pataky.hu"),
-    Teacher(id="T25", name="Visi Gergő Bálint", subject="IKT Projektmunka, Távközlés", department="Informatika", email="visi.gergo@pataky.hu"),
-    Teacher(id="T26", name="Gáll Katalin Márta", subject="Angol nyelv", department="Közismeret", email="gall.katalin@pataky.hu", grade="12.B"),
-    Teacher(id="T27", name="Tóth-Káli Dominika", subject="angol nyelv", department="Közismeret", email="kali.dominika@pataky.hu"),
-    Teacher(id="T28", name="Kántor Sándor", subject="Angol nyelv", department="Közismeret", email="kantor.sandor@pataky.hu"),
-    Teacher(id="T29", name="Szerencsi Andrea", subject="Angol nyelv", department="Közismeret", email="szerencsi.andrea@pataky.hu", grade="10.C"),
-    Teacher(id="T30", name="Kemény Orsolya", subject="Angol nyelv", department="Közismeret", email="kemenyorsolya@pataky.hu"),
-    Teacher(id="T31", name="Szauterné Pödrőczi Éva", subject="angol nyelv", department="Közismeret", email="szauter.eva@pataky.hu"),
-    Teacher(id="T32", name="Ferencz Noémi", subject="Angol nyelv", department="Közismeret", email="ferencz.noemi@pataky.hu"),
-    Teacher(id="T33", name="Törteli Tibor", subject="testnevelés", department="Közismeret", email="torteli.tibor@pataky.hu", grade="10.A"),
-    Teacher(id="T34", name="Gazsó Réka", subject="testnevelés", department="Közismeret", email="gazso.reka@pataky.hu"),
-    Teacher(id="T35", name="Rozmán Balázs", subject="testnevelés", department="Közismeret", email="rozman.balazs@pataky.hu", grade="9.A"),
-]
-
 # Menu data
 class MenuItem(BaseModel):
     name: str
@@ -295,44 +211,6 @@ class DailyMenu(BaseModel):
     main_course: MenuItem
     dessert: Optional[MenuItem] = None
 
-WEEKLY_MENU = [
-    DailyMenu(
-        day="Hétfő",
-        date="2026-02-23",
-        soup=MenuItem(name="Frankfurti leves", allergens=["glutén"]),
-        main_course=MenuItem(name="Mákos tészta", allergens=["glutén", "tojás"]),
-        dessert=MenuItem(name="Gyümölcs")
-    ),
-    DailyMenu(
-        day="Kedd",
-        date="2026-02-24",
-        soup=MenuItem(name="Csurgatott tojásleves", allergens=[ "tojás"]),
-        main_course=MenuItem(name="Vasi sertésborda, Vajas törtburgonya", allergens=["glutén", "tojás", "tej"]),
-        dessert=MenuItem(name="-")
-    ),
-    DailyMenu(
-        day="Szerda",
-        date="2026-02-25",
-        soup=MenuItem(name="Zöldséges brokkolileves", allergens=[]),
-        main_course=MenuItem(name="Harcsafilé sajtmártással, Bulgur", allergens=["glutén", "hal", "tej"]),
-        dessert=MenuItem(name="-")
-    ),
-    DailyMenu(
-        day="Csütörtök",
-        date="2026-02-26",
-        soup=MenuItem(name="Lebbencsleves"),
-        main_course=MenuItem(name="Zöldbabfőzelék, Pulykapörkölt", allergens=["glutén", "tej"]), 
-        dessert=MenuItem(name="-")
-    ),
-    DailyMenu(
-        day="Péntek",
-        date="2026-02-27",
-        soup=MenuItem(name="100%-os gyümölcslé", allergens=["glutén", "tej"]),
-        main_course=MenuItem(name="Rántott sajt, Petrezselymes rizs, Tartár mártás", allergens=["glutén", "tej", "tojás"]),
-        dessert=MenuItem(name="-")
-    ),
-]
-
 # Gallery data
 class GalleryImage(BaseModel):
     id: str
@@ -349,64 +227,18 @@ class GalleryAlbum(BaseModel):
     image_count: int
     images: List[GalleryImage]
 
-GALLERY_ALBUMS = [
-    GalleryAlbum(
-        id="1",
-        title="Szalagavató",
-        description="Szalagavató 2026!",
-        date="2026-01-16",
-        cover_image="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/615999093_1484899656973052_3679359874566733709_n.jpg?_nc_cat=109&ccb=1-7&_nc_sid=f727a1&_nc_ohc=-_VscXN787kQ7kNvwF6b7tu&_nc_oc=Adn5X37ON70AYpjwrO-Q-Z4VsXXlIWohlUd0wmpEFZV38kNHqSm-X2g9PszIAcALV0vgt3LVQfv0QbsUEcAegfV_&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=0iy02J978rdqJrz1kYCG1Q&oh=00_AfvEC9a0nRubqZQ78kRLgXBXjHv6OYHTvknoGZsf-C90uQ&oe=69958FD3",
-        image_count=5,
-        images=[
-            GalleryImage(id="1-1", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/617054003_1484900333639651_3236773686781858520_n.jpg?_nc_cat=109&ccb=1-7&_nc_sid=f727a1&_nc_ohc=h5TSknhDbg8Q7kNvwEze7vW&_nc_oc=AdnGtU-K8O21p_aWzkJdweVdzq9uv6NjQd4cHJeqKR7ZkAkSsZJF4T-YalacC3X2BLGbY1UrBT6YnGoOCWKnzWRV&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=0VDouI3uibjrL1pMm_WivQ&oh=00_AftmikQ7DdLgyyHA1N9gB5Ii-qV7d2Gu38fTL0rMEwbQDw&oe=69956FE0", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/617054003_1484900333639651_3236773686781858520_n.jpg?_nc_cat=109&ccb=1-7&_nc_sid=f727a1&_nc_ohc=h5TSknhDbg8Q7kNvwEze7vW&_nc_oc=AdnGtU-K8O21p_aWzkJdweVdzq9uv6NjQd4cHJeqKR7ZkAkSsZJF4T-YalacC3X2BLGbY1UrBT6YnGoOCWKnzWRV&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=0VDouI3uibjrL1pMm_WivQ&oh=00_AftmikQ7DdLgyyHA1N9gB5Ii-qV7d2Gu38fTL0rMEwbQDw&oe=69956FE0", caption="Éremátadás"),
-            GalleryImage(id="1-2", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/615928702_1484900066973011_5904557219256711769_n.jpg?_nc_cat=111&ccb=1-7&_nc_sid=f727a1&_nc_ohc=NqcAGs7s1O4Q7kNvwGTsMHV&_nc_oc=AdlMixLOIwNRZkIKeKtFmkhREBg6uEld68D6UeU8ZOLfnopt1KrCGCUSYDT5ikSMJy1C6IZku8TXMnzmYNhw2odH&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=d6WedswgV-xbWMhBdBPvvA&oh=00_Afuj3uT1eWt5Vf_h-xylGsqjPhMGitgVhbtjr9dR07dMVA&oe=69956211", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/615928702_1484900066973011_5904557219256711769_n.jpg?_nc_cat=111&ccb=1-7&_nc_sid=f727a1&_nc_ohc=NqcAGs7s1O4Q7kNvwGTsMHV&_nc_oc=AdlMixLOIwNRZkIKeKtFmkhREBg6uEld68D6UeU8ZOLfnopt1KrCGCUSYDT5ikSMJy1C6IZku8TXMnzmYNhw2odH&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=d6WedswgV-xbWMhBdBPvvA&oh=00_Afuj3uT1eWt5Vf_h-xylGsqjPhMGitgVhbtjr9dR07dMVA&oe=69956211", caption="Éremátadás"),
-            GalleryImage(id="1-3", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/616103588_1484900556972962_5448955673734173814_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=f727a1&_nc_ohc=fdbq41Q9CIEQ7kNvwFfYSGf&_nc_oc=Admf_B4BPdLklmTjdhQG57UMMKvXRx789IrhDH0joKWciaOET6rF_86JT2uKQxHpe0Ddm2rcMY1vBwFpsuKYSLus&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=VgsyPZsrQ-Z7PqyrqjUtcA&oh=00_AfvHUbLs3qY4zbLSdmyIRsglSThecjiwnYrr5xqxraexZw&oe=699585F1", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/616103588_1484900556972962_5448955673734173814_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=f727a1&_nc_ohc=fdbq41Q9CIEQ7kNvwFfYSGf&_nc_oc=Admf_B4BPdLklmTjdhQG57UMMKvXRx789IrhDH0joKWciaOET6rF_86JT2uKQxHpe0Ddm2rcMY1vBwFpsuKYSLus&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=VgsyPZsrQ-Z7PqyrqjUtcA&oh=00_AfvHUbLs3qY4zbLSdmyIRsglSThecjiwnYrr5xqxraexZw&oe=699585F1", caption="Éremátadás"),
-            GalleryImage(id="1-4", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/616820402_1484900593639625_7232506220084491978_n.jpg?_nc_cat=102&ccb=1-7&_nc_sid=f727a1&_nc_ohc=PRt5YRZIUFEQ7kNvwHHjURd&_nc_oc=AdmGwCwMHtzbo6WRrL80ZeeltA_E4lqS5UTUdXTZuxHfUyeenYcS7Emhk07X7iHTEiH0x2gIRJ1m2-MGbpCYN8xg&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=Dju3qayjeh9DK1-t3C72VQ&oh=00_AfuIVsjdxAC7UOsxyR7-romJOnVCn4MgT3z7Rhf7XsCWEw&oe=69958F61", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/616820402_1484900593639625_7232506220084491978_n.jpg?_nc_cat=102&ccb=1-7&_nc_sid=f727a1&_nc_ohc=PRt5YRZIUFEQ7kNvwHHjURd&_nc_oc=AdmGwCwMHtzbo6WRrL80ZeeltA_E4lqS5UTUdXTZuxHfUyeenYcS7Emhk07X7iHTEiH0x2gIRJ1m2-MGbpCYN8xg&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=Dju3qayjeh9DK1-t3C72VQ&oh=00_AfuIVsjdxAC7UOsxyR7-romJOnVCn4MgT3z7Rhf7XsCWEw&oe=69958F61", caption="Éremátadás"),
-            GalleryImage(id="1-5", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/615966968_1484900373639647_7090054980501973447_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=f727a1&_nc_ohc=A2AZ5HD1N8UQ7kNvwHQgMQJ&_nc_oc=Adkugr7QgnmPwTCtr0YnUFFlH3gGijRV8K7JzEhaYWGxaeQI9bVuXAucd_Q2CCZW12u7CVag9c_zFutEfKBT14s4&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=w9RJMBvzqEg39VYXAuEEzQ&oh=00_AfuF7ApazKkSvX8t02X6XJfjP8yXjxOvKZfiSs9EBQQ4gA&oe=69956F56", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/615966968_1484900373639647_7090054980501973447_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=f727a1&_nc_ohc=A2AZ5HD1N8UQ7kNvwHQgMQJ&_nc_oc=Adkugr7QgnmPwTCtr0YnUFFlH3gGijRV8K7JzEhaYWGxaeQI9bVuXAucd_Q2CCZW12u7CVag9c_zFutEfKBT14s4&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=w9RJMBvzqEg39VYXAuEEzQ&oh=00_AfuF7ApazKkSvX8t02X6XJfjP8yXjxOvKZfiSs9EBQQ4gA&oe=69956F56", caption="Éremátadás"),
-        ]
-    ),
-    GalleryAlbum(
-        id="2",
-        title="Projektmunka bemutató",
-        description="Diákjaink projektmunkáinak bemutatója",
-        date="2026-01-15",
-        cover_image="https://images.unsplash.com/photo-1531482615713-2afd69097998?w=800",
-        image_count=4,
-        images=[
-            GalleryImage(id="2-1", url="https://images.unsplash.com/photo-1531482615713-2afd69097998?w=800", thumbnail="https://images.unsplash.com/photo-1531482615713-2afd69097998?w=400", caption="Csapatmunka"),
-            GalleryImage(id="2-2", url="https://images.unsplash.com/photo-1517245386807-bb43f82c33c4?w=800", thumbnail="https://images.unsplash.com/photo-1517245386807-bb43f82c33c4?w=400", caption="Prezentáció"),
-            GalleryImage(id="2-3", url="https://images.unsplash.com/photo-1522202176988-66273c2fd55f?w=800", thumbnail="https://images.unsplash.com/photo-1522202176988-66273c2fd55f?w=400", caption="Együttműködés"),
-            GalleryImage(id="2-4", url="https://images.unsplash.com/photo-1516321318423-f06f85e504b3?w=800", thumbnail="https://images.unsplash.com/photo-1516321318423-f06f85e504b3?w=400", caption="IT fejlesztés"),
-        ]
-    ),
-    GalleryAlbum(
-        id="3",
-        title="Ballagás 2024",
-        description="Ünnepélyes ballagási ceremónia",
-        date="2024-05-10",
-        cover_image="https://images.unsplash.com/photo-1523580846011-d3a5bc25702b?w=800",
-        image_count=4,
-        images=[
-            GalleryImage(id="3-1", url="https://images.unsplash.com/photo-1523580846011-d3a5bc25702b?w=800", thumbnail="https://images.unsplash.com/photo-1523580846011-d3a5bc25702b?w=400", caption="Ballagás"),
-            GalleryImage(id="3-2", url="https://images.unsplash.com/photo-1627556704302-624286467c65?w=800", thumbnail="https://images.unsplash.com/photo-1627556704302-624286467c65?w=400", caption="Diplomaosztó"),
-            GalleryImage(id="3-3", url="https://images.unsplash.com/photo-1540575467063-178a50c2df87?w=800", thumbnail="https://images.unsplash.com/photo-1540575467063-178a50c2df87?w=400", caption="Ünnepség"),
-            GalleryImage(id="3-4", url="https://images.unsplash.com/photo-1559223607-a43f990c095c?w=800", thumbnail="https://images.unsplash.com/photo-1559223607-a43f990c095c?w=400", caption="Csoportkép"),
-        ]
-    ),
-    GalleryAlbum(
-        id="4",
-        title="Sportverseny",
-        description="Iskolai sportversenyek és eredmények",
-        date="2024-11-20",
-        cover_image="https://images.unsplash.com/photo-1461896836934- voices=true-03bf60d-a05f-4b4e-a573-24508a0ee33e?w=800",
-        image_count=3,
-        images=[
-            GalleryImage(id="4-1", url="https://bm-pataky.cms.intezmeny.edir.hu/uploads/Baker_Hughes_Manhertz_Gergo_9_resized_e58b431528.jpg", thumbnail="https://bm-pataky.cms.intezmeny.edir.hu/uploads/Baker_Hughes_Manhertz_Gergo_9_resized_e58b431528.jpg", caption="Távközlés orientáció terem"),
-            GalleryImage(id="4-2", url="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/622919231_1421246323349398_2086000057285671729_n.jpg?_nc_cat=101&ccb=1-7&_nc_sid=127cfc&_nc_ohc=RsqCM_U5qE4Q7kNvwFnqb8g&_nc_oc=AdnF1LH-Y5U68riHuOZb2IerkQHuig5UbNDUN9ioAm3RR9qp_2LP2C8cfw1Z-6Y96VrjWcaFrGC9PQt0gQ4Ws5lu&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=-NuQIgYIps8F1pK0rytCvA&oh=00_AfsZblM8vobfGHHHizG4XQjPJfc-sQqQfUBhBzsNXu_jMg&oe=69958B84", thumbnail="https://scontent-vie1-1.xx.fbcdn.net/v/t39.30808-6/622919231_1421246323349398_2086000057285671729_n.jpg?_nc_cat=101&ccb=1-7&_nc_sid=127cfc&_nc_ohc=RsqCM_U5qE4Q7kNvwFnqb8g&_nc_oc=AdnF1LH-Y5U68riHuOZb2IerkQHuig5UbNDUN9ioAm3RR9qp_2LP2C8cfw1Z-6Y96VrjWcaFrGC9PQt0gQ4Ws5lu&_nc_zt=23&_nc_ht=scontent-vie1-1.xx&_nc_gid=-NuQIgYIps8F1pK0rytCvA&oh=00_AfsZblM8vobfGHHHizG4XQjPJfc-sQqQfUBhBzsNXu_jMg&oe=69958B84", caption="Angol Kahoot verseny"),
-            GalleryImage(id="4-3", url="https://images.unsplash.com/photo-1587280501635-68a0e82cd5ff?w=800", thumbnail="https://images.unsplash.com/photo-1587280501635-68a0e82cd5ff?w=400", caption="Éremátadás"),
-        ]
-    ),
-]
+# A galéria nyitóoldalához elég a borítókép, a képek listája nélkül
+class GalleryAlbumSummary(BaseModel):
+    id: str
+    title: str
+    description: str
+    date: str
+    cover_image: str
+    image_count: int
+
+class GalleryImagePage(BaseModel):
+    items: List[GalleryImage]
+    next_cursor: Optional[str] = None
 
 # Campus Map data
 class Room(BaseModel):
@@ -425,248 +257,637 @@ class Building(BaseModel):
     description: str
     rooms: List[Room]
 
-CAMPUS_BUILDINGS = [
-    Building(
-        id="1",
-        name="Főépület",
-        code="A",
-        floors=3,
-        description="Adminisztráció, vezetőség, közismereti tantermek",
-        rooms=[
-            Room(id="A-001", name="Porta", floor=0, building="A", type="facility", description="Beléptetés, információ"),
-            Room(id="A-002", name="Titkárság", floor=0, building="A", type="grade", description="Ügyintézés"),
-            Room(id="A-101", name="Igazgatói iroda", floor=1, building="A", type="grade"),
-            Room(id="A-102", name="Tanári szoba", floor=1, building="A", type="grade"),
-            Room(id="A-103", name="Fizika labor", floor=1, building="A", type="lab", description="Fizikai kísérletek"),
-            Room(id="A-104", name="Kémia labor", floor=1, building="A", type="lab", description="Kémiai kísérletek"),
-            Room(id="A-105", name="Elektronika műhely", floor=1, building="A", type="lab", description="Elektronikai gyakorlat"),
-            Room(id="A-201", name="101-es tanterem", floor=2, building="A", type="classroom"),
-            Room(id="A-202", name="102-es tanterem", floor=2, building="A", type="classroom"),
-            Room(id="A-203", name="103-as tanterem", floor=2, building="A", type="classroom"),
-            Room(id="A-301", name="Díszterem", floor=3, building="A", type="facility", description="Rendezvények, ünnepségek"),
-        ]
-    ),
-    Building(
-        id="2",
-        name="Informatikai épület",
-        code="B",
-        floors=2,
-        description="Számítógéptermek, informatikai laborok",
-        rooms=[
-            Room(id="B-001", name="Szerviz", floor=0, building="B", type="facility", description="IT eszközök javítása"),
-            Room(id="B-101", name="Gépterem 1", floor=1, building="B", type="lab", description="30 munkaállomás"),
-            Room(id="B-102", name="Gépterem 2", floor=1, building="B", type="lab", description="30 munkaállomás"),
-            Room(id="B-103", name="Hálózati labor", floor=1, building="B", type="lab", description="Cisco hálózati eszközök"),
-            Room(id="B-201", name="Gépterem 3", floor=2, building="B", type="lab", description="25 munkaállomás"),
-            Room(id="B-202", name="Gépterem 4", floor=2, building="B", type="lab", description="25 munkaállomás"),
-            Room(id="B-203", name="Programozói labor", floor=2, building="B", type="lab", description="Fejlesztői környezet"),
-            Room(id="B-205", name="Adatbázis labor", floor=2, building="B", type="lab", description="SQL gyakorlat"),
-            Room(id="B-207", name="Mobil labor", floor=2, building="B", type="lab", description="Mobilfejlesztés"),
-        ]
-    ),
-    Building(
-        id="3",
-        name="Közismereti épület",
-        code="C",
-        floors=3,
-        description="Nyelvi termek, humán tantárgyak",
-        rooms=[
-            Room(id="C-101", name="Könyvtár", floor=1, building="C", type="facility", description="Tanulás, olvasás"),
-            Room(id="C-102", name="Nyelvi labor", floor=1, building="C", type="lab", description="Nyelvtanulás"),
-            Room(id="C-104", name="Kémia terem", floor=1, building="C", type="classroom"),
-            Room(id="C-201", name="Magyar terem", floor=2, building="C", type="classroom"),
-            Room(id="C-202", name="Történelem terem", floor=2, building="C", type="classroom"),
-            Room(id="C-301", name="Irodalom tanári", floor=3, building="C", type="grade"),
-            Room(id="C-302", name="Matematika terem", floor=3, building="C", type="classroom"),
-            Room(id="C-303", name="Történelem tanári", floor=3, building="C", type="grade"),
-            Room(id="C-305", name="Angol terem", floor=3, building="C", type="classroom"),
-        ]
-    ),
-    Building(
-        id="4",
-        name="Sportlétesítmény",
-        code="S",
-        floors=1,
-        description="Tornaterem, sportpályák",
-        rooms=[
-            Room(id="S-001", name="Tornaterem", floor=0, building="S", type="facility", description="Testnevelés órák"),
-            Room(id="S-002", name="Öltöző - fiú", floor=0, building="S", type="facility"),
-            Room(id="S-003", name="Öltöző - lány", floor=0, building="S", type="facility"),
-            Room(id="S-004", name="Konditerem", floor=0, building="S", type="facility", description="Edzőterem"),
-            Room(id="S-005", name="Sportudvar", floor=0, building="S", type="facility", description="Kültéri pályák"),
-        ]
-    ),
-    Building(
-        id="5",
-        name="Menza épület",
-        code="M",
-        floors=1,
-        description="Étkezés, büfé",
-        rooms=[
-            Room(id="M-001", name="Ebédlő", floor=0, building="M", type="facility", description="Ebédidő: 11:30-14:00"),
-            Room(id="M-002", name="Büfé", floor=0, building="M", type="facility", description="Nyitva: 7:00-15:00"),
-            Room(id="M-003", name="Konyha", floor=0, building="M", type="facility"),
-        ]
-    ),
-]
-
-EVENTS = [
-    Event(id="1", title="Nyílt nap", date="2026-02-15", description="Ismerkedj meg iskolánkkal! Programok, bemutatók, tájékoztató.", location="Pataky Technikum"),
-    Event(id="2", title="Felvételi időszak kezdete", date="2026-02-20", description="A központi írásbeli felvételi vizsga időpontja.", location="Pataky Technikum"),
-    Event(id="3", title="Szülői értekezlet", date="2026-03-05", description="Tájékoztató a 2024/2026-ös tanév második félévéről.", location="Pataky Technikum"),
-    Event(id="4", title="Római tanulmányi út", date="2026-03-17", description="4 napos tanulmányi út Rómába.", location="Róma, Olaszország"),
-    Event(id="5", title="Érettségi szóbeli", date="2026-06-02", description="Szóbeli érettségi vizsgák kezdete.", location="Pataky Technikum"),
-]
-
-QUICK_LINKS = [
-    {"id": "1", "title": "KRÉTA", "description": "E-napló belépés", "url": "https://bmszc-pataky.e-kreta.hu/", "icon": "book"},
-    {"id": "2", "title": "Órarend", "description": "Tanóra beosztás", "url": "https://pataky.hu/tanuloinknak/tanev-rendje", "icon": "calendar"},
-    {"id": "3", "title": "Menza", "description": "Étkezési információk", "url": "https://pataky.hu/p/etkezes", "icon": "restaurant"},
-    {"id": "4", "title": "Duális képzés", "description": "Ipari partnerek", "url": "https://pataky.hu/p/dualis-kepzes", "icon": "business"},
-]
+# Az iskola adatai a data/ mappa JSON fájljaiból töltődnek be, és a fájlok
+# módosításakor újraindítás nélkül frissülnek (lásd prepare_content)
+content_store = ContentStore({
+    "school_info": ("school_info.json", Dict[str, Any]),
+    "contact": ("contact.json", ContactInfo),
+    "news": ("news.json", List[NewsArticle]),
+    "courses": ("courses.json", List[Course]),
+    "staff": ("staff.json", List[StaffMember]),
+    "teachers": ("teachers.json", List[Teacher]),
+    "menu": ("menu.json", List[DailyMenu]),
+    "gallery": ("gallery.json", List[GalleryAlbum]),
+    "campus": ("campus.json", List[Building]),
+    "events": ("events.json", List[Event]),
+    "quick_links": ("quick_links.json", List[Dict[str, str]]),
+})
+
+SCHOOL_INFO: Dict[str, Any] = {}
+CONTACT_INFO: Optional[ContactInfo] = None
+NEWS_ARTICLES: List[NewsArticle] = []
+COURSES: List[Course] = []
+STAFF_MEMBERS: List[StaffMember] = []
+TEACHERS: List[Teacher] = []
+WEEKLY_MENU: List[DailyMenu] = []
+GALLERY_ALBUMS: List[GalleryAlbum] = []
+CAMPUS_BUILDINGS: List[Building] = []
+EVENTS: List[Event] = []
+QUICK_LINKS: List[Dict[str, str]] = []
+
+# Az iskola időzónája: a "mai nap" mindig budapesti idő szerint értendő
+SCHOOL_TZ = ZoneInfo(os.environ.get("SCHOOL_TZ", "Europe/Budapest"))
+
+def school_today() -> str:
+    return datetime.now(SCHOOL_TZ).strftime("%Y-%m-%d")
+
+MENU_PUSH_TIME = parse_time(os.environ.get("MENU_PUSH_TIME", "10:30"))
+EVENT_REMINDER_TIME = parse_time(os.environ.get("EVENT_REMINDER_TIME", "17:00"))
+
+def menu_push_message(day: str) -> Optional[Tuple[str, str]]:
+    menu = menu_index.get(day)
+    if menu is None:
+        return None
+    return f"Mai menü - {menu.day} 🍴", f"Leves: {menu.soup.name}\nFőétel: {menu.main_course.name}"
+
+def event_reminder(event: Event):
+    return lambda when: (f"Holnap: {event.title} 📅", f"{event.location} – {event.description}")
+
+def build_campaigns(events: Iterable[Event]) -> List[Campaign]:
+    # Menü hétköznapokon; ha aznapra nincs menü (pl. szünet), a küldés kimarad
+    campaigns: List[Campaign] = [DailyCampaign(
+        "daily-menu", MENU_PUSH_TIME, SCHOOL_TZ,
+        lambda when: menu_push_message(when.astimezone(SCHOOL_TZ).strftime("%Y-%m-%d")),
+        weekdays=range(5), topic="menu",
+    )]
+    for event in events:
+        campaigns.append(OneOffCampaign(
+            f"event-{event.id}-{event.date}",
+            day_before(event.date, EVENT_REMINDER_TIME, SCHOOL_TZ),
+            event_reminder(event), topic="events",
+        ))
+    return campaigns
+
+# Előre szerializált válaszok a statikus adatokhoz
+response_cache = ResponseCache()
+# Több workernél a válaszok egy közös, memóriába képzett fájlból (manage.py serve --shared)
+shared_region = SharedRegion(CONTENT_SHARED_PATH) if CONTENT_SHARED_PATH else None
+BOOTSTRAP_NEWS_LIMIT = 5
+
+# Azonosító szerinti indexek; a híreket és eseményeket dátum szerint rendezve is tartjuk
+# Dátum, azonos napon azonosító szerint; a lapozási kurzor ezt a párt kódolja
+news_index = IndexedCollection(indexes={"category": lambda a: a.category}, order=attrgetter("date", "id"))
+event_index = IndexedCollection(order=attrgetter("date"))
+course_index = IndexedCollection(indexes={"type": lambda c: c.type})
+menu_index = IndexedCollection(key=lambda day: day.date)
+gallery_index = IndexedCollection()
+gallery_summary_index = IndexedCollection()
+gallery_images: Dict[str, IndexedCollection] = {}
+
+# Helyi bélyegkép-proxy: a thumbnail URL-eket a saját végpontunkra írjuk át
+thumbnail_cache = ThumbnailCache()
+
+def gallery_view(albums: List[GalleryAlbum]) -> List[GalleryAlbum]:
+    if not IMAGE_PROXY:
+        return albums
+    return [
+        album.model_copy(update={"images": [
+            image.model_copy(update={"thumbnail": thumbnail_cache.local_url(image.thumbnail)})
+            for image in album.images
+        ]})
+        for album in albums
+    ]
+
+building_index = IndexedCollection()
+# terem azonosító -> (terem, épület), szűrőkhöz típus, emelet és épületkód szerint
+room_index = IndexedCollection(key=lambda entry: entry[0].id, indexes={
+    "type": lambda entry: entry[0].type,
+    "floor": lambda entry: entry[0].floor,
+    "building": lambda entry: entry[0].building,
+})
+
+# Tanárkereső index; a név a legerősebb találat
+teacher_search = TextSearchIndex({"name": 3.0, "subject": 2.0, "department": 1.0})
+room_search = TextSearchIndex({"id": 3.0, "name": 3.0, "description": 1.0})
+# Gépelés közbeni keresések kész válaszai; tartalomváltozáskor ürülnek
+search_results = ResultCache("search")
+
+# Rekordszintű revíziók a /api/sync delta végponthoz
+revisions = RevisionLog()
+# Élő változásértesítés a /api/stream kliensein
+content_stream = Broadcaster()
+sync_records: Dict[str, Dict[str, Any]] = {}
+
+def content_records(snapshot: ContentSnapshot, albums: List[GalleryAlbum]) -> Dict[str, Dict[str, Any]]:
+    return {
+        "school_info": {"school_info": snapshot["school_info"]},
+        "contact": {"contact": snapshot["contact"]},
+        "news": {article.id: article for article in snapshot["news"]},
+        "courses": {course.id: course for course in snapshot["courses"]},
+        "staff": {member.id: member for member in snapshot["staff"]},
+        "events": {event.id: event for event in snapshot["events"]},
+        "quick_links": {link["id"]: link for link in snapshot["quick_links"]},
+        "teachers": {teacher.id: teacher for teacher in snapshot["teachers"]},
+        "menu": {day.date: day for day in snapshot["menu"]},
+        "gallery": {album.id: album for album in albums},
+        "campus": {building.id: building for building in snapshot["campus"]},
+    }
+
+def campus_rooms(buildings) -> List[Room]:
+    return [room for building in buildings for room in building.rooms]
+
+def derive_content(snapshot: ContentSnapshot) -> Dict[str, Any]:
+    """A pillanatkép fájlba a tartalomból számolt, konfigurációtól független indexek."""
+    return {
+        "teacher_search": teacher_search.build(snapshot["teachers"]),
+        "room_search": room_search.build(campus_rooms(snapshot["campus"])),
+    }
+
+def prepare_content(snapshot: ContentSnapshot):
+    """Felépít mindent, ami a tartalomból származik, és visszaadja az átállító lépést.
+
+    Újratöltéskor munkaszálban fut, ezért a kiszolgált állapothoz nem nyúl;
+    hiba esetén a régi tartalom marad. A pillanatkép fájlból töltött
+    tartalomnál az előre kiszámolt indexeket, megosztott módban a közös
+    régió válaszait használja.
+    """
+    derived = snapshot.derived
+    albums = gallery_view(snapshot["gallery"])
+    gallery_summaries = [
+        GalleryAlbumSummary(**album.model_dump(include=set(GalleryAlbumSummary.model_fields)))
+        for album in albums
+    ]
+    indexes = {
+        "news": news_index.rebuilt(snapshot["news"]),
+        "events": event_index.rebuilt(snapshot["events"]),
+        "courses": course_index.rebuilt(snapshot["courses"]),
+        "menu": menu_index.rebuilt(snapshot["menu"]),
+        "gallery": gallery_index.rebuilt(albums),
+        "gallery-summary": gallery_summary_index.rebuilt(gallery_summaries),
+        "campus": building_index.rebuilt(snapshot["campus"]),
+        "rooms": room_index.rebuilt((room, building) for building in snapshot["campus"] for room in building.rooms),
+    }
+    images = {album.id: IndexedCollection(album.images) for album in albums}
+    teachers = teacher_search.rebuilt(snapshot["teachers"], derived.get("teacher_search"))
+    rooms = room_search.rebuilt(campus_rooms(snapshot["campus"]), derived.get("room_search"))
+    records = content_records(snapshot, albums)
+    revision_state, changed = revisions.prepare(records)
+    campaigns = build_campaigns(snapshot["events"])
+    prebuilt = shared_region.payloads(snapshot.digest) if shared_region is not None else None
+    if shared_region is not None and prebuilt is None:
+        logger.warning("A megosztott régió más tartalomhoz készült, a válaszok helyben készülnek")
+    entries = response_cache.prepare({
+        "school-info": snapshot["school_info"],
+        "contact": snapshot["contact"],
+        "news": snapshot["news"],
+        "courses": snapshot["courses"],
+        "staff": snapshot["staff"],
+        "events": snapshot["events"],
+        "quick-links": snapshot["quick_links"],
+        "teachers": snapshot["teachers"],
+        "menu": snapshot["menu"],
+        "gallery": albums,
+        "gallery-summary": gallery_summaries,
+        "news-latest": indexes["news"].between(limit=BOOTSTRAP_NEWS_LIMIT, reverse=True),
+        "campus": snapshot["campus"],
+    }, prebuilt or {})
+    thumbnails = [image.thumbnail for album in snapshot["gallery"] for image in album.images]
+    notify = [bool(changed)]
+
+    def commit():
+        global SCHOOL_INFO, CONTACT_INFO, NEWS_ARTICLES, COURSES, STAFF_MEMBERS, TEACHERS
+        global WEEKLY_MENU, GALLERY_ALBUMS, CAMPUS_BUILDINGS, EVENTS, QUICK_LINKS
+        global news_index, event_index, course_index, menu_index, gallery_index, gallery_summary_index
+        global building_index, room_index, gallery_images, teacher_search, room_search, sync_records
+        SCHOOL_INFO = snapshot["school_info"]
+        CONTACT_INFO = snapshot["contact"]
+        NEWS_ARTICLES = snapshot["news"]
+        COURSES = snapshot["courses"]
+        STAFF_MEMBERS = snapshot["staff"]
+        TEACHERS = snapshot["teachers"]
+        WEEKLY_MENU = snapshot["menu"]
+        GALLERY_ALBUMS = snapshot["gallery"]
+        CAMPUS_BUILDINGS = snapshot["campus"]
+        EVENTS = snapshot["events"]
+        QUICK_LINKS = snapshot["quick_links"]
+        news_index, event_index = indexes["news"], indexes["events"]
+        course_index, menu_index = indexes["courses"], indexes["menu"]
+        gallery_index, gallery_summary_index = indexes["gallery"], indexes["gallery-summary"]
+        building_index, room_index = indexes["campus"], indexes["rooms"]
+        gallery_images = images
+        teacher_search, room_search = teachers, rooms
+        sync_records = records
+        revisions.install(revision_state)
+        search_results.clear()
+        response_cache.install(entries)
+        if IMAGE_PROXY:
+            thumbnail_cache.register(thumbnails)
+        push_scheduler.set_campaigns(campaigns)
+        # Visszaálláskor (ha egy későbbi átállás elbukik) nem értesítünk újra
+        if notify[0]:
+            notify[0] = False
+            content_stream.publish(format_event(
+                "content", {"version": revisions.version, "changed": changed}, id=revisions.version,
+            ))
+
+    return commit
+
+content_store.subscribe(prepare_content)
+content_store.load()
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
     return {"message": "Pataky Technikum API"}
 
-@api_router.get("/school-info")
-async def get_school_info():
-    return SCHOOL_INFO
+# Napi kulcsú gyorsítótár bejegyzések; napváltáskor az előző napiak törlődnek
+DAILY_CACHE_PREFIXES = ("bootstrap:", "events-upcoming:")
+cached_day = ""
+
+def expire_daily_entries(today: str):
+    global cached_day
+    if today != cached_day:
+        cached_day = today
+        response_cache.discard(lambda key: key.startswith(DAILY_CACHE_PREFIXES) and not key.endswith(f":{today}"))
+
+# Az indításkor szükséges adatok egyetlen kérésben
+BOOTSTRAP_PARTS = {
+    "school_info": lambda today: response_cache.get("school-info"),
+    "contact": lambda today: response_cache.get("contact"),
+    "quick_links": lambda today: response_cache.get("quick-links"),
+    "menu": lambda today: response_cache.get("menu"),
+    "events": lambda today: response_cache.get_or_build(
+        f"events-upcoming:{today}",
+        lambda: event_index.between(today),
+    ),
+    "news": lambda today: response_cache.get("news-latest"),
+}
 
-@api_router.get("/contact")
-async def get_contact():
-    return CONTACT_INFO
+@api_router.get("/bootstrap")
+async def get_bootstrap(request: Request, include: Optional[str] = None):
+    """Iskolainfó, kapcsolat, gyorslinkek, heti menü, közelgő események és a
+    legfrissebb hírek egy tömörített válaszban; ``include`` a részeket szűri."""
+    names = list(BOOTSTRAP_PARTS)
+    if include:
+        # Rendezve és ismétlés nélkül, hogy a gyorsítótár kulcsai ne szaporodjanak
+        names = sorted({name.strip() for name in include.split(",") if name.strip()})
+        unknown = set(names) - BOOTSTRAP_PARTS.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Ismeretlen rész: {', '.join(sorted(unknown))}")
+    today = school_today()
+    expire_daily_entries(today)
+    payload = response_cache.get_or_build(
+        f"bootstrap:{','.join(names)}:{today}",
+        lambda: combine({name: BOOTSTRAP_PARTS[name](today) for name in names}),
+    )
+    return send_payload(request, payload)
+
+@api_router.get("/sync")
+async def sync_content(request: Request, since: Optional[str] = None):
+    """Csak a ``since`` verzió óta változott rekordok.
+
+    Ismeretlen vagy túl régi verziónál ``reset: true`` és a teljes tartalom jön;
+    ilyenkor a kliens dobja el a helyi adatait.
+    """
+    records = sync_records
+    result = revisions.changes_since(since)
+
+    def build():
+        changes = {}
+        for name in sorted(result.upserted.keys() | result.deleted.keys()):
+            changes[name] = {
+                "upserted": [records[name][record_id] for record_id in result.upserted.get(name, [])
+                             if record_id in records.get(name, {})],
+                "deleted": result.deleted.get(name, []),
+            }
+        return {"version": result.version, "reset": result.reset, "changes": changes}
+
+    # A teljes újraküldés verziónként azonos, így csak egyszer szerializáljuk és tömörítjük
+    if result.reset:
+        return send_payload(request, response_cache.get_or_build(f"sync-reset:{result.version}", build))
+    return send_payload(request, CachedPayload(to_json(build())))
+
+@api_router.get("/stream")
+async def stream_changes():
+    """Server-Sent Events: kapcsolódáskor ``hello`` az aktuális verzióval, majd
+    minden tartalomváltozáskor ``content`` esemény; a részleteket a kliens a
+    /api/sync végpontról kéri le."""
+    if content_stream.full:
+        raise HTTPException(status_code=503, detail="Túl sok élő kapcsolat, próbáld újra később.")
+    first = format_event("hello", {"version": revisions.version}, id=revisions.version)
+    return StreamingResponse(
+        content_stream.stream(first),
+        media_type="text/event-stream",
+        # Nginx mögött a puffereléstől az értesítések késnének
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@api_router.get("/news", response_model=List[NewsArticle])
-async def get_news():
-    return NEWS_ARTICLES
+@api_router.get("/school-info")
+async def get_school_info(request: Request):
+    return response_cache.response(request, "school-info")
+
+@api_router.get("/contact", response_model=ContactInfo)
+async def get_contact(request: Request):
+    return response_cache.response(request, "contact")
+
+LIST_PAGE_SIZE = 20
+LIST_MAX_PAGE_SIZE = 100
+
+def encode_news_cursor(article: NewsArticle) -> str:
+    return encode_cursor(f"{article.date}|{article.id}")
+
+def decode_news_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        day, separator, article_id = decode_cursor(cursor).partition("|")
+    except ValueError:
+        separator = ""
+    if not separator:
+        raise HTTPException(status_code=400, detail="Érvénytelen lapozási kurzor.")
+    return day, article_id
+
+@api_router.get("/news", response_model=Union[List[NewsArticle], NewsPage])
+async def get_news(
+    request: Request,
+    category: Optional[str] = None,
+    before: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+):
+    """Hírek; szűrés nélkül a teljes lista.
+
+    Bármely paraméter megadásakor lapozott válasz (``items`` +
+    ``next_cursor``; az /api/events szűrve is listát ad), a legfrissebbek
+    elöl: ``category`` egy kategória hírei, ``before`` az ennél a napnál
+    korábbiak, ``cursor`` az előző oldal ``next_cursor`` értéke, ``limit``
+    az oldalméret. A kurzor dátumot és azonosítót kódol, így az azonos napon
+    megjelent hírek sem maradnak ki; ``before`` mellett is használható.
+    """
+    if category is None and before is None and cursor is None and limit is None:
+        return response_cache.response(request, "news")
+    limit = limit or LIST_PAGE_SIZE
+    # A felső korlát a dátum és a kurzor közül a szigorúbb; (nap,) minden
+    # azonos napi (nap, azonosító) pár elé esik, így a nap maga kimarad
+    bounds = [decode_news_cursor(cursor) if cursor else None, (before.isoformat(),) if before else None]
+    high = min((bound for bound in bounds if bound is not None), default=None)
+    # Eggyel többet kérünk, ebből látszik, van-e következő oldal
+    found = news_index.between(
+        high=high,
+        limit=limit + 1,
+        reverse=True,
+        index="category" if category is not None else None,
+        value=category,
+    )
+    items = found[:limit]
+    next_cursor = encode_news_cursor(items[-1]) if len(found) > limit else None
+    return NewsPage(items=items, next_cursor=next_cursor)
 
 @api_router.get("/news/{news_id}", response_model=NewsArticle)
 async def get_news_by_id(news_id: str):
-    for article in NEWS_ARTICLES:
-        if article.id == news_id:
-            return article
-    return None
+    article = news_index.get(news_id)
+    if article is None:
+        raise HTTPException(status_code=404, detail="A hír nem található.")
+    return article
 
 @api_router.get("/courses", response_model=List[Course])
-async def get_courses():
-    return COURSES
+async def get_courses(request: Request):
+    return response_cache.response(request, "courses")
 
-@api_router.get("/courses/{course_type}")
+@api_router.get("/courses/{course_type}", response_model=List[Course])
 async def get_courses_by_type(course_type: str):
-    return [c for c in COURSES if c.type == course_type]
+    return course_index.find("type", course_type)
 
 @api_router.get("/staff", response_model=List[StaffMember])
-async def get_staff():
-    return STAFF_MEMBERS
+async def get_staff(request: Request):
+    return response_cache.response(request, "staff")
 
 @api_router.get("/events", response_model=List[Event])
-async def get_events():
-    return EVENTS
+async def get_events(
+    request: Request,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+):
+    """Események; szűrés nélkül a teljes lista.
+
+    ``from``/``to`` (mindkét nap beleértve) és ``limit`` megadásakor dátum
+    szerint növekvő sorrendben, pl. közelgők: ``?from=<ma>&limit=5``.
+    """
+    if from_date is None and to_date is None and limit is None:
+        return response_cache.response(request, "events")
+    return event_index.between(
+        from_date.isoformat() if from_date else None,
+        (to_date + timedelta(days=1)).isoformat() if to_date else None,
+        limit,
+    )
 
 @api_router.get("/quick-links")
-async def get_quick_links():
-    return QUICK_LINKS
+async def get_quick_links(request: Request):
+    return response_cache.response(request, "quick-links")
 
 @api_router.get("/teachers", response_model=List[Teacher])
-async def get_teachers():
-    return TEACHERS
+async def get_teachers(request: Request):
+    return response_cache.response(request, "teachers")
 
-@api_router.get("/teachers/search")
-async def search_teachers(q: str = ""):
+@api_router.get("/teachers/search", response_model=List[Teacher])
+async def search_teachers(request: Request, q: str = "", limit: Optional[int] = Query(None, ge=1)):
     if not q:
-        return TEACHERS
-    q_lower = q.lower()
-    return [t for t in TEACHERS if q_lower in t.name.lower() or q_lower in t.subject.lower() or q_lower in t.department.lower()]
+        return response_cache.response(request, "teachers")
+    # Ékezet és kis-nagybetű nélkül azonos lekérdezés azonos találatot ad
+    query = fold(q).strip()
+    payload = search_results.get_or_build(
+        ("teachers", revisions.version, query, limit),
+        lambda: teacher_search.search(query, limit),
+    )
+    return send_payload(request, payload)
 
 # 1. Csak az adatokat adja vissza (ez a jó gyakorlat)
 @api_router.get("/menu", response_model=List[DailyMenu])
-async def get_menu():
-    return WEEKLY_MENU
+async def get_menu(request: Request):
+    return response_cache.response(request, "menu")
 
 # 2. Ez végzi a tényleges értesítést (ezt hívd meg, ha üzenni akarsz)
-@api_router.post("/send-menu-push")
+@api_router.post("/send-menu-push", dependencies=push_guards)
 async def send_menu_push():
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    today_menu = next((item for item in WEEKLY_MENU if item.date == today_str), None)
+    message = menu_push_message(school_today())
+    if message is None:
+        message = ("Pataky Menza 🍴", "Nézd meg a heti menüt az alkalmazásban!")
+    return await send_push_to_topic("menu", *message)
 
-    if today_menu:
-        title = f"Mai menü - {today_menu.day} 🍴"
-        body = f"Leves: {today_menu.soup.name}\nFőétel: {today_menu.main_course.name}"
-    else:
-        title = "Pataky Menza 🍴"
-        body = "Nézd meg a heti menüt az alkalmazásban!"
 
-    return send_push_to_all(title, body)
 
+GALLERY_PAGE_SIZE = 20
+GALLERY_MAX_PAGE_SIZE = 100
 
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Set[str]]:
+    if not fields:
+        return None
+    wanted = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = wanted - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Ismeretlen mező: {', '.join(sorted(unknown))}")
+    return wanted | {"id"}
 
-@api_router.get("/gallery")
-async def get_gallery():
-    return GALLERY_ALBUMS
+def paginate(collection: IndexedCollection, cursor: Optional[str], limit: int):
+    try:
+        items, next_key = collection.page(decode_cursor(cursor) if cursor else None, limit)
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Érvénytelen lapozási kurzor.")
+    return items, (encode_cursor(next_key) if next_key is not None else None)
 
-@api_router.get("/gallery/{album_id}")
+@api_router.get("/gallery")
+async def get_gallery(
+    request: Request,
+    summary: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=GALLERY_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    """Albumok listája.
+
+    Paraméterek nélkül a teljes lista; ``summary=true`` esetén csak az albumok
+    adatai és a borítókép. ``cursor``/``limit`` megadásakor lapozott választ ad
+    (``items`` + ``next_cursor``), ``fields`` a visszaadott mezőket szűri.
+    """
+    include = parse_fields(fields, GalleryAlbumSummary if summary else GalleryAlbum)
+    paged = cursor is not None or limit is not None
+    if not paged and include is None:
+        return response_cache.response(request, "gallery-summary" if summary else "gallery")
+    collection = gallery_summary_index if summary else gallery_index
+    if paged:
+        albums, next_cursor = paginate(collection, cursor, limit or GALLERY_PAGE_SIZE)
+    else:
+        albums, next_cursor = tuple(collection), None
+    if include is not None:
+        albums = [album.model_dump(include=include) for album in albums]
+    if paged:
+        return {"items": albums, "next_cursor": next_cursor}
+    return albums
+
+@api_router.get("/gallery/{album_id}", response_model=GalleryAlbum)
 async def get_gallery_album(album_id: str):
-    for album in GALLERY_ALBUMS:
-        if album.id == album_id:
-            return album
-    return None
-
-@api_router.get("/campus")
-async def get_campus():
-    return CAMPUS_BUILDINGS
-
-@api_router.get("/campus/{building_id}")
+    album = gallery_index.get(album_id)
+    if album is None:
+        raise HTTPException(status_code=404, detail="Az album nem található.")
+    return album
+
+@api_router.get("/gallery/{album_id}/images", response_model=GalleryImagePage)
+async def get_gallery_images(
+    album_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(GALLERY_PAGE_SIZE, ge=1, le=GALLERY_MAX_PAGE_SIZE),
+):
+    images = gallery_images.get(album_id)
+    if images is None:
+        raise HTTPException(status_code=404, detail="Az album nem található.")
+    items, next_cursor = paginate(images, cursor, limit)
+    return GalleryImagePage(items=items, next_cursor=next_cursor)
+
+@api_router.get("/images/{key}")
+async def get_thumbnail(request: Request, key: str):
+    if key not in thumbnail_cache.sources:
+        raise HTTPException(status_code=404, detail="A kép nem található.")
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": thumbnail_cache.etag(key)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = await thumbnail_cache.get(key)
+    except Exception:
+        # Ha a forrás nem érhető el, a kliens még megpróbálhatja közvetlenül
+        logger.warning("Bélyegkép letöltése sikertelen: %s", key, exc_info=True)
+        return RedirectResponse(thumbnail_cache.sources[key])
+    if path is None:
+        raise HTTPException(status_code=404, detail="A kép nem található.")
+    return FileResponse(path, media_type=media_type(path), headers=headers)
+
+@api_router.get("/campus", response_model=List[Building])
+async def get_campus(request: Request):
+    return response_cache.response(request, "campus")
+
+@api_router.get("/campus/{building_id}", response_model=Building)
 async def get_building(building_id: str):
-    for building in CAMPUS_BUILDINGS:
-        if building.id == building_id:
-            return building
-    return None
-
-@api_router.get("/rooms/search")
-async def search_rooms(q: str = ""):
-    if not q:
+    building = building_index.get(building_id)
+    if building is None:
+        raise HTTPException(status_code=404, detail="Az épület nem található.")
+    return building
+
+def find_rooms(q: str, filters: Dict[str, Any], limit: Optional[int]) -> List[Dict[str, Any]]:
+    allowed = None
+    for name, value in filters.items():
+        if value is not None:
+            ids = {room.id for room, _ in room_index.find(name, value)}
+            allowed = ids if allowed is None else allowed & ids
+    if q:
+        rooms = room_search.search(q, limit, None if allowed is None else lambda r: r.id in allowed)
+    elif allowed is not None:
+        # Csak szűrők: a találatok az eredeti sorrendben
+        rooms = [room for room, _ in room_index if room.id in allowed][:limit]
+    else:
         return []
-    q_lower = q.lower()
     results = []
-    for building in CAMPUS_BUILDINGS:
-        for room in building.rooms:
-            if q_lower in room.name.lower() or q_lower in room.id.lower():
-                results.append({"room": room, "building": building.name, "building_code": building.code})
+    for room in rooms:
+        _, room_building = room_index.get(room.id)
+        results.append({"room": room, "building": room_building.name, "building_code": room_building.code})
     return results
 
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/rooms/search")
+async def search_rooms(
+    request: Request,
+    q: str = "",
+    room_type: Optional[str] = Query(None, alias="type"),
+    floor: Optional[int] = None,
+    building: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    query = fold(q).strip()
+    filters = {"type": room_type, "floor": floor, "building": building}
+    payload = search_results.get_or_build(
+        ("rooms", revisions.version, query, room_type, floor, building, limit),
+        lambda: find_rooms(query, filters, limit),
+    )
+    return send_payload(request, payload)
+
+@api_router.get("/rooms/{room_id}")
+async def get_room(room_id: str):
+    entry = room_index.get(room_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="A terem nem található.")
+    room, building = entry
+    return {"room": room, "building": building.name, "building_code": building.code}
+
+# Útvonalankénti válaszidő, méret és státusz
+app.add_middleware(MetricsMiddleware)
+
+# Admin által kért vagy véletlenszerűen mintavett kérések profilozása; a
+# legkülső réteg, így a teljes middleware lánc is látszik a profilban
+profile_store = ProfileStore()
+app.add_middleware(ProfilingMiddleware, store=profile_store)
+
+@api_router.get("/admin/profiles", response_model=List[ProfileInfo], dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/merged", response_class=PlainTextResponse,
+                dependencies=[Depends(require_admin)])
+async def merged_profile(path: Optional[str] = None):
+    """Az összes megőrzött profil összesítve (``path`` szerint szűrhető)."""
+    return profile_store.merged(path)
+
+@api_router.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse,
+                dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="A profil nem található.")
+    return entry[1]
+
+REGISTRY.gauge("push_registered_tokens", "Registered push tokens.", func=registered_tokens.count)
+REGISTRY.gauge("push_pending_receipts", "Push tickets waiting for a receipt.",
+               func=registered_tokens.count_tickets)
+REGISTRY.gauge("stream_clients", "Open /api/stream connections.", func=lambda: len(content_stream))
+REGISTRY.gauge("search_cache_entries", "Cached search results.", func=lambda: len(search_results))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # A token szám lekérdezése I/O, ezért szálban
+    return Response(await asyncio.to_thread(REGISTRY.render), media_type=CONTENT_TYPE)
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@api_router.get("/rooms/search")
-async def search_rooms(q: str = ""):
-    if not q:
-        return []
-    results = []
-    q_lower = q.lower()
-    for building in CAMPUS_BUILDINGS:
-        for room in building.rooms:
-            if q_lower in room.name.lower() or (room.description and q_lower in room.description.lower()):
-                results.append(room)
-    return results
 
-# FONTOS: A router regisztrálása az app-hoz
+# FONTOS: A router regisztrálása az app-hoz, miután minden útvonal definiálva van
 app.include_router(api_router)
 
 # Belépési pont a lokális futtatáshoz
@@ -0,0 +1,110 @@
+"""A workerek közös, csak olvasható válaszai egy memóriába képzett fájlban.
+
+``manage.py serve --shared`` indításkor egyszer elkészíti az összes előre
+szerializált választ (JSON, MessagePack, gzip, brotli változatokkal) egy
+fájlba, a workerek pedig ``mmap``-pel, csak olvasásra képezik be. A lapok
+így az operációs rendszer lapgyorsítótárában egyszer vannak meg, akárhány
+worker is fut, és a válaszok másolás nélkül, a régió szeleteiként mennek ki.
+
+A régió egy tartalomverzióhoz tartozik: ha a worker tartalma eltér (pl. a
+fájlfigyelő újratöltött), a worker a saját memóriájában szerializál, amíg a
+régiót újra nem építik.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from cache import CachedPayload
+
+logger = logging.getLogger(__name__)
+
+# Üresen a megosztott mód ki van kapcsolva
+CONTENT_SHARED_PATH = os.environ.get("CONTENT_SHARED_PATH", "")
+SHARED_FILENAME = ".content-shared.bin"
+
+MAGIC = b"PTKSHR01"
+# MAGIC, majd a JSON index hossza; utána az index, majd az adatok
+HEADER = struct.Struct("<8sQ")
+
+
+def write_region(path: Path, digest: str, payloads: Mapping[str, CachedPayload]) -> int:
+    """Write every variant of ``payloads`` to ``path``; returns the file size.
+
+    The file is replaced atomically, so workers mapping the old one keep a
+    consistent view until they remap.
+    """
+    index: Dict[str, dict] = {}
+    blobs = []
+    offset = 0
+    for key, payload in payloads.items():
+        variants = {}
+        for (fmt, encoding), data in payload.all_variants().items():
+            variants[f"{fmt}/{encoding}"] = (offset, len(data))
+            blobs.append(data)
+            offset += len(data)
+        index[key] = {"etag": payload.etag, "variants": variants}
+    meta = json.dumps({"digest": digest, "payloads": index}, separators=(",", ":")).encode()
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, len(meta)))
+        out.write(meta)
+        for data in blobs:
+            out.write(data)
+    os.replace(tmp, path)
+    return HEADER.size + len(meta) + offset
+
+
+class SharedRegion:
+    """Read-only mapping of a region file written by ``write_region``.
+
+    The file is remapped when it has been replaced; payloads handed out
+    earlier keep the old mapping alive until they are dropped.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._identity: Optional[Tuple[int, int]] = None
+        self._view: Optional[memoryview] = None
+        self._meta: dict = {}
+        self._data_start = 0
+
+    def payloads(self, digest: str) -> Optional[Dict[str, CachedPayload]]:
+        """Payloads for content ``digest``, or ``None`` if the region is for other content."""
+        try:
+            self._remap()
+        except (OSError, ValueError):
+            logger.warning("A megosztott régió nem olvasható: %s", self.path, exc_info=True)
+            self._identity = self._view = None
+            return None
+        if self._view is None or self._meta.get("digest") != digest:
+            return None
+        view, start = self._view, self._data_start
+        result = {}
+        for key, entry in self._meta["payloads"].items():
+            variants = {}
+            for name, (offset, length) in entry["variants"].items():
+                fmt, _, encoding = name.partition("/")
+                variants[(fmt, encoding)] = view[start + offset:start + offset + length]
+            result[key] = CachedPayload(variants[("json", "identity")], entry["etag"], variants, lazy=False)
+        return result
+
+    def _remap(self):
+        stat = self.path.stat()
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._identity:
+            return
+        with open(self.path, "rb") as source:
+            # A leképezés a fájl bezárása után is érvényes marad
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_size = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f"Ismeretlen régió formátum: {self.path}")
+        self._meta = json.loads(mapped[HEADER.size:HEADER.size + meta_size])
+        self._data_start = HEADER.size + meta_size
+        # A régi leképezést nem zárjuk le: a kiadott szeletek tartják életben
+        self._view = memoryview(mapped)
+        self._identity = identity
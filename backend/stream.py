@@ -0,0 +1,97 @@
+"""Server-Sent Events: élő értesítés a tartalom változásairól.
+
+Egyetlen közös szétosztó küld minden kliensnek; az üzenetet egyszer
+kódoljuk, a kliensek korlátos sorában csak hivatkozás van rá. Aki nem
+olvas elég gyorsan, azt lecsatlakoztatjuk: újrakapcsolódáskor az aktuális
+verziót kapja, és a /api/sync végpontról pótolja a kimaradt változásokat.
+"""
+import asyncio
+import os
+from typing import AsyncIterator, Optional, Set
+
+from pydantic_core import to_json
+
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 8))
+STREAM_MAX_CLIENTS = int(os.environ.get("STREAM_MAX_CLIENTS", 10_000))
+STREAM_HEARTBEAT = float(os.environ.get("STREAM_HEARTBEAT", 15))
+# A böngésző ennyi ezredmásodperc után kapcsolódik újra
+STREAM_RETRY_MS = 5000
+
+HEARTBEAT = b": ping\n\n"
+
+
+def format_event(event: str, data, id: Optional[str] = None) -> bytes:
+    lines = [f"event: {event}\n".encode()]
+    if id is not None:
+        lines.append(f"id: {id}\n".encode())
+    lines.append(b"data: " + to_json(data) + b"\n\n")
+    return b"".join(lines)
+
+
+class _Client:
+    __slots__ = ("queue",)
+
+    def __init__(self, size: int):
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(size)
+
+
+class Broadcaster:
+    """Fans pre-encoded SSE messages out to every connected client.
+
+    ``publish`` never blocks: a client whose queue is full is dropped (its
+    queue is replaced by a single end-of-stream marker), so one stalled
+    connection cannot hold up the others or grow memory. Must be used from
+    the event loop.
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE, max_clients: int = STREAM_MAX_CLIENTS,
+                 heartbeat: float = STREAM_HEARTBEAT):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.dropped = 0
+        self._clients: Set[_Client] = set()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @property
+    def full(self) -> bool:
+        return len(self._clients) >= self.max_clients
+
+    def publish(self, message: bytes):
+        for client in list(self._clients):
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self._drop(client)
+
+    def close(self):
+        for client in list(self._clients):
+            self._drop(client)
+
+    def _drop(self, client: _Client):
+        self._clients.discard(client)
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+
+    async def stream(self, first: bytes) -> AsyncIterator[bytes]:
+        """Yield ``first``, then every published message until dropped."""
+        client = _Client(self.queue_size)
+        self._clients.add(client)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n".encode() + first
+            while True:
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Megakadályozza, hogy a proxyk tétlen kapcsolatként bontsák
+                    yield HEARTBEAT
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._clients.discard(client)
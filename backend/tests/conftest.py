@@ -0,0 +1,15 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+# A modulok importkor olvassák a konfigurációt; a tesztek ne nyúljanak a valódi adatokhoz
+TEST_DIR = tempfile.mkdtemp(prefix="pataky-tests-")
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ.setdefault("PUSH_SCHEDULE_ENABLED", "0")
+os.environ.setdefault("TOKEN_DB_PATH", os.path.join(TEST_DIR, "tokens.db"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(TEST_DIR, "image_cache"))
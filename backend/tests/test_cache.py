@@ -0,0 +1,19 @@
+from cache import CachedPayload, ResponseCache
+
+
+def test_discard_drops_matching_entries():
+    cache = ResponseCache()
+    cache.install({"news": CachedPayload(b"[]")})
+    cache.get_or_build("bootstrap:menu:2026-01-01", lambda: {})
+    cache.get_or_build("bootstrap:menu:2026-01-02", lambda: {})
+    cache.discard(lambda key: key.startswith("bootstrap:") and not key.endswith(":2026-01-02"))
+    assert sorted(cache.entries()) == ["bootstrap:menu:2026-01-02", "news"]
+
+
+def test_static_payloads_are_served_uncompressed_until_ready():
+    payload = CachedPayload(b'{"a": "' + b"x" * 4096 + b'"}', lazy=False)
+    assert payload.ready("json", "identity")
+    assert not payload.ready("json", "gzip")
+    payload.all_variants()
+    assert payload.ready("json", "gzip")
+    assert CachedPayload(b"{}").ready("json", "br")
@@ -0,0 +1,73 @@
+import json
+import pickle
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from content import SNAPSHOT_FILENAME, ContentStore
+
+
+class Article(BaseModel):
+    id: str
+    title: str
+
+
+class Exploit:
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (open, (str(self.marker), "w"))
+
+
+def make_store(tmp_path, key="titok", **kwargs):
+    content = tmp_path / "data"
+    content.mkdir(exist_ok=True)
+    if not (content / "news.json").exists():
+        (content / "news.json").write_text(json.dumps([{"id": "1", "title": "Első"}]))
+    return ContentStore({"news": ("news.json", List[Article])}, directory=str(content),
+                        snapshot_path=str(tmp_path / SNAPSHOT_FILENAME), snapshot_key=key, **kwargs)
+
+
+def test_signed_snapshot_is_used(tmp_path):
+    make_store(tmp_path).build_snapshot(lambda snapshot: {"count": len(snapshot["news"])})
+    snapshot = make_store(tmp_path).read()
+    assert snapshot.derived == {"count": 1}
+    assert snapshot["news"] == (Article(id="1", title="Első"),)
+
+
+def test_stale_snapshot_falls_back_to_the_sources(tmp_path):
+    make_store(tmp_path).build_snapshot(lambda snapshot: {"count": 1})
+    (tmp_path / "data" / "news.json").write_text(json.dumps([{"id": "2", "title": "Új"}]))
+    snapshot = make_store(tmp_path).read()
+    assert snapshot.derived == {}
+    assert snapshot["news"][0].id == "2"
+
+
+def test_forged_snapshot_is_never_unpickled(tmp_path):
+    path = tmp_path / SNAPSHOT_FILENAME
+    marker = tmp_path / "pwned"
+    make_store(tmp_path).build_snapshot()
+    blob = path.read_bytes()
+    payload = pickle.dumps(Exploit(marker))
+    # Érvényes fejléc, kicserélt adat; és egy teljesen idegen pickle fájl
+    for forged in (blob[:-1] + b"\x00", blob + payload, payload):
+        path.write_bytes(forged)
+        assert make_store(tmp_path).read().derived == {}
+    # Más kulccsal aláírt fájl sem jó
+    make_store(tmp_path, key="masik").build_snapshot(lambda snapshot: {"count": 1})
+    assert make_store(tmp_path).read().derived == {}
+    assert not marker.exists()
+
+
+def test_snapshot_needs_a_key(tmp_path):
+    store = make_store(tmp_path, key="")
+    assert not store.use_snapshot
+    with pytest.raises(ValueError):
+        store.build_snapshot()
+
+
+def test_default_snapshot_path_is_outside_the_content_dir(tmp_path):
+    store = ContentStore({"news": ("news.json", List[Article])}, directory=str(tmp_path))
+    assert tmp_path not in store.snapshot_path.parents
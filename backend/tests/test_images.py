@@ -0,0 +1,162 @@
+import asyncio
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import images
+from images import ThumbnailCache, image_key, media_type
+
+
+def png(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def origin():
+    """Helyi forrásszerver: ``/<szélesség>x<magasság>.png`` képeket ad, és számolja a kéréseket."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if not self.path.endswith(".png"):
+                self.send_error(404)
+                return
+            width, height = map(int, self.path[1:-4].split("x"))
+            body = png(width, height)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetches_once_and_resizes(tmp_path, origin):
+    base, hits = origin
+    cache = ThumbnailCache(str(tmp_path), width=100)
+    url = f"{base}/800x600.png"
+    cache.register([url])
+    key = image_key(url)
+
+    async def run():
+        return await asyncio.gather(*(cache.get(key) for _ in range(5)))
+
+    paths = asyncio.run(run())
+    assert len(set(paths)) == 1
+    assert hits == ["/800x600.png"]
+    with Image.open(paths[0]) as img:
+        assert img.format == "JPEG"
+        assert img.size == (100, 75)
+    # Második kérés a lemezről jön
+    assert asyncio.run(cache.get(key)) == paths[0]
+    assert len(hits) == 1
+    cache.close()
+
+
+def test_unknown_key_is_not_fetched(tmp_path, origin):
+    base, hits = origin
+    cache = ThumbnailCache(str(tmp_path))
+    cache.register([f"{base}/10x10.png"])
+    assert asyncio.run(cache.get(image_key(f"{base}/20x20.png"))) is None
+    assert hits == []
+    cache.close()
+
+
+def test_origin_error_propagates(tmp_path, origin):
+    base, _ = origin
+    cache = ThumbnailCache(str(tmp_path))
+    url = f"{base}/missing"
+    cache.register([url])
+    with pytest.raises(Exception):
+        asyncio.run(cache.get(image_key(url)))
+    assert not list(tmp_path.glob("*.jpg"))
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path, origin):
+    base, _ = origin
+    urls = [f"{base}/{size}x{size}.png" for size in (300, 310, 320)]
+    probe = ThumbnailCache(str(tmp_path / "probe"))
+    probe.register(urls[:1])
+    size = asyncio.run(probe.get(image_key(urls[0]))).stat().st_size
+    probe.close()
+
+    cache = ThumbnailCache(str(tmp_path / "cache"), max_bytes=int(size * 2.5))
+    cache.register(urls)
+    keys = [image_key(url) for url in urls]
+
+    async def run():
+        first = await cache.get(keys[0])
+        await cache.get(keys[1])
+        await cache.get(keys[0])
+        await cache.get(keys[2])
+        return first
+
+    first = asyncio.run(run())
+    remaining = {path.name.split("-")[0] for path in (tmp_path / "cache").glob("*.jpg")}
+    assert remaining == {keys[0], keys[2]}
+    assert first.exists()
+    cache.close()
+
+
+def test_picks_up_files_from_other_workers(tmp_path, origin):
+    base, hits = origin
+    url = f"{base}/50x50.png"
+    first = ThumbnailCache(str(tmp_path))
+    second = ThumbnailCache(str(tmp_path))
+    first.register([url])
+    second.register([url])
+    path = asyncio.run(first.get(image_key(url)))
+    assert asyncio.run(second.get(image_key(url))) == path
+    assert len(hits) == 1
+    first.close()
+    second.close()
+
+
+def test_new_images_are_warmed_in_the_background(tmp_path, origin):
+    base, hits = origin
+    cache = ThumbnailCache(str(tmp_path))
+    cache.register([f"{base}/30x30.png"])
+
+    async def run():
+        cache.start_warmer()
+        await cache._warmer
+        # Csak az újonnan regisztrált képet tölti le
+        cache.register([f"{base}/30x30.png", f"{base}/40x40.png"])
+        await asyncio.sleep(0)
+        await cache._warmer
+        return await cache.get(image_key(f"{base}/40x40.png"))
+
+    path = asyncio.run(run())
+    assert sorted(hits) == ["/30x30.png", "/40x40.png"]
+    assert path.exists()
+    cache.close()
+
+
+def test_original_format_is_kept_without_pillow(tmp_path, origin, monkeypatch):
+    monkeypatch.setattr(images, "Image", None)
+    base, _ = origin
+    cache = ThumbnailCache(str(tmp_path))
+    url = f"{base}/20x20.png"
+    cache.register([url])
+    path = asyncio.run(cache.get(image_key(url)))
+    assert path.suffix == ".png" and media_type(path) == "image/png"
+    assert path.read_bytes() == png(20, 20)
+    # A kicsinyített változattól eltérő ETag
+    assert cache.etag(image_key(url)) == f'"{image_key(url)}-orig"'
+    cache.close()
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+
+import pytest
+
+from indexes import IndexedCollection, decode_cursor, encode_cursor
+
+
+@dataclass(frozen=True)
+class Item:
+    id: str
+    date: str
+    kind: str = "a"
+
+
+def test_cursor_round_trip():
+    for key in ("album-1", "ékezetes/kulcs", ""):
+        assert decode_cursor(encode_cursor(key)) == key
+    with pytest.raises(ValueError):
+        decode_cursor("_w")
+
+
+def test_page_walks_every_item_once():
+    collection = IndexedCollection(Item(f"i{n}", "") for n in range(7))
+    seen, after = [], None
+    while True:
+        items, after = collection.page(after, 3)
+        seen.extend(item.id for item in items)
+        if after is None:
+            break
+    assert seen == [f"i{n}" for n in range(7)]
+
+
+def test_page_unknown_cursor():
+    collection = IndexedCollection([Item("a", "")])
+    with pytest.raises(KeyError):
+        collection.page("nincs", 10)
+
+
+def test_between_is_half_open_and_reversible():
+    collection = IndexedCollection(
+        [Item("c", "2026-03-01", "x"), Item("a", "2026-01-01"), Item("b", "2026-02-01", "x")],
+        indexes={"kind": lambda item: item.kind},
+        order=lambda item: item.date,
+    )
+    assert [i.id for i in collection.between("2026-01-15")] == ["b", "c"]
+    assert [i.id for i in collection.between(high="2026-03-01")] == ["a", "b"]
+    assert [i.id for i in collection.between(limit=2, reverse=True)] == ["c", "b"]
+    assert [i.id for i in collection.between(index="kind", value="x", limit=1)] == ["b"]
+    assert collection.between(index="kind", value="nincs") == ()
+
+
+def test_rebuilt_keeps_configuration():
+    collection = IndexedCollection([Item("a", "2")], indexes={"kind": lambda item: item.kind},
+                                   order=lambda item: item.date)
+    rebuilt = collection.rebuilt([Item("b", "2"), Item("c", "1")])
+    assert [i.id for i in rebuilt] == ["c", "b"]
+    assert [i.id for i in collection] == ["a"]
+    assert rebuilt.find("kind", "a") == (Item("c", "1"), Item("b", "2"))
+
+
+def test_composite_order_pages_through_equal_dates():
+    collection = IndexedCollection(
+        [Item(f"n{n}", "2026-01-0" + str(n % 2 + 1)) for n in range(5)],
+        order=lambda item: (item.date, item.id),
+    )
+    seen, high = [], None
+    while True:
+        found = collection.between(high=high, limit=2, reverse=True)
+        if not found:
+            break
+        seen.extend(item.id for item in found)
+        high = (found[-1].date, found[-1].id)
+    assert seen == ["n3", "n1", "n4", "n2", "n0"]
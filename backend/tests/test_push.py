@@ -0,0 +1,194 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from push import PushDispatcher
+from token_store import SQLiteTokenStore
+
+
+@pytest.fixture
+def expo():
+    """Helyi Expo csonk: ``/send`` jegyeket ad, ``/receipts`` a beállított nyugtákat.
+
+    ``statuses`` sorban visszaadandó hibakódok a sikeres válasz előtt,
+    ``ticket_errors`` és ``receipt_errors`` tokenenkénti Expo hibanevek.
+    """
+    stub = SimpleNamespace(batches=[], receipt_requests=[], statuses=[], ticket_errors={}, receipt_errors={})
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/send":
+                stub.batches.append([message["to"] for message in body])
+                if stub.statuses:
+                    self.reply(stub.statuses.pop(0), {"errors": [{"code": "UNAVAILABLE"}]})
+                    return
+                self.reply(200, {"data": [self.ticket(message["to"]) for message in body]})
+            else:
+                stub.receipt_requests.append(body["ids"])
+                self.reply(200, {"data": {ticket_id: self.receipt(ticket_id) for ticket_id in body["ids"]}})
+
+        @staticmethod
+        def ticket(token):
+            if token in stub.ticket_errors:
+                return {"status": "error", "details": {"error": stub.ticket_errors[token]}}
+            return {"status": "ok", "id": f"ticket-{token}"}
+
+        @staticmethod
+        def receipt(ticket_id):
+            error = stub.receipt_errors.get(ticket_id[len("ticket-"):])
+            if error is not None:
+                return {"status": "error", "details": {"error": error}}
+            return {"status": "ok"}
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 503:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    stub.send_url, stub.receipts_url = f"{base}/send", f"{base}/receipts"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def dispatcher(store, expo, **kwargs):
+    return PushDispatcher(store, url=expo.send_url, receipts_url=expo.receipts_url,
+                          backoff_base=0, receipt_delay=0, **kwargs)
+
+
+async def broadcast(push: PushDispatcher, tokens, **kwargs):
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    job = await push.submit("Cím", "Szöveg", tokens,
+                            on_done=lambda job: loop.call_soon_threadsafe(done.set), **kwargs)
+    await done.wait()
+    return job
+
+
+def test_jobs_and_receipts_are_shared_between_workers(tmp_path, expo):
+    path = str(tmp_path / "tokens.db")
+    first, second = SQLiteTokenStore(path), SQLiteTokenStore(path)
+    sender, other = dispatcher(first, expo), dispatcher(second, expo)
+
+    async def run():
+        job = await broadcast(sender, ["a", "b", "c"])
+        seen = await other.get(job.id)
+        assert seen.status == "done" and seen.sent == 3
+        assert seen.delivery.pending == 3
+        assert [job.id for job in await other.recent()] == [job.id]
+        assert await other.get("missing") is None
+        # A nyugtákat a másik worker is feldolgozhatja
+        await other.poll_receipts(min_age=0)
+        return await sender.get(job.id)
+
+    try:
+        job = asyncio.run(run())
+        assert job.delivery.delivered == 3 and job.delivery.pending == 0
+        assert first.count_tickets() == 0
+    finally:
+        for push, store in ((sender, first), (other, second)):
+            asyncio.run(push.close())
+            store._close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteTokenStore(str(tmp_path / "tokens.db"))
+    yield store
+    store._close()
+
+
+def test_tokens_are_sent_in_expo_sized_chunks(store, expo):
+    push = dispatcher(store, expo, concurrency=2)
+    tokens = [f"t{n:03}" for n in range(250)]
+    try:
+        job = asyncio.run(broadcast(push, iter(tokens)))
+    finally:
+        asyncio.run(push.close())
+    assert sorted(len(batch) for batch in expo.batches) == [50, 100, 100]
+    assert sorted(token for batch in expo.batches for token in batch) == tokens
+    assert [chunk.size for chunk in job.chunks] == [100, 100, 50]
+    assert job.status == "done" and job.sent == 250 and job.failed == 0
+
+
+def test_unavailable_expo_is_retried(store, expo):
+    expo.statuses.append(503)
+    push = dispatcher(store, expo, max_retries=2)
+    try:
+        job = asyncio.run(broadcast(push, ["a", "b"]))
+    finally:
+        asyncio.run(push.close())
+    assert expo.batches == [["a", "b"], ["a", "b"]]
+    chunk, = job.chunks
+    assert chunk.ok and chunk.attempts == 2 and chunk.status_code == 200
+    assert job.sent == 2
+
+
+def test_retries_are_bounded(store, expo):
+    expo.statuses.extend([503, 503, 503])
+    push = dispatcher(store, expo, max_retries=1)
+    try:
+        job = asyncio.run(broadcast(push, ["a"]))
+    finally:
+        asyncio.run(push.close())
+    assert len(expo.batches) == 2
+    assert job.status == "failed" and job.failed == 1
+    assert job.chunks[0].status_code == 503
+
+
+def test_unregistered_devices_are_evicted(store, expo):
+    store.add_many(["a", "b", "c", "d"])
+    expo.ticket_errors["b"] = "DeviceNotRegistered"
+    expo.ticket_errors["c"] = "MessageRateExceeded"
+    expo.receipt_errors["d"] = "DeviceNotRegistered"
+    push = dispatcher(store, expo, on_invalid_token=store.remove)
+
+    async def run():
+        job = await broadcast(push, store.subscribers())
+        await push.poll_receipts(min_age=0)
+        return await push.get(job.id)
+
+    try:
+        job = asyncio.run(run())
+    finally:
+        asyncio.run(push.close())
+    # Csak a végleges hibák törlik a tokent
+    assert list(store.subscribers()) == ["a", "c"]
+    assert expo.receipt_requests == [["ticket-a", "ticket-d"]]
+    delivery = job.delivery
+    assert (delivery.tickets_ok, delivery.ticket_errors, delivery.delivered, delivery.receipt_errors) == (2, 2, 1, 1)
+    assert delivery.pending == 0 and delivery.evicted == 2
+    assert delivery.errors == {"DeviceNotRegistered": 2, "MessageRateExceeded": 1}
+    assert store.count_tickets() == 0
+
+
+def test_tickets_wait_for_their_receipt(store, expo):
+    push = dispatcher(store, expo)
+
+    async def run():
+        await broadcast(push, ["a"])
+        await push.poll_receipts(min_age=60)
+
+    try:
+        asyncio.run(run())
+    finally:
+        asyncio.run(push.close())
+    assert expo.receipt_requests == []
+    assert store.count_tickets() == 1
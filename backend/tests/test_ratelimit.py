@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from ratelimit import BroadcastGate, Limit, RateLimiter
+from token_store import SQLiteTokenStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteTokenStore(str(tmp_path / "tokens.db"))
+    yield store
+    store._close()
+
+
+def request(host: str) -> Request:
+    return Request({"type": "http", "headers": [], "client": (host, 50000)})
+
+
+def test_empty_bucket_answers_429_with_retry_after(store):
+    limiter = RateLimiter(store, {"register-token": Limit(2, 60)}, enabled=True, per_client=True)
+
+    async def run():
+        await limiter.check("register-token", request("10.0.0.1"))
+        await limiter.check("register-token", request("10.0.0.1"))
+        # Másik kliensnek saját kerete van
+        await limiter.check("register-token", request("10.0.0.2"))
+        await limiter.check("register-token", request("10.0.0.1"))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 429
+    assert 0 < int(error.value.headers["Retry-After"]) <= 30
+
+
+def test_per_client_limits_need_a_trusted_address(store):
+    limits = {"register-token": Limit(1, 60), "push-global": Limit(1, 60, per_client=False)}
+    limiter = RateLimiter(store, limits, enabled=True, per_client=False)
+    assert list(limiter.limits) == ["push-global"]
+
+    async def run():
+        # Egy NAT mögötti osztály sem akad el a kliensenkénti kereten
+        for _ in range(5):
+            await limiter.check("register-token", request("10.0.0.1"))
+        await limiter.check("push-global", request("10.0.0.1"))
+        await limiter.check("push-global", request("10.0.0.2"))
+
+    with pytest.raises(HTTPException):
+        asyncio.run(run())
+
+
+def test_broadcast_gate_admits_one_sender(store):
+    gate = BroadcastGate(store, ttl=60)
+
+    async def run():
+        owner = await gate.try_acquire()
+        assert owner is not None
+        assert await gate.try_acquire() is None
+        assert await gate.acquire(timeout=0.05, poll=0.01) is None
+        # Csak a tulajdonos engedheti el
+        gate.release("someone-else")
+        assert await gate.try_acquire() is None
+        gate.release(owner)
+        return await gate.acquire(timeout=1, poll=0.01)
+
+    assert asyncio.run(run()) is not None
+
+
+def test_broadcast_gate_waits_for_release(store):
+    gate = BroadcastGate(store, ttl=60)
+
+    async def run():
+        owner = await gate.try_acquire()
+        waiter = asyncio.create_task(gate.acquire(timeout=5, poll=0.01))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await asyncio.to_thread(gate.release, owner)
+        return await waiter
+
+    assert asyncio.run(run()) is not None
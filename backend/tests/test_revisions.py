@@ -0,0 +1,99 @@
+from content import RevisionLog
+
+
+def records(**collections):
+    return {name: dict(items) for name, items in collections.items()}
+
+
+def test_first_load_is_a_full_reset():
+    log = RevisionLog()
+    changed = log.update(records(news={"a": {"t": 1}, "b": {"t": 2}}, menu={}))
+    assert changed == ["menu", "news"]
+    result = log.changes_since(None)
+    assert result.reset
+    assert result.version == log.version
+    assert sorted(result.upserted["news"]) == ["a", "b"]
+
+
+def test_delta_lists_upserts_and_deletes():
+    log = RevisionLog()
+    log.update(records(news={"a": {"t": 1}, "b": {"t": 2}}, menu={"x": {"m": 1}}))
+    before = log.version
+    changed = log.update(records(news={"a": {"t": 9}, "c": {"t": 3}}, menu={"x": {"m": 1}}))
+    assert changed == ["news"]
+    result = log.changes_since(before)
+    assert not result.reset
+    assert sorted(result.upserted["news"]) == ["a", "c"]
+    assert result.deleted == {"news": ["b"]}
+    assert log.changes_since(log.version).upserted == {}
+
+
+def test_unchanged_content_keeps_the_version():
+    log = RevisionLog()
+    data = records(news={"a": {"t": 1}})
+    log.update(data)
+    version = log.version
+    assert log.update(data) == []
+    assert log.version == version
+
+
+def test_prepare_does_not_install():
+    log = RevisionLog()
+    log.update(records(news={"a": {"t": 1}}))
+    version = log.version
+    state, changed = log.prepare(records(news={"a": {"t": 2}}))
+    assert changed == ["news"]
+    assert log.version == version
+    log.install(state)
+    assert log.version != version
+
+
+def test_unknown_or_foreign_version_resets():
+    log = RevisionLog()
+    log.update(records(news={"a": {"t": 1}}))
+    other = RevisionLog()
+    other.update(records(news={"z": {"t": 2}}))
+    for since in ("garbage", "", other.version, log.version + "9"):
+        assert log.changes_since(since).reset
+
+
+def test_old_versions_reset_after_tombstone_pruning():
+    log = RevisionLog(max_tombstones=1)
+    log.update(records(news={"a": {}, "b": {}, "c": {}}))
+    first = log.version
+    log.update(records(news={"b": {}, "c": {}}))
+    log.update(records(news={"c": {}}))
+    assert log.changes_since(first).reset
+
+
+def test_workers_agree_on_versions():
+    first, second = RevisionLog(), RevisionLog()
+    old = records(news={"a": {"t": 1}})
+    new = records(news={"a": {"t": 2}, "b": {"t": 1}})
+    # Az egyik worker látta a régi tartalmat is, a másik már az újjal indult
+    first.update(old)
+    first.update(records(news={"a": {"t": 5}}))
+    first.update(new)
+    second.update(new)
+    assert first.version == second.version
+    assert not first.changes_since(first.version).reset
+    delta = first.changes_since(_version_of(old))
+    assert sorted(delta.upserted["news"]) == ["a", "b"]
+    # A régi verziót a később indult worker nem ismeri: teljes újraküldés
+    assert second.changes_since(_version_of(old)).reset
+
+
+def test_reverted_content_has_its_old_version():
+    log = RevisionLog()
+    log.update(records(news={"a": {"t": 1}}))
+    original = log.version
+    log.update(records(news={"a": {"t": 2}}))
+    log.update(records(news={"a": {"t": 1}}))
+    assert log.version == original
+    assert log.changes_since(original).upserted == {}
+
+
+def _version_of(data):
+    log = RevisionLog()
+    log.update(data)
+    return log.version
@@ -0,0 +1,163 @@
+import pytest
+from fastapi.testclient import TestClient
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Importkor betölti a tartalmat és megnyitja a tárolókat (lásd conftest)
+    from server import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("path", ["/api/courses", "/api/staff", "/api/gallery", "/api/news"])
+def test_unchanged_content_answers_304(client, path):
+    response = client.get(path, headers=IDENTITY)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+
+    again = client.get(path, headers={**IDENTITY, "If-None-Match": f"W/{etag}"})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    stale = client.get(path, headers={**IDENTITY, "If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.json() == response.json()
+
+
+def test_each_encoding_has_its_own_etag(client):
+    plain = client.get("/api/courses", headers=IDENTITY)
+    gzipped = client.get("/api/courses", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+    assert gzipped.json() == plain.json()
+
+
+@pytest.mark.parametrize("path", ["/api/news/{id}", "/api/gallery/{id}", "/api/campus/{id}"])
+def test_lookup_by_id(client, path):
+    collection = path.rsplit("/", 1)[0]
+    first = client.get(collection).json()[0]
+    found = client.get(path.format(id=first["id"]))
+    assert found.status_code == 200
+    assert found.json()["id"] == first["id"]
+    missing = client.get(path.format(id="nincs-ilyen"))
+    assert missing.status_code == 404
+    assert missing.json()["detail"]
+
+
+def test_room_lookup_by_id(client):
+    found = client.get("/api/rooms/A-001").json()
+    assert found["room"]["id"] == "A-001" and found["building_code"] == "A"
+    assert client.get("/api/rooms/nincs-ilyen").status_code == 404
+    assert client.get("/api/gallery/nincs-ilyen/images").status_code == 404
+
+
+def test_gallery_pages_cover_the_full_list(client):
+    albums = client.get("/api/gallery").json()
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/gallery", params=params).json()
+        assert len(page["items"]) <= 3
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == albums
+    assert client.get("/api/gallery", params={"cursor": "_w"}).status_code == 400
+
+
+def test_gallery_summary_with_fields(client):
+    page = client.get("/api/gallery", params={"summary": "true", "limit": 2, "fields": "id,title"}).json()
+    assert [set(album) for album in page["items"]] == [{"id", "title"}] * 2
+    assert client.get("/api/gallery", params={"fields": "nincs"}).status_code == 400
+
+
+def test_album_images_are_paged(client):
+    album = client.get("/api/gallery").json()[0]
+    first = client.get(f"/api/gallery/{album['id']}/images", params={"limit": 2}).json()
+    rest = client.get(f"/api/gallery/{album['id']}/images",
+                      params={"limit": 10, "cursor": first["next_cursor"]}).json()
+    assert len(first["items"]) == 2
+    assert first["items"] + rest["items"] == album["images"]
+    assert rest["next_cursor"] is None
+
+
+def test_sync_resets_then_sends_only_changes(client):
+    full = client.get("/api/sync").json()
+    assert full["reset"] is True
+    assert [news["id"] for news in full["changes"]["news"]["upserted"]] == \
+        [news["id"] for news in client.get("/api/news").json()]
+
+    current = client.get("/api/sync", params={"since": full["version"]}).json()
+    assert current == {"version": full["version"], "reset": False, "changes": {}}
+
+    unknown = client.get("/api/sync", params={"since": "ismeretlen"}).json()
+    assert unknown["reset"] is True and unknown["version"] == full["version"]
+
+
+def test_bootstrap_combines_the_startup_data(client):
+    response = client.get("/api/bootstrap", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    body = response.json()
+    assert list(body) == ["school_info", "contact", "quick_links", "menu", "events", "news"]
+    assert body["contact"] == client.get("/api/contact").json()
+    assert body["menu"] == client.get("/api/menu").json()
+
+    headers = {"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]}
+    again = client.get("/api/bootstrap", headers=headers)
+    assert again.status_code == 304
+
+
+def test_bootstrap_include_filters_parts(client):
+    # A sorrend és az ismétlés nem számít
+    body = client.get("/api/bootstrap", params={"include": "menu,contact,menu"}).json()
+    assert list(body) == ["contact", "menu"]
+    assert client.get("/api/bootstrap", params={"include": "menu,nincs"}).status_code == 400
+
+
+def newest_first(articles):
+    return sorted(articles, key=lambda article: (article["date"], article["id"]), reverse=True)
+
+
+def test_news_pages_cover_the_full_list(client):
+    articles = newest_first(client.get("/api/news").json())
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/news", params=params).json()
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == articles
+    assert client.get("/api/news", params={"cursor": "_w"}).status_code == 400
+
+
+def test_news_before_is_an_exclusive_date_bound(client):
+    articles = newest_first(client.get("/api/news").json())
+    day = articles[1]["date"]
+    older = [article for article in articles if article["date"] < day]
+    page = client.get("/api/news", params={"before": day}).json()
+    assert page == {"items": older, "next_cursor": None}
+
+    first = client.get("/api/news", params={"before": day, "limit": 1}).json()
+    rest = client.get("/api/news", params={"before": day, "cursor": first["next_cursor"]}).json()
+    assert first["items"] + rest["items"] == older
+    assert client.get("/api/news", params={"before": "tegnap"}).status_code == 422
+
+
+def test_news_schema_declares_both_shapes(client):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/news"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert len(response["anyOf"]) == 2
+
+
+def test_unknown_thumbnail_is_not_proxied(client):
+    # Csak a galériában szereplő képek kérhetők le, tetszőleges URL nem
+    assert client.get("/api/images/0123456789abcdef0123456789abcdef").status_code == 404
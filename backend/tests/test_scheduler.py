@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from scheduler import DailyCampaign, PushScheduler
+from token_store import SQLiteTokenStore
+
+AT = datetime(2026, 3, 2, 10, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    stores = [SQLiteTokenStore(path), SQLiteTokenStore(path)]
+    yield stores
+    for store in stores:
+        store._close()
+
+
+def campaign():
+    return DailyCampaign("menu", time(10, 30), timezone.utc, lambda when: ("Menü", when.date().isoformat()))
+
+
+def schedulers(stores, send):
+    # Két worker ugyanazzal a közös tárolóval
+    result = []
+    for store in stores:
+        scheduler = PushScheduler(send, store)
+        scheduler.set_campaigns([campaign()])
+        result.append(scheduler)
+    return result
+
+
+def test_occurrence_fires_once_across_workers(stores):
+    sent = []
+
+    async def send(topic, title, body):
+        sent.append(body)
+        return {"job_id": "j"}
+
+    async def run():
+        first, second = schedulers(stores, send)
+        await asyncio.gather(first.tick(AT + timedelta(seconds=5)), second.tick(AT + timedelta(seconds=7)))
+        await asyncio.gather(first.tick(AT + timedelta(seconds=35)), second.tick(AT + timedelta(seconds=37)))
+
+    asyncio.run(run())
+    assert sent == ["2026-03-02"]
+
+
+def test_failed_send_is_retried_once(stores):
+    attempts = []
+
+    async def send(topic, title, body):
+        attempts.append(body)
+        if len(attempts) == 1:
+            raise RuntimeError("Expo nem érhető el")
+        return {"job_id": "j"}
+
+    async def run():
+        first, second = schedulers(stores, send)
+        await first.tick(AT + timedelta(seconds=5))
+        # A bérlet felszabadult, így a következő körben valaki újraküldi
+        await asyncio.gather(first.tick(AT + timedelta(seconds=35)), second.tick(AT + timedelta(seconds=37)))
+        await asyncio.gather(first.tick(AT + timedelta(seconds=65)), second.tick(AT + timedelta(seconds=67)))
+
+    asyncio.run(run())
+    assert attempts == ["2026-03-02", "2026-03-02"]
+
+
+def test_failed_send_is_not_retried_after_the_grace_period(stores):
+    attempts = []
+
+    async def send(topic, title, body):
+        attempts.append(body)
+        raise RuntimeError("Expo nem érhető el")
+
+    async def run():
+        scheduler, = schedulers(stores[:1], send)
+        await scheduler.tick(AT + timedelta(seconds=5))
+        await scheduler.tick(AT + scheduler.grace + timedelta(seconds=5))
+
+    asyncio.run(run())
+    assert len(attempts) == 1
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+from search import TextSearchIndex, fold
+
+
+@dataclass(frozen=True)
+class Teacher:
+    id: str
+    name: str
+    subject: str = ""
+
+
+TEACHERS = [Teacher("1", "Kovács Péter", "Matematika"), Teacher("2", "Tóth Anna", "Informatika"),
+            Teacher("3", "Nagy Ádám", "Történelem")]
+
+
+def ids(results):
+    return [item.id for item in results]
+
+
+def index():
+    return TextSearchIndex({"name": 3.0, "subject": 1.0}, TEACHERS)
+
+
+def test_fold_ignores_accents_and_case():
+    assert fold("Tóth ÁDÁM") == "toth adam"
+
+
+def test_prefix_ranks_above_infix():
+    assert ids(index().search("tor")) == ["3"]
+    assert ids(index().search("mat")) == ["1", "2"]
+
+
+def test_every_term_must_match():
+    assert ids(index().search("toth info")) == ["2"]
+    assert index().search("toth matek") == []
+
+
+def test_short_infix_terms_still_match():
+    # "ac" és "am" csak szó belsejében fordul elő (Kovács, Ádám)
+    assert ids(index().search("ac")) == ["1"]
+    assert ids(index().search("am")) == ["3"]
+    # Szó eleje (Nagy) a szórészlet (Anna) előtt
+    assert ids(index().search("n")) == ["3", "2"]
+
+
+def test_prebuilt_index_is_reused_only_for_the_same_fields():
+    source = index()
+    prebuilt = source.build(TEACHERS)
+    assert ids(source.rebuilt(TEACHERS, prebuilt).search("kov")) == ["1"]
+    other = TextSearchIndex({"subject": 1.0})
+    assert ids(other.rebuilt(TEACHERS, prebuilt).search("kov")) == []
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+
+import pytest
+
+from token_store import SQLiteTokenStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteTokenStore(str(tmp_path / "tokens.db"), flush_batch=1000)
+    yield store
+    store._close()
+
+
+def test_buffered_writes_are_visible_after_flush(store):
+    store.add("t1", ["menu"])
+    store.add_many(["t2", "t3"], ["menu", "events"])
+    store.remove("t3")
+    assert store.count() == 2
+    assert sorted(store.subscribers("menu")) == ["t1", "t2"]
+    assert list(store.subscribers("events")) == ["t2"]
+
+
+def test_topics_are_replaced_on_reregistration(store):
+    store.add("t1", ["menu", "events"])
+    store.flush()
+    store.add("t1", ["grade:9"])
+    assert list(store.subscribers("menu")) == []
+    assert list(store.subscribers("grade:9")) == ["t1"]
+
+
+def test_missing_topics_keep_existing_subscriptions(store):
+    store.add("old", ["grade:9"])
+    store.flush()
+    store.add_many(["old", "new"])
+    assert list(store.subscribers("grade:9")) == ["old"]
+    assert list(store.subscribers("menu")) == ["new"]
+    # A pufferben lévő témákat sem írja felül
+    store.add("fresh", ["events"])
+    store.add("fresh")
+    assert list(store.subscribers("events")) == ["fresh", "new"]
+
+
+def test_batches_are_bounded(store):
+    store.add_many([f"t{n:03}" for n in range(25)])
+    batches = list(store.iter_batches(size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+
+def test_shared_state_across_instances(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    first, second = SQLiteTokenStore(path), SQLiteTokenStore(path)
+    try:
+        first.add("t1")
+        first.flush()
+        assert list(second.subscribers()) == ["t1"]
+        assert first.acquire_lease("job", "a", ttl=60)
+        assert not second.acquire_lease("job", "b", ttl=60)
+        second.release_lease("job", "b")
+        assert not second.acquire_lease("job", "b", ttl=60)
+        first.release_lease("job", "a")
+        assert second.acquire_lease("job", "b", ttl=60)
+    finally:
+        first._close()
+        second._close()
+
+
+def test_token_bucket(store):
+    assert store.take_token("k", rate=1.0, burst=2) == 0
+    assert store.take_token("k", rate=1.0, burst=2) == 0
+    wait = store.take_token("k", rate=1.0, burst=2)
+    assert 0 < wait <= 1.0
+
+
+def test_jobs_keep_the_newest_records(store):
+    for n in range(3):
+        store.save_job(f"j{n}", created_at=n, record={"id": f"j{n}", "status": "queued"}, keep=2)
+    store.save_job("j2", created_at=2, record={"id": "j2", "status": "done"}, keep=2)
+    assert [job["id"] for job in store.recent_jobs(10)] == ["j2", "j1"]
+    assert store.get_job("j0") is None
+    assert store.get_job("j2")["status"] == "done"
+
+
+def test_tickets_are_paged_and_settled_into_the_job(store):
+    store.save_job("j", created_at=0, record={"id": "j"}, keep=10)
+    store.add_tickets("j", [("x1", "a"), ("x2", "b"), ("x3", "c")], sent_at=10,
+                      counts={"tickets_ok": 3, "pending": 3})
+    assert store.due_tickets(sent_before=5, limit=10) == []
+    first = store.due_tickets(sent_before=20, limit=2)
+    rest = store.due_tickets(sent_before=20, limit=2, after=(first[-1][3], first[-1][0]))
+    assert [ticket[0] for ticket in first + rest] == ["x1", "x2", "x3"]
+    counts = {"pending": -2, "delivered": 1, "receipt_errors": 1, "errors.DeviceNotRegistered": 1}
+    store.settle_tickets(["x1", "x2"], {"j": counts})
+    assert store.count_tickets() == 1
+    delivery = store.get_job("j")["delivery"]
+    assert delivery == {"tickets_ok": 3, "pending": 1, "delivered": 1, "receipt_errors": 1,
+                        "errors": {"DeviceNotRegistered": 1}}
+
+
+def test_failed_write_keeps_the_batch(store, monkeypatch):
+    store.add_many(["t1", "t2"], ["menu"])
+    store.remove("gone")
+
+    def broken(subscriptions):
+        # Írás közben érkező hívások: ezek az újabbak
+        store.add("t2", ["events"])
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_upsert", broken)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.undo()
+    assert store.count() == 2
+    assert list(store.subscribers("menu")) == ["t1"]
+    assert list(store.subscribers("events")) == ["t2"]
+
+
+def test_full_buffer_is_flushed_by_the_background_flusher(tmp_path, monkeypatch):
+    store = SQLiteTokenStore(str(tmp_path / "tokens.db"), flush_interval=60, flush_batch=2)
+    flushed = []
+    upsert = store._upsert
+    monkeypatch.setattr(store, "_upsert", lambda subscriptions: (flushed.append(threading.get_ident()),
+                                                                 upsert(subscriptions)))
+
+    async def run():
+        store.start_flusher()
+        store.add_many(["t1", "t2"])
+        # A kérést kiszolgáló hurokban nem történt írás
+        assert flushed == []
+        for _ in range(100):
+            if flushed:
+                break
+            await asyncio.sleep(0.01)
+        await store.close()
+
+    asyncio.run(run())
+    assert flushed and flushed[0] != threading.get_ident()
@@ -0,0 +1,663 @@
+"""Push tokenek tartós, több worker között megosztott tárolása.
+
+Alapértelmezés szerint egy SQLite fájl (WAL módban), ``TOKEN_STORE=mongo``
+esetén MongoDB gyűjtemény. Ugyanitt él minden, amin a workereknek osztozniuk
+kell: bérletek, sebességkorlát vödrök, a push küldési feladatok és a
+nyugtára váró jegyek.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_STORE = os.environ.get("TOKEN_STORE", "sqlite")
+TOKEN_DB_PATH = os.environ.get("TOKEN_DB_PATH", str(Path(__file__).parent / "tokens.db"))
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "pataky")
+TOKEN_FLUSH_INTERVAL = float(os.environ.get("TOKEN_FLUSH_INTERVAL", 0.5))
+TOKEN_FLUSH_BATCH = int(os.environ.get("TOKEN_FLUSH_BATCH", 500))
+TOKEN_READ_BATCH = 1000
+# Ennyi ideje nem használt sebességkorlát vödröket törlünk (addigra úgyis tele vannak)
+BUCKET_IDLE_TTL = 3600
+# Témák, amelyekre az új, témát nem küldő (régi) kliensek és a témák előtti tokenek feliratkoznak
+DEFAULT_TOPICS = tuple(t for t in os.environ.get("PUSH_DEFAULT_TOPICS", "menu,events").split(",") if t)
+
+# None: a meglévő feliratkozások maradnak, új token az alapértelmezett témákat kapja
+Subscription = Tuple[str, Optional[FrozenSet[str]]]
+# Nyugtára váró jegy: (jegy azonosító, feladat azonosító, token, küldés ideje)
+Ticket = Tuple[str, str, str, float]
+
+
+def apply_counts(delivery: Dict[str, Any], counts: Dict[str, int]):
+    """Add ``counts`` to a delivery stats dict; ``"errors.<name>"`` keys go to ``errors``."""
+    for key, value in counts.items():
+        if key.startswith("errors."):
+            errors = delivery.setdefault("errors", {})
+            name = key[len("errors."):]
+            errors[name] = errors.get(name, 0) + value
+        else:
+            delivery[key] = delivery.get(key, 0) + value
+
+
+class TokenStore:
+    """Buffers writes in memory and applies them to the backend in batches.
+
+    ``add``/``remove`` only touch the in-memory buffer, so they are safe to
+    call from request handlers; ``flush`` does the I/O and is run from a
+    worker thread by the background flusher, which is woken early when the
+    buffer fills up. A failed write puts the batch back into the buffer.
+    Reads flush first, so a worker always sees its own writes.
+
+    Each token carries a set of topics; backends keep an inverted
+    topic -> token index, so ``iter_batches(topic=...)`` reads only the
+    audience of that topic.
+    """
+
+    def __init__(self, flush_interval: float = TOKEN_FLUSH_INTERVAL,
+                 flush_batch: int = TOKEN_FLUSH_BATCH):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._lock = threading.Lock()
+        self._added: Dict[str, Optional[FrozenSet[str]]] = {}
+        self._removed: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def add(self, token: str, topics: Optional[Iterable[str]] = None):
+        self.add_many([token], topics)
+
+    def add_many(self, tokens: Iterable[str], topics: Optional[Iterable[str]] = None):
+        """Register tokens; their topic subscriptions are replaced by ``topics``.
+
+        With ``topics=None`` known tokens keep their subscriptions and new
+        ones get ``DEFAULT_TOPICS``.
+        """
+        topics = frozenset(topics) if topics is not None else None
+        with self._lock:
+            for token in tokens:
+                self._removed.discard(token)
+                if topics is not None or token not in self._added:
+                    self._added[token] = topics
+            full = len(self._added) >= self.flush_batch
+        if not full:
+            return
+        if self._flusher is None:
+            self.flush()
+        else:
+            # Az eseményhurokban nem írunk az adatbázisba, a háttér mentő végzi
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def remove(self, token: str):
+        with self._lock:
+            self._added.pop(token, None)
+            self._removed.add(token)
+
+    def flush(self):
+        with self._lock:
+            added, self._added = self._added, {}
+            removed, self._removed = self._removed, set()
+        try:
+            if added:
+                self._upsert(sorted(added.items()))
+            if removed:
+                self._delete(sorted(removed))
+        except Exception:
+            with self._lock:
+                # A közben érkezett hívások újabbak, azokat nem írjuk felül
+                for token, topics in added.items():
+                    if token not in self._added and token not in self._removed:
+                        self._added[token] = topics
+                for token in removed:
+                    if token not in self._added:
+                        self._removed.add(token)
+            raise
+
+    def iter_batches(self, size: int = TOKEN_READ_BATCH, topic: Optional[str] = None) -> Iterator[List[str]]:
+        self.flush()
+        return self._iter_batches(size, topic)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.subscribers()
+
+    def subscribers(self, topic: Optional[str] = None) -> Iterator[str]:
+        """Lazily yield the tokens subscribed to ``topic`` (all tokens for None)."""
+        for batch in self.iter_batches(topic=topic):
+            yield from batch
+
+    def count(self, topic: Optional[str] = None) -> int:
+        self.flush()
+        return self._count(topic)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Claim ``name`` for ``ttl`` seconds; True only for the one winner.
+
+        Shared by all workers using the same backend, so it can be used to
+        run a job exactly once. An expired lease can be claimed again.
+        """
+        return self._acquire_lease(name, owner, time.time(), ttl)
+
+    def release_lease(self, name: str, owner: str):
+        """Give the lease back early; no-op if ``owner`` no longer holds it."""
+        self._release_lease(name, owner)
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        """Token bucket shared by all workers: take one token from ``key``.
+
+        The bucket holds at most ``burst`` tokens and refills at ``rate`` per
+        second. Returns 0 when a token was taken, otherwise the seconds until
+        one will be available.
+        """
+        return self._take_token(key, rate, burst, time.time())
+
+    def save_job(self, job_id: str, created_at: float, record: Dict[str, Any], keep: int):
+        """Insert or replace a push job record, keeping the ``keep`` newest jobs.
+
+        Delivery counters are stored separately (see ``add_tickets``), so
+        saving the record never overwrites counts added by another worker.
+        """
+        self._save_job(job_id, created_at, record, keep)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job record with its ``delivery`` counters, or ``None``."""
+        return self._get_job(job_id)
+
+    def recent_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        """The newest job records first."""
+        return self._recent_jobs(limit)
+
+    def add_tickets(self, job_id: str, tickets: List[Tuple[str, str]], sent_at: float,
+                    counts: Dict[str, int]):
+        """Store ``(ticket id, token)`` pairs awaiting a receipt and add ``counts``
+        to the job's delivery counters, in one write."""
+        self._add_tickets(job_id, tickets, sent_at, counts)
+
+    def due_tickets(self, sent_before: float, limit: int,
+                    after: Optional[Tuple[float, str]] = None) -> List[Ticket]:
+        """Tickets sent before ``sent_before``, oldest first, continuing after
+        the ``(sent_at, ticket id)`` of the previous batch."""
+        return self._due_tickets(sent_before, limit, after)
+
+    def settle_tickets(self, ticket_ids: List[str], counts: Dict[str, Dict[str, int]]):
+        """Drop answered tickets and add per-job ``counts``, in one write."""
+        self._settle_tickets(ticket_ids, counts)
+
+    def count_tickets(self) -> int:
+        return self._count_tickets()
+
+    def start_flusher(self):
+        if self._flusher is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._flusher = self._loop.create_task(self._flush_forever())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.to_thread(self.flush)
+        self._close()
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._added or self._removed:
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    logger.exception("Tokenek mentése sikertelen")
+
+    # Backend hooks
+    def _upsert(self, subscriptions: List[Subscription]):
+        raise NotImplementedError
+
+    def _delete(self, tokens: List[str]):
+        raise NotImplementedError
+
+    def _iter_batches(self, size: int, topic: Optional[str]) -> Iterator[List[str]]:
+        raise NotImplementedError
+
+    def _count(self, topic: Optional[str]) -> int:
+        raise NotImplementedError
+
+    def _acquire_lease(self, name: str, owner: str, now: float, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def _release_lease(self, name: str, owner: str):
+        raise NotImplementedError
+
+    def _take_token(self, key: str, rate: float, burst: float, now: float) -> float:
+        raise NotImplementedError
+
+    def _save_job(self, job_id: str, created_at: float, record: Dict[str, Any], keep: int):
+        raise NotImplementedError
+
+    def _get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _recent_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _add_tickets(self, job_id: str, tickets: List[Tuple[str, str]], sent_at: float,
+                     counts: Dict[str, int]):
+        raise NotImplementedError
+
+    def _due_tickets(self, sent_before: float, limit: int,
+                     after: Optional[Tuple[float, str]]) -> List[Ticket]:
+        raise NotImplementedError
+
+    def _settle_tickets(self, ticket_ids: List[str], counts: Dict[str, Dict[str, int]]):
+        raise NotImplementedError
+
+    def _count_tickets(self) -> int:
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class SQLiteTokenStore(TokenStore):
+    def __init__(self, path: str = TOKEN_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        seed_topics = not self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'token_topics'"
+        ).fetchone()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS push_tokens ("
+            " id INTEGER PRIMARY KEY,"
+            " token TEXT NOT NULL UNIQUE,"
+            " created_at REAL NOT NULL)"
+        )
+        # Fordított index: témánként a tokenek egy összefüggő kulcstartományban
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_topics ("
+            " topic TEXT NOT NULL,"
+            " token TEXT NOT NULL,"
+            " PRIMARY KEY (topic, token)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS token_topics_token ON token_topics (token)")
+        if seed_topics:
+            # A témák előtt regisztrált tokenek az alapértelmezett témákat kapják
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO token_topics (topic, token) SELECT ?, token FROM push_tokens",
+                [(topic,) for topic in DEFAULT_TOPICS],
+            )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS push_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " record TEXT NOT NULL,"
+            " delivery TEXT NOT NULL DEFAULT '{}')"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS push_jobs_created ON push_jobs (created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS push_tickets ("
+            " id TEXT PRIMARY KEY,"
+            " job_id TEXT NOT NULL,"
+            " token TEXT NOT NULL,"
+            " sent_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS push_tickets_sent ON push_tickets (sent_at, id)")
+
+    def _write(self, *statements: Tuple[str, List[tuple]]):
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in statements:
+                    self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _upsert(self, subscriptions: List[Subscription]):
+        now = time.time()
+        replaced = [(token, topics) for token, topics in subscriptions if topics is not None]
+        kept = [token for token, topics in subscriptions if topics is None]
+        self._write(
+            # Az alapértelmezett témák csak az még nem ismert tokeneknek járnak
+            ("INSERT OR IGNORE INTO token_topics (topic, token) "
+             "SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM push_tokens WHERE token = ?)",
+             [(topic, token, token) for token in kept for topic in DEFAULT_TOPICS]),
+            ("INSERT OR IGNORE INTO push_tokens (token, created_at) VALUES (?, ?)",
+             [(token, now) for token, _ in subscriptions]),
+            ("DELETE FROM token_topics WHERE token = ?", [(token,) for token, _ in replaced]),
+            ("INSERT INTO token_topics (topic, token) VALUES (?, ?)",
+             [(topic, token) for token, topics in replaced for topic in topics]),
+        )
+
+    def _delete(self, tokens: List[str]):
+        rows = [(token,) for token in tokens]
+        self._write(
+            ("DELETE FROM token_topics WHERE token = ?", rows),
+            ("DELETE FROM push_tokens WHERE token = ?", rows),
+        )
+
+    def _iter_batches(self, size: int, topic: Optional[str]) -> Iterator[List[str]]:
+        # Keyset lapozás: nem tartunk nyitva olvasási tranzakciót a küldés alatt
+        if topic is None:
+            sql = "SELECT id, token FROM push_tokens WHERE id > ? ORDER BY id LIMIT ?"
+            params: tuple = ()
+            last = 0
+        else:
+            sql = "SELECT token, token FROM token_topics WHERE topic = ? AND token > ? ORDER BY token LIMIT ?"
+            params = (topic,)
+            last = ""
+        while True:
+            with self._db_lock:
+                rows = self._conn.execute(sql, (*params, last, size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [token for _, token in rows]
+
+    def _count(self, topic: Optional[str]) -> int:
+        with self._db_lock:
+            if topic is None:
+                return self._conn.execute("SELECT COUNT(*) FROM push_tokens").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM token_topics WHERE topic = ?", (topic,)
+            ).fetchone()[0]
+
+    def _acquire_lease(self, name: str, owner: str, now: float, ttl: float) -> bool:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, owner, now + ttl),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted == 1
+
+    def _release_lease(self, name: str, owner: str):
+        self._write(("DELETE FROM leases WHERE name = ? AND owner = ?", [(name, owner)]))
+
+    def _take_token(self, key: str, rate: float, burst: float, now: float) -> float:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                if random.random() < 0.001:
+                    self._conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?",
+                                       (now - BUCKET_IDLE_TTL,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _save_job(self, job_id: str, created_at: float, record: Dict[str, Any], keep: int):
+        self._write(
+            ("INSERT INTO push_jobs (id, created_at, record) VALUES (?, ?, ?)"
+             " ON CONFLICT (id) DO UPDATE SET record = excluded.record",
+             [(job_id, created_at, json.dumps(record))]),
+            ("DELETE FROM push_jobs WHERE id IN"
+             " (SELECT id FROM push_jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)", [(keep,)]),
+        )
+
+    @staticmethod
+    def _job(record: str, delivery: str) -> Dict[str, Any]:
+        return {**json.loads(record), "delivery": json.loads(delivery)}
+
+    def _get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._conn.execute("SELECT record, delivery FROM push_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(*row) if row else None
+
+    def _recent_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT record, delivery FROM push_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._job(*row) for row in rows]
+
+    def _increment(self, counts: Dict[str, Dict[str, int]]):
+        # Olvasás-módosítás-írás egy BEGIN IMMEDIATE tranzakción belül, így workerek között is atomikus
+        for job_id, job_counts in counts.items():
+            row = self._conn.execute("SELECT delivery FROM push_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                continue
+            delivery = json.loads(row[0])
+            apply_counts(delivery, job_counts)
+            self._conn.execute("UPDATE push_jobs SET delivery = ? WHERE id = ?", (json.dumps(delivery), job_id))
+
+    def _transaction(self, *statements: Tuple[str, List[tuple]], counts: Dict[str, Dict[str, int]]):
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in statements:
+                    self._conn.executemany(sql, rows)
+                self._increment(counts)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _add_tickets(self, job_id: str, tickets: List[Tuple[str, str]], sent_at: float,
+                     counts: Dict[str, int]):
+        self._transaction(
+            ("INSERT OR REPLACE INTO push_tickets (id, job_id, token, sent_at) VALUES (?, ?, ?, ?)",
+             [(ticket_id, job_id, token, sent_at) for ticket_id, token in tickets]),
+            counts={job_id: counts},
+        )
+
+    def _due_tickets(self, sent_before: float, limit: int,
+                     after: Optional[Tuple[float, str]]) -> List[Ticket]:
+        after = after or (float("-inf"), "")
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT id, job_id, token, sent_at FROM push_tickets"
+                " WHERE sent_at < ? AND (sent_at, id) > (?, ?) ORDER BY sent_at, id LIMIT ?",
+                (sent_before, *after, limit),
+            ).fetchall()
+
+    def _settle_tickets(self, ticket_ids: List[str], counts: Dict[str, Dict[str, int]]):
+        self._transaction(("DELETE FROM push_tickets WHERE id = ?", [(ticket_id,) for ticket_id in ticket_ids]),
+                          counts=counts)
+
+    def _count_tickets(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM push_tickets").fetchone()[0]
+
+    def _close(self):
+        with self._db_lock:
+            self._conn.close()
+
+
+class MongoTokenStore(TokenStore):
+    def __init__(self, url: str = MONGO_URL, db_name: str = DB_NAME,
+                 collection: str = "push_tokens", **kwargs):
+        super().__init__(**kwargs)
+        from pymongo import ASCENDING, MongoClient
+
+        self._client = MongoClient(url)
+        self._collection = self._client[db_name][collection]
+        self._collection.create_index([("token", ASCENDING)], unique=True)
+        # Többkulcsos index a topics tömbön: ez a téma -> token fordított index
+        self._collection.create_index([("topics", ASCENDING)])
+        self._collection.update_many({"topics": {"$exists": False}},
+                                     {"$set": {"topics": list(DEFAULT_TOPICS)}})
+        self._leases = self._client[db_name]["leases"]
+        self._buckets = self._client[db_name]["rate_buckets"]
+        self._buckets.create_index([("updated_at", ASCENDING)], expireAfterSeconds=BUCKET_IDLE_TTL)
+        self._jobs = self._client[db_name]["push_jobs"]
+        self._jobs.create_index([("created_at", ASCENDING)])
+        self._tickets = self._client[db_name]["push_tickets"]
+        self._tickets.create_index([("sent_at", ASCENDING), ("_id", ASCENDING)])
+
+    def _upsert(self, subscriptions: List[Subscription]):
+        from pymongo import UpdateOne
+
+        now = time.time()
+        requests = []
+        for token, topics in subscriptions:
+            update = {"$setOnInsert": {"token": token, "created_at": now}}
+            if topics is None:
+                # Az alapértelmezett témák csak új tokennek járnak
+                update["$setOnInsert"]["topics"] = list(DEFAULT_TOPICS)
+            else:
+                update["$set"] = {"topics": sorted(topics)}
+            requests.append(UpdateOne({"token": token}, update, upsert=True))
+        self._collection.bulk_write(requests, ordered=False)
+
+    def _delete(self, tokens: List[str]):
+        self._collection.delete_many({"token": {"$in": tokens}})
+
+    def _iter_batches(self, size: int, topic: Optional[str]) -> Iterator[List[str]]:
+        query = {} if topic is None else {"topics": topic}
+        cursor = self._collection.find(query, {"token": 1, "_id": 0}).batch_size(size)
+        batch: List[str] = []
+        for doc in cursor:
+            batch.append(doc["token"])
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _count(self, topic: Optional[str]) -> int:
+        if topic is None:
+            return self._collection.estimated_document_count()
+        return self._collection.count_documents({"topics": topic})
+
+    def _acquire_lease(self, name: str, owner: str, now: float, ttl: float) -> bool:
+        from pymongo.errors import DuplicateKeyError
+
+        self._leases.delete_many({"expires_at": {"$lte": now}})
+        try:
+            # Az _id egyedisége garantálja, hogy csak egy worker nyer
+            self._leases.insert_one({"_id": name, "owner": owner, "expires_at": now + ttl})
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _release_lease(self, name: str, owner: str):
+        self._leases.delete_one({"_id": name, "owner": owner})
+
+    def _take_token(self, key: str, rate: float, burst: float, now: float) -> float:
+        from pymongo import ReturnDocument
+
+        # Egyetlen atomikus frissítés: feltöltés az eltelt idővel, majd egy token levonása
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated_ts", now]}]}]}, rate]},
+        ]}]}
+        doc = self._buckets.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_ts": now, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return 0.0 if doc["allowed"] else (1 - doc["tokens"]) / rate
+
+    def _save_job(self, job_id: str, created_at: float, record: Dict[str, Any], keep: int):
+        self._jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"record": record}, "$setOnInsert": {"created_at": created_at, "delivery": {}}},
+            upsert=True,
+        )
+        stale = [doc["_id"] for doc in self._jobs.find({}, {"_id": 1}).sort("created_at", -1).skip(keep)]
+        if stale:
+            self._jobs.delete_many({"_id": {"$in": stale}})
+
+    def _get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        doc = self._jobs.find_one({"_id": job_id})
+        return {**doc["record"], "delivery": doc["delivery"]} if doc else None
+
+    def _recent_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        return [{**doc["record"], "delivery": doc["delivery"]}
+                for doc in self._jobs.find().sort("created_at", -1).limit(limit)]
+
+    def _increment(self, counts: Dict[str, Dict[str, int]]):
+        from pymongo import UpdateOne
+
+        updates = [UpdateOne({"_id": job_id}, {"$inc": {f"delivery.{key}": value for key, value in job_counts.items()}})
+                   for job_id, job_counts in counts.items() if job_counts]
+        if updates:
+            self._jobs.bulk_write(updates, ordered=False)
+
+    def _add_tickets(self, job_id: str, tickets: List[Tuple[str, str]], sent_at: float,
+                     counts: Dict[str, int]):
+        if tickets:
+            self._tickets.insert_many(
+                [{"_id": ticket_id, "job_id": job_id, "token": token, "sent_at": sent_at}
+                 for ticket_id, token in tickets],
+                ordered=False,
+            )
+        self._increment({job_id: counts})
+
+    def _due_tickets(self, sent_before: float, limit: int,
+                     after: Optional[Tuple[float, str]]) -> List[Ticket]:
+        query: Dict[str, Any] = {"sent_at": {"$lt": sent_before}}
+        if after is not None:
+            query["$or"] = [{"sent_at": {"$gt": after[0]}}, {"sent_at": after[0], "_id": {"$gt": after[1]}}]
+        cursor = self._tickets.find(query).sort([("sent_at", 1), ("_id", 1)]).limit(limit)
+        return [(doc["_id"], doc["job_id"], doc["token"], doc["sent_at"]) for doc in cursor]
+
+    def _settle_tickets(self, ticket_ids: List[str], counts: Dict[str, Dict[str, int]]):
+        self._tickets.delete_many({"_id": {"$in": ticket_ids}})
+        self._increment(counts)
+
+    def _count_tickets(self) -> int:
+        return self._tickets.estimated_document_count()
+
+    def _close(self):
+        self._client.close()
+
+
+def create_token_store(kind: str = TOKEN_STORE) -> TokenStore:
+    if kind == "mongo":
+        return MongoTokenStore()
+    if kind == "sqlite":
+        return SQLiteTokenStore()
+    raise ValueError(f"Ismeretlen TOKEN_STORE: {kind}")